@@ -0,0 +1,70 @@
+import argparse
+import sys
+
+from pathlib import Path
+from benchmarks.generate import CURRENCIES, generate_spec
+from benchmarks.suite import SIZES, compare, format_results, load, run_suite, save
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks for the reporter pipeline')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write a synthetic spec file')
+    generate.add_argument('output', type=str, help='File to write')
+    generate.add_argument('--tables', type=int, default=100)
+    generate.add_argument('--rows', type=int, default=20, help='Rows per table')
+    generate.add_argument('--columns', type=int, default=3, help='Columns per table, at least 2')
+    generate.add_argument('--prose-ratio', type=float, default=1.0, help='Size of the prose relative to the tables')
+    generate.add_argument('--currencies', type=str, default='$', help=f"Currency symbols to mix, from {''.join(CURRENCIES)}")
+    generate.add_argument('--seed', type=int, default=0)
+
+    run = commands.add_parser('run', help='Measure each stage and save the results as JSON')
+    run.add_argument('--sizes', type=str, default='small,medium', help=f"Comma separated, from {','.join(SIZES)}")
+    run.add_argument('--workdir', type=str, default='.bench', help='Where generated specs are kept between runs')
+    run.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest one counts')
+    run.add_argument('--no-memory', action='store_true', help='Skip the peak memory measurements')
+    run.add_argument('--output', type=str, required=False, help='JSON file to save the results to')
+    run.add_argument('--baseline', type=str, required=False, help='Baseline JSON to compare the results against')
+    run.add_argument('--threshold', type=float, default=0.1, help='Allowed slowdown or memory growth, 0.1 is 10%%')
+
+    comparison = commands.add_parser('compare', help='Compare saved results against a baseline')
+    comparison.add_argument('baseline', type=str)
+    comparison.add_argument('current', type=str)
+    comparison.add_argument('--threshold', type=float, default=0.1, help='Allowed slowdown or memory growth, 0.1 is 10%%')
+    return parser.parse_args(argv)
+
+
+def check(baseline, current, threshold):
+    regressions = compare(baseline, current, threshold)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+    print(f'No regressions beyond {threshold:.0%}')
+
+
+def main(args):
+    if args.command == 'generate':
+        with open(args.output, 'w', encoding='utf-8') as f:
+            rows = generate_spec(f, args.tables, args.rows, args.columns, args.prose_ratio, tuple(args.currencies),
+                                 args.seed)
+        print(f'{args.output}: {args.tables} tables, {rows} rows')
+    elif args.command == 'run':
+        sizes = args.sizes.split(',')
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            print(f"Error: unknown sizes {', '.join(unknown)}")
+            sys.exit(1)
+        suite = run_suite(sizes, Path(args.workdir), args.repeat, not args.no_memory)
+        print(format_results(suite))
+        if args.output:
+            save(suite, Path(args.output))
+        if args.baseline:
+            check(load(Path(args.baseline)), suite, args.threshold)
+    else:
+        check(load(Path(args.baseline)), load(Path(args.current)), args.threshold)
+
+
+if __name__ == '__main__':
+    main(parse_args())
@@ -0,0 +1,52 @@
+import random
+
+from typing import Sequence, TextIO
+
+CURRENCIES = ('$', '£', '€')
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et '
+         'dolore magna aliqua ut enim ad minim veniam quis nostrud exercitation ullamco laboris nisi').split()
+
+MATERIALS = ('Tables', 'Chairs', 'Lamps', 'Desks', 'Shelves', 'Cables', 'Screens', 'Rugs')
+
+
+def generate_spec(f: TextIO,
+                  tables: int = 100,
+                  rows: int = 20,
+                  columns: int = 3,
+                  prose_ratio: float = 1.0,
+                  currency_mix: Sequence[str] = ('$',),
+                  seed: int = 0) -> int:
+    """ Writes a synthetic spec to f and returns the number of data rows written.
+
+    The spec has a title line, then `tables` tables of `rows` rows each, separated by paragraphs of prose.
+    Each table has `columns` columns: the item name, a price in one of `currency_mix` and filler columns that
+    alternate between numbers and text. `prose_ratio` is roughly the size of the prose relative to the tables.
+    Everything is written as it is generated, so specs far bigger than memory can be produced.
+    """
+    if columns < 2:
+        raise ValueError('a spec table needs at least an item and a price column')
+    rng = random.Random(seed)
+    f.write('# Synthetic Project\n\n')
+    written = 0
+    for t in range(tables):
+        material = MATERIALS[t % len(MATERIALS)]
+        header = [material, 'Price'] + [f'Attr{c}' for c in range(2, columns)]
+        lines = ['| ' + ' | '.join(header) + ' |', '|' + '---|' * columns]
+        for r in range(rows):
+            cells = [f'item-{t}-{r}', f'{rng.choice(currency_mix)}{rng.randint(1, 99999) / 100:,.2f}']
+            cells += [str(rng.randint(1, 1000)) if c % 2 else rng.choice(WORDS) for c in range(2, columns)]
+            lines.append('| ' + ' | '.join(cells) + ' |')
+        table = '\n'.join(lines) + '\n'
+        written += rows
+
+        prose_length = int(len(table) * prose_ratio)
+        prose = []
+        while prose_length > 0:
+            line = ' '.join(rng.choices(WORDS, k=12))
+            prose.append(line)
+            prose_length -= len(line) + 1
+        f.write('\n'.join(prose) + '\n\n' if prose else '\n')
+        f.write(table)
+        f.write('\n')
+    return written
@@ -0,0 +1,129 @@
+import gc
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+from benchmarks.generate import generate_spec
+from reporter_cli.model import TextProcessor, TableBOM, BOMRenderer
+
+# generator parameters for each named size, from a quick check up to multi GB inputs
+SIZES = {
+    'tiny': dict(tables=20, rows=10),
+    'small': dict(tables=500, rows=20),
+    'medium': dict(tables=5_000, rows=50, columns=5),
+    'large': dict(tables=50_000, rows=100, columns=5, currency_mix=('$', '£', '€')),
+    'huge': dict(tables=500_000, rows=100, columns=5, currency_mix=('$', '£', '€')),
+}
+
+
+def spec_file(size: str, workdir: Path) -> Path:
+    """ generates the spec for a size once and reuses it afterwards """
+    path = Path(workdir) / f'spec_{size}.txt'
+    if not path.exists():
+        temp = path.with_suffix('.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            generate_spec(f, **SIZES[size])
+        temp.replace(path)
+    return path
+
+
+def _timed(stage: Callable, repeat: int) -> Tuple[float, object]:
+    """ best wall time of `repeat` runs, with the result of the last one """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = stage()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _peak_memory(stage: Callable) -> int:
+    """ peak bytes allocated while the stage runs, measured in a separate run since tracing slows it down """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_size(path: Path, repeat: int = 3, memory: bool = True) -> Dict[str, Dict]:
+    """ measures table extraction, bill of materials and rendering for one spec file """
+    size_bytes = path.stat().st_size
+    extract = lambda: TextProcessor(path)
+    seconds, processor = _timed(extract, repeat)
+    rows = sum(len(data) for _, data in processor.tables)
+    stages = {'extract_tables': (extract, seconds, size_bytes / seconds / 1e6, 'MB/s')}
+
+    make_bom = lambda: TableBOM(processor.tables, processor.project_name)
+    seconds, bom = _timed(make_bom, repeat)
+    stages['make_bom'] = (make_bom, seconds, rows / seconds, 'rows/s')
+
+    renderer = BOMRenderer(bom, render=False)
+    make_report = renderer.make_report
+    seconds, _ = _timed(make_report, repeat)
+    stages['make_report'] = (make_report, seconds, rows / seconds, 'rows/s')
+
+    results = {}
+    for name, (stage, seconds, throughput, unit) in stages.items():
+        results[name] = {'seconds': seconds, 'throughput': throughput, 'unit': unit, 'bytes': size_bytes,
+                         'rows': rows}
+        if memory:
+            results[name]['peak_bytes'] = _peak_memory(stage)
+    return results
+
+
+def run_suite(sizes: List[str], workdir: Path, repeat: int = 3, memory: bool = True) -> Dict:
+    Path(workdir).mkdir(parents=True, exist_ok=True)
+    results = {}
+    for size in sizes:
+        results[size] = run_size(spec_file(size, workdir), repeat, memory)
+    return {'meta': {'python': sys.version.split()[0],
+                     'platform': platform.platform(),
+                     'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                     'repeat': repeat},
+            'results': results}
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> List[str]:
+    """ lists every stage whose time or peak memory grew by more than threshold over the baseline """
+    regressions = []
+    for size, stages in current['results'].items():
+        for stage, result in stages.items():
+            base = baseline['results'].get(size, {}).get(stage)
+            if not base:
+                continue
+            for metric in ('seconds', 'peak_bytes'):
+                if metric in base and metric in result and result[metric] > base[metric] * (1 + threshold):
+                    change = result[metric] / base[metric] - 1
+                    regressions.append(f'{size} {stage} {metric}: {base[metric]:.6g} -> {result[metric]:.6g} '
+                                       f'(+{change:.0%})')
+    return regressions
+
+
+def format_results(suite: Dict) -> str:
+    lines = [f"{'size':8} {'stage':15} {'seconds':>10} {'throughput':>16} {'peak MB':>10}"]
+    for size, stages in suite['results'].items():
+        for stage, result in stages.items():
+            peak = f"{result['peak_bytes'] / 1e6:10.1f}" if 'peak_bytes' in result else f"{'-':>10}"
+            lines.append(f"{size:8} {stage:15} {result['seconds']:10.4f} "
+                         f"{result['throughput']:11.1f} {result['unit']:>4} {peak}")
+    return '\n'.join(lines)
+
+
+def load(path: Path) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(suite: Dict, path: Path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(suite, f, indent=2)
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
-from reporter_cli.cli import parse_args, main
+from reporter_cli.cli import cli
 
 if __name__ == "__main__":
-    args = parse_args()
-    main(args)
+    cli()
@@ -0,0 +1,201 @@
+import argparse
+import heapq
+import json
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Tuple
+from reporter_cli.batch import collect_inputs
+from reporter_cli.model import TextProcessor, TableBOM, format_minor
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter aggregate',
+                                     description='Total spend per material or item and the most expensive items '
+                                                 'across many inputs')
+    parser.add_argument('inputs', nargs='+',
+                        help='Input files, directories, glob patterns or @manifest files listing one input per line')
+    parser.add_argument('--pattern', type=str, default='*.txt', help='File pattern used inside directories')
+    parser.add_argument('--by', choices=['material', 'item'], default='material',
+                        help='Group the totals by material, or by material and item name')
+    parser.add_argument('--top', type=int, default=10, help='Number of most expensive items to list')
+    parser.add_argument('--limit', type=int, required=False, help='Only list this many of the largest groups')
+    parser.add_argument('--format', choices=['text', 'json'], default='text', help='Output format')
+    parser.add_argument('--workers', type=int, required=False, help='Number of worker processes, defaults to CPU count')
+    parser.add_argument('--chunksize', type=int, default=16, help='Number of files handed to a worker at a time')
+    return parser.parse_args(argv)
+
+
+class Aggregator:
+    """ Running totals and the top-K items over any number of bills of materials.
+
+    Memory is bounded by the number of distinct materials and items plus K, not by the number of rows or files,
+    since each bill of materials is folded in and then dropped. Aggregators of separate inputs can be merged, so
+    the work can be split across processes. Amounts are in minor units, like TableBOM.
+    """
+    def __init__(self, top: int = 10):
+        self.top_k = top
+        self.files = 0
+        # (input file, error) of every input that could not be parsed
+        self.failed: List[Tuple[str, str]] = []
+        self.items = 0
+        self.total_minor = 0
+        self.currency_symbol = None
+        # material -> [total, items]
+        self.materials: Dict[str, List[int]] = {}
+        # (material, item) -> [total, items]
+        self.item_totals: Dict[Tuple[str, str], List[int]] = {}
+        # min-heap of (cost, project, material, item, currency), the cheapest of the top K at the front
+        self.heap: List[Tuple[int, str, str, str, str]] = []
+
+    def add_bom(self, bom: TableBOM):
+        self.files += 1
+        if bom.currency_symbol:
+            self.currency_symbol = bom.currency_symbol
+        project = bom.project_name or ''
+        heap, top_k = self.heap, self.top_k
+        for name, material in bom.bill_of_materials.items():
+            totals = self.materials.setdefault(name, [0, 0])
+            totals[0] += material.sub_total_minor
+            totals[1] += len(material.costs)
+            self.total_minor += material.sub_total_minor
+            self.items += len(material.costs)
+            names = material.names
+            for row, cost, currency in zip(material.cost_rows, material.costs, material.currencies):
+                item = names[row]
+                totals = self.item_totals.get((name, item))
+                if totals is None:
+                    self.item_totals[(name, item)] = [cost, 1]
+                else:
+                    totals[0] += cost
+                    totals[1] += 1
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (cost, project, name, item, currency))
+                elif top_k and cost > heap[0][0]:
+                    heapq.heappushpop(heap, (cost, project, name, item, currency))
+
+    def merge(self, other: 'Aggregator'):
+        self.files += other.files
+        self.failed.extend(other.failed)
+        self.items += other.items
+        self.total_minor += other.total_minor
+        self.currency_symbol = other.currency_symbol or self.currency_symbol
+        for groups, other_groups in ((self.materials, other.materials), (self.item_totals, other.item_totals)):
+            for key, (total, count) in other_groups.items():
+                totals = groups.setdefault(key, [0, 0])
+                totals[0] += total
+                totals[1] += count
+        for entry in other.heap:
+            if len(self.heap) < self.top_k:
+                heapq.heappush(self.heap, entry)
+            elif self.top_k and entry > self.heap[0]:
+                heapq.heappushpop(self.heap, entry)
+
+    def top(self) -> List[Tuple[int, str, str, str, str]]:
+        """ the most expensive items, most expensive first """
+        return sorted(self.heap, reverse=True)
+
+    def groups(self, by: str = 'material', limit: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """ (name, total, items) per material, or per 'material / item' with by='item', largest total first """
+        if by == 'item':
+            groups = ((f'{material} / {item}', total, count)
+                      for (material, item), (total, count) in self.item_totals.items())
+        else:
+            groups = ((material, total, count) for material, (total, count) in self.materials.items())
+        key = itemgetter(1, 0)
+        if limit is not None:
+            return heapq.nlargest(limit, groups, key=key)
+        return sorted(groups, key=key, reverse=True)
+
+    def as_dict(self, by: str = 'material', limit: Optional[int] = None) -> Dict:
+        return {'files': self.files,
+                'items': self.items,
+                'total': format_minor(self.total_minor),
+                'currency': self.currency_symbol,
+                'groups': [{'name': name, 'total': format_minor(total), 'items': count}
+                           for name, total, count in self.groups(by, limit)],
+                'top': [{'cost': format_minor(cost), 'currency': currency, 'project': project, 'material': material,
+                         'item': item} for cost, project, material, item, currency in self.top()],
+                'failed': [{'input': input_file, 'error': error} for input_file, error in self.failed]}
+
+
+def aggregate_files(input_files: Iterable[str], top: int = 10) -> Aggregator:
+    """ parses each file in turn and folds its bill of materials into one Aggregator.
+
+    A file that cannot be read or parsed is recorded in the aggregator's failed list and the rest are still added.
+    """
+    aggregator = Aggregator(top)
+    for input_file in input_files:
+        try:
+            processor = TextProcessor(input_file)
+            bom = TableBOM(processor.tables, processor.project_name) if processor.tables else None
+        except Exception as e:
+            aggregator.failed.append((str(input_file), str(e)))
+            continue
+        if bom is not None:
+            aggregator.add_bom(bom)
+    return aggregator
+
+
+def _aggregate_chunk(chunk: Tuple[List[str], int]) -> Aggregator:
+    input_files, top = chunk
+    return aggregate_files(input_files, top)
+
+
+def run_aggregate(input_files: List[str], top: int = 10, workers: Optional[int] = None,
+                  chunksize: int = 16) -> Aggregator:
+    """ aggregates the files across a process pool, each worker returning the partial result for a chunk of files """
+    if workers == 1:
+        return aggregate_files(input_files, top)
+    chunksize = max(1, chunksize)
+    chunks = [(input_files[i:i + chunksize], top) for i in range(0, len(input_files), chunksize)]
+    aggregator = Aggregator(top)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(_aggregate_chunk, chunks):
+            aggregator.merge(partial)
+    return aggregator
+
+
+def format_text(aggregator: Aggregator, by: str = 'material', limit: Optional[int] = None) -> str:
+    currency = aggregator.currency_symbol or ''
+    groups = aggregator.groups(by, limit)
+    top = aggregator.top()
+    width = max((len(name) for name, _, _ in groups), default=10)
+    lines = [f'{aggregator.files} files, {aggregator.items} items, total {currency}{format_minor(aggregator.total_minor)}',
+             '',
+             f'Spend per {by}:']
+    lines.extend(f'  {name.ljust(width)}  {currency + format_minor(total):>13}  ({count} items)'
+                 for name, total, count in groups)
+    lines.extend(['', f'Top {len(top)} items:'])
+    lines.extend(f'  {rank:>3}. {currency + format_minor(cost):>13}  {item} ({material}, {project})'
+                 for rank, (cost, project, material, item, _) in enumerate(top, 1))
+    if aggregator.failed:
+        lines.extend(['', f'{len(aggregator.failed)} files failed:'])
+        lines.extend(f'  failed   {input_file} {error}' for input_file, error in aggregator.failed)
+    return '\n'.join(lines)
+
+
+def main(args):
+    try:
+        inputs = [str(path) for path in collect_inputs(args.inputs, args.pattern)]
+    except OSError as e:
+        print(f"Error reading manifest: {e}")
+        sys.exit(1)
+    if not inputs:
+        print('No input files found, exiting')
+        sys.exit(0)
+
+    try:
+        aggregator = run_aggregate(inputs, max(0, args.top), args.workers, args.chunksize)
+    except Exception as e:
+        print(f"Error aggregating inputs: {e}")
+        sys.exit(1)
+
+    if args.format == 'json':
+        print(json.dumps(aggregator.as_dict(args.by, args.limit), indent=2))
+    else:
+        print(format_text(aggregator, args.by, args.limit))
+    # the files that could be read are still reported, as batch does
+    if aggregator.failed:
+        sys.exit(1)
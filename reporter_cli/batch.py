@@ -0,0 +1,221 @@
+import argparse
+import glob
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+from reporter_cli import stats
+from reporter_cli.cache import ParseCache, cached_parse
+from reporter_cli.formats import EXTENSIONS, write_report
+from reporter_cli.model import TextProcessor, TableBOM, BOMRenderer, plain_name
+
+TEMPLATE_DIR = Path(__file__).parent / 'templates'
+
+
+class Job(NamedTuple):
+    """ One input file to render, picklable so it can be shipped to a worker process """
+    input_file: str
+    output_file: str
+    template: str
+    overwrite: bool
+    cache_dir: Optional[str] = None
+    parse_cache: bool = False
+    output_format: str = 'text'
+    collect_stats: bool = False
+
+
+class Result(NamedTuple):
+    """ Outcome of a single job: status is one of written, skipped, empty or failed """
+    input_file: str
+    status: str
+    message: str
+    seconds: float
+    stats: Optional[Dict] = None
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter batch',
+                                     description='Render reports for many input files in parallel')
+    parser.add_argument('inputs', nargs='+',
+                        help='Input files, directories, glob patterns or @manifest files listing one input per line')
+    parser.add_argument('--pattern', type=str, default='*.txt', help='File pattern used inside directories')
+    parser.add_argument('--output-dir', type=str, required=False,
+                        help='Directory for the reports, defaults to next to each input')
+    parser.add_argument('--template', type=str, default='project_summary_template', help='Template name')
+    parser.add_argument('--format', choices=['text', 'jsonl', 'csv', 'binary'], default='text',
+                        help='Render with the template (text) or write the bill of materials as data')
+    parser.add_argument('--workers', type=int, required=False, help='Number of worker processes, defaults to CPU count')
+    parser.add_argument('--chunksize', type=int, default=16, help='Number of files handed to a worker at a time')
+    parser.add_argument('--io-concurrency', type=int, required=False,
+                        help='Overlap reading, processing and writing files, with up to this many reads and writes '
+                             'in flight, for slow or network storage')
+    parser.add_argument('--overwrite', choices=['always', 'never'], default='never',
+                        help='What to do with reports that already exist')
+    parser.add_argument('--cache-dir', type=str, required=False,
+                        help='Directory to keep compiled templates in between runs (default $REPORTER_CACHE_DIR)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Reuse the parse results of unchanged inputs from the cache directory')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the time spent in each stage and counters for all files as JSON on stderr')
+    parser.add_argument('--check', action='store_true',
+                        help='Only scan the inputs and report their titles, tables, dropped rows and tables without '
+                             'costs, exiting with 1 if any has a problem')
+    parser.add_argument('--quiet', action='store_true', help='Only list files that were not written')
+    return parser.parse_args(argv)
+
+
+def collect_inputs(sources: Iterable[str], pattern: str = '*.txt') -> List[Path]:
+    """ Expands directories, glob patterns and @manifest files into a sorted list of unique input files """
+    found = set()
+    for source in sources:
+        if source.startswith('@'):
+            with open(source[1:], 'r', encoding='utf-8') as f:
+                lines = [line.strip() for line in f]
+            found.update(Path(line) for line in lines if line and not line.startswith('#'))
+        elif Path(source).is_dir():
+            # skip reports left next to their inputs by earlier runs
+            found.update(path for path in Path(source).rglob(pattern)
+                         if path.is_file() and not path.stem.endswith('_output'))
+        elif any(char in source for char in '*?['):
+            found.update(Path(path) for path in glob.glob(source, recursive=True) if Path(path).is_file())
+        else:
+            found.add(Path(source))
+    return sorted(found)
+
+
+def output_path(input_file: Path, output_dir: Optional[Path] = None, suffix: Optional[str] = None) -> Path:
+    """ Same naming as the single file CLI, optionally moved into output_dir """
+    input_file = plain_name(input_file)
+    name = f"{input_file.stem}_output{suffix or input_file.suffix}"
+    return output_dir / name if output_dir else input_file.with_name(name)
+
+
+def render_job(job: Job) -> Result:
+    """ Runs the TextProcessor -> TableBOM -> BOMRenderer pipeline for one file without any prompts """
+    if not job.collect_stats:
+        return _render_job(job)
+    # the hooks are notified where the result is received, which is not this process with a pool
+    with stats.collecting(notify=False) as job_stats:
+        result = _render_job(job)
+    return result._replace(stats=job_stats.as_dict())
+
+
+def _render_job(job: Job) -> Result:
+    started = time.perf_counter()
+
+    def result(status, message=''):
+        return Result(job.input_file, status, message, time.perf_counter() - started)
+
+    try:
+        output_file = Path(job.output_file)
+        if output_file.exists() and not job.overwrite:
+            return result('skipped', f"'{output_file}' already exists")
+        if job.parse_cache:
+            project_name, tables, bill_of_materials = cached_parse(job.input_file, ParseCache(job.cache_dir))
+        else:
+            processor = TextProcessor(job.input_file)
+            tables = processor.tables
+            bill_of_materials = TableBOM(tables, processor.project_name) if tables else None
+        if not tables:
+            return result('empty', 'no tables extracted')
+        if job.output_format != 'text':
+            write_report(bill_of_materials, job.output_format, output_file)
+        else:
+            renderer = BOMRenderer(bill_of_materials, job.template, cache_dir=job.cache_dir, render=False)
+            renderer.write_stream(output_file)
+        return result('written', str(output_file))
+    except Exception as e:
+        return result('failed', str(e))
+
+
+def run_batch(jobs: List[Job], workers: Optional[int] = None, chunksize: int = 16) -> Iterator[Result]:
+    """ Yields one result per job, in job order, fanning the work out over a process pool.
+
+    The stats of each job that collected them are handed to the stats hooks of this process.
+    """
+    if workers == 1:
+        # no pool for a single worker, which also keeps things debuggable
+        yield from _notified(map(render_job, jobs))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from _notified(pool.map(render_job, jobs, chunksize=max(1, chunksize)))
+
+
+def _notified(results: Iterable[Result]) -> Iterator[Result]:
+    for result in results:
+        if result.stats:
+            stats.notify_hooks(result.stats)
+        yield result
+
+
+def check(inputs: List[Path], args):
+    """ the --check sweep, which never builds a bill of materials or renders anything """
+    from reporter_cli.check import format_result, run_checks
+
+    started = time.perf_counter()
+    problems = 0
+    for result in run_checks([str(path) for path in inputs], args.workers, args.chunksize):
+        problems += not result.ok
+        if not (args.quiet and result.ok):
+            print(format_result(result))
+    elapsed = time.perf_counter() - started
+    print(f"{len(inputs)} files checked in {elapsed:.2f}s: {len(inputs) - problems} ok, {problems} with problems")
+    if problems:
+        sys.exit(1)
+
+
+def main(args):
+    if not (TEMPLATE_DIR / args.template).exists():
+        print(f"Error: Template file '{args.template}' does not exist.")
+        sys.exit(1)
+
+    try:
+        inputs = collect_inputs(args.inputs, args.pattern)
+    except OSError as e:
+        print(f"Error reading manifest: {e}")
+        sys.exit(1)
+    if not inputs:
+        print('No input files found, exiting')
+        sys.exit(0)
+
+    if args.check:
+        check(inputs, args)
+        return
+
+    output_dir = Path(args.output_dir) if args.output_dir else None
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+    suffix = EXTENSIONS.get(args.format)
+    jobs = [Job(str(path), str(output_path(path, output_dir, suffix)), args.template, args.overwrite == 'always',
+                args.cache_dir, args.cache, args.format, args.stats) for path in inputs]
+    if len({job.output_file for job in jobs}) != len(jobs):
+        print('Error: Several inputs share a name and would write the same report, use separate output directories.')
+        sys.exit(1)
+
+    started = time.perf_counter()
+    counts = {'written': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    batch_stats = stats.Stats()
+    if args.io_concurrency:
+        from reporter_cli.pipeline import run_pipelined
+        results = run_pipelined(jobs, args.workers, max(1, args.io_concurrency))
+    else:
+        results = run_batch(jobs, args.workers, args.chunksize)
+    for result in results:
+        counts[result.status] += 1
+        if result.stats:
+            batch_stats.merge(result.stats)
+        if not (args.quiet and result.status == 'written'):
+            print(f"{result.status:8} {result.input_file} {result.message}".rstrip())
+
+    if args.cache:
+        ParseCache(args.cache_dir).evict()
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(jobs)} files in {elapsed:.2f}s: {counts['written']} written, {counts['skipped']} skipped, "
+          f"{counts['empty']} without tables, {counts['failed']} failed")
+    if args.stats:
+        print(batch_stats.to_json(), file=sys.stderr)
+    if counts['failed']:
+        sys.exit(1)
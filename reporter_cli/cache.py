@@ -0,0 +1,160 @@
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+from reporter_cli.model import PARSER_VERSION, TextProcessor, TableBOM, decompress
+
+# cache size above which the least recently used entries are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class CachedParse(NamedTuple):
+    """ Everything the pipeline needs from an input file before rendering """
+    project_name: Optional[str]
+    tables: List
+    bom: Optional[TableBOM]
+
+
+def default_cache_dir() -> Path:
+    """ $REPORTER_CACHE_DIR, or a reporter_cli folder in the user's cache directory """
+    if os.environ.get('REPORTER_CACHE_DIR'):
+        return Path(os.environ['REPORTER_CACHE_DIR'])
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'reporter_cli'
+
+
+class ParseCache:
+    """ On-disk cache of parse results keyed by a hash of the input content and the parser version.
+
+    Entries are pickles named after their key. Reading an entry refreshes its modification time, which is what
+    evict() uses to drop the least recently used entries once the cache grows past max_bytes.
+    Hits and misses are counted per instance and, for all processes sharing the cache, in two append-only files.
+    """
+    def __init__(self,
+                 cache_dir: Optional[Path] = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = Path(cache_dir or default_cache_dir()) / 'parse'
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(content: bytes) -> str:
+        digest = hashlib.sha256(f'reporter-parser-{PARSER_VERSION}\n'.encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}.pickle'
+
+    def _count(self, counter: str):
+        # a single byte appended per event, so concurrent processes never lose an update
+        with open(self.directory / counter, 'ab') as f:
+            f.write(b'.')
+
+    def get(self, key: str) -> Optional[CachedParse]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+            os.utime(path)
+        except FileNotFoundError:
+            entry = None
+        except Exception as e:
+            print(f'Ignoring unreadable cache entry {path}. Error: {e}')
+            entry = None
+        if entry is None:
+            self.misses += 1
+            self._count('misses')
+        else:
+            self.hits += 1
+            self._count('hits')
+        return entry
+
+    def put(self, key: str, entry: CachedParse):
+        path = self._path(key)
+        temp = path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(temp, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+
+    def _entries(self) -> List[Tuple[Path, os.stat_result]]:
+        return [(path, path.stat()) for path in self.directory.glob('*.pickle')]
+
+    def evict(self) -> int:
+        """ removes least recently used entries until the cache fits in max_bytes, returns how many went """
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        size = sum(stat.st_size for _, stat in entries)
+        removed = 0
+        for path, stat in entries:
+            if size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            size -= stat.st_size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for path in self.directory.iterdir():
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+
+        def counted(counter):
+            path = self.directory / counter
+            return path.stat().st_size if path.exists() else 0
+
+        return {'directory': str(self.directory),
+                'entries': len(entries),
+                'bytes': sum(stat.st_size for _, stat in entries),
+                'max_bytes': self.max_bytes,
+                'hits': counted('hits'),
+                'misses': counted('misses')}
+
+
+def cached_parse(input_file: Path, cache: ParseCache, jobs: int = 1, content: Optional[bytes] = None) -> CachedParse:
+    """ Parses an input file and builds its bill of materials, unless the same content was parsed before.
+
+    content can be handed in when the caller has already read the file.
+    """
+    if content is None:
+        content = Path(input_file).read_bytes()
+    key = cache.key(content)
+    entry = cache.get(key)
+    if entry is None:
+        processor = TextProcessor(input_file, jobs=jobs, text=decompress(content).decode('utf-8'))
+        tables = processor.tables
+        bom = TableBOM(tables, processor.project_name) if tables else None
+        entry = CachedParse(processor.project_name, tables, bom)
+        cache.put(key, entry)
+    return entry
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter cache', description='Inspect or clear the parse cache')
+    parser.add_argument('action', choices=['stats', 'clear', 'evict'])
+    parser.add_argument('--cache-dir', type=str, required=False,
+                        help='Cache directory (default $REPORTER_CACHE_DIR or ~/.cache/reporter_cli)')
+    parser.add_argument('--max-bytes', type=int, default=DEFAULT_MAX_BYTES, help='Size limit used by evict')
+    return parser.parse_args(argv)
+
+
+def main(args):
+    try:
+        cache = ParseCache(args.cache_dir, args.max_bytes)
+        if args.action == 'clear':
+            cache.clear()
+            print(f'Cleared {cache.directory}')
+        elif args.action == 'evict':
+            print(f'Evicted {cache.evict()} entries from {cache.directory}')
+        else:
+            for name, value in cache.stats().items():
+                print(f'{name}: {value}')
+    except OSError as e:
+        print(f'Error accessing cache: {e}')
+        sys.exit(1)
@@ -0,0 +1,101 @@
+import mmap
+import re
+import time
+
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional
+from reporter_cli.model import decompress, detect_compression
+from reporter_cli.tokenizer import Tokenizer, split_cells, table_rows
+
+# Scan-only validation: the same table detection, column count check and currency column detection as the full
+# pipeline, worked out on the raw bytes without decoding the prose, building a bill of materials or rendering.
+
+# TableBOM.CURRENCY_PATTERN for UTF-8 bytes
+CURRENCY_PATTERN = re.compile(r'(\$|£|€)(\d+)(?:\.(\d{1,2}))?'.encode('utf-8'))
+
+
+class CheckResult(NamedTuple):
+    """ What a scan found in one input, error is set if it could not be read """
+    input_file: str
+    title: bool
+    tables: int
+    rows: int
+    dropped_rows: int
+    tables_without_currency: int
+    seconds: float
+    error: str = ''
+
+    @property
+    def ok(self) -> bool:
+        return not self.error and self.title and self.tables > 0 and not self.dropped_rows \
+            and not self.tables_without_currency
+
+
+def check_buffer(buffer, input_file: str = '-') -> CheckResult:
+    """ scans the bytes of one input """
+    started = time.perf_counter()
+    scanner = Tokenizer(buffer)
+    tables = rows = dropped = without_currency = 0
+    for _, _, lines in scanner.blocks():
+        tables += 1
+        width = len(split_cells(lines[0]))
+        has_currency = False
+        for line in table_rows(lines):
+            cells = split_cells(line)
+            if len(cells) != width:
+                dropped += 1
+                continue
+            rows += 1
+            # TableBOM.column_types finds a currency column as long as any kept row has a currency cell
+            if not has_currency:
+                has_currency = any(CURRENCY_PATTERN.fullmatch(cell.replace(b',', b'')) for cell in cells[1:])
+        if not has_currency:
+            without_currency += 1
+    return CheckResult(input_file, scanner.title() is not None, tables, rows, dropped, without_currency,
+                       time.perf_counter() - started)
+
+
+def check_file(input_file: str) -> CheckResult:
+    """ scans one input, memory mapped unless it is compressed """
+    started = time.perf_counter()
+    try:
+        path = Path(input_file)
+        if detect_compression(path):
+            result = check_buffer(decompress(path.read_bytes()), input_file)
+        elif path.stat().st_size == 0:
+            result = check_buffer(b'', input_file)
+        else:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                result = check_buffer(buffer, input_file)
+        return result._replace(seconds=time.perf_counter() - started)
+    except Exception as e:
+        return CheckResult(input_file, False, 0, 0, 0, 0, time.perf_counter() - started, str(e))
+
+
+def run_checks(input_files: List[str], workers: Optional[int] = None, chunksize: int = 64) -> Iterator[CheckResult]:
+    """ Yields one result per input, in input order, scanning across a process pool """
+    if workers == 1 or len(input_files) < 2:
+        yield from map(check_file, input_files)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(check_file, input_files, chunksize=max(1, chunksize))
+
+
+def format_result(result: CheckResult) -> str:
+    """ one compact line per input """
+    if result.error:
+        return f"error    {result.input_file} {result.error}"
+    problems = []
+    if not result.title:
+        problems.append('no title')
+    if not result.tables:
+        problems.append('no tables')
+    if result.dropped_rows:
+        problems.append(f'{result.dropped_rows} rows dropped')
+    if result.tables_without_currency:
+        problems.append(f'{result.tables_without_currency} tables without costs')
+    status = 'problem' if problems else 'ok'
+    details = f"tables={result.tables} rows={result.rows}"
+    return f"{status:8} {result.input_file} {details}{' - ' + ', '.join(problems) if problems else ''}"
@@ -1,87 +1,271 @@
 import argparse
+import importlib
 import sys
 
 from pathlib import Path
-from reporter_cli.model import TextProcessor, TableBOM, BOMRenderer
+from reporter_cli import stats
+from typing import Optional
+from reporter_cli.model import TextProcessor, StreamingTextProcessor, MappedTextProcessor, TableBOM, BOMRenderer, \
+    plain_name, write_reports
+
+# subcommands, imported only when they are used
+COMMANDS = {
+    'aggregate': 'reporter_cli.aggregate',
+    'batch': 'reporter_cli.batch',
+    'cache': 'reporter_cli.cache',
+    'follow': 'reporter_cli.follow',
+    'index': 'reporter_cli.index',
+    'queue': 'reporter_cli.workqueue',
+    'serve': 'reporter_cli.serve',
+}
 
 
 def parse_args():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input', type=str, required=True, help='Input file name')
-    parser.add_argument('--output', type=str, required=False, help='Output file name')
-    parser.add_argument('--template', type=str, required=False, help='Template name')
+    parser.add_argument('--input', type=str, required=True, help="Input file name, or '-' to read from stdin")
+    parser.add_argument('--output', type=str, nargs='+', required=False,
+                        help="Output file name, or '-' to write to stdout. One per template when there are several")
+    parser.add_argument('--template', type=str, nargs='+', required=False,
+                        help='Template name. Several templates are rendered at once from a single parse')
+    parser.add_argument('--format', choices=['text', 'jsonl', 'csv', 'binary'], default='text', required=False,
+                        help='Render with the template (text) or write the bill of materials as data')
     parser.add_argument('--console', action='store_true', required=False, help='Prints template to console')
+    parser.add_argument('--stream', action='store_true', required=False,
+                        help='Extract tables while reading the input instead of loading it all first')
+    parser.add_argument('--mmap', action='store_true', required=False,
+                        help='Memory map the input and only decode the tables')
+    parser.add_argument('--index', type=str, required=False,
+                        help='Table index file to reuse, or to create for the next run (implies --mmap)')
+    parser.add_argument('--jobs', type=int, default=1, required=False,
+                        help='Number of processes used to extract tables from a large input')
+    parser.add_argument('--cache-dir', type=str, required=False,
+                        help='Directory to keep compiled templates in between runs (default $REPORTER_CACHE_DIR)')
+    parser.add_argument('--cache', action='store_true', required=False,
+                        help='Reuse the parsed tables and bill of materials of unchanged inputs from the cache directory')
+    parser.add_argument('--memory-budget', type=float, required=False,
+                        help='Megabytes of rows to keep in memory, spilling the rest of the bill of materials to disk. '
+                             'Implies --stream')
+    parser.add_argument('--spill-dir', type=str, required=False,
+                        help='Directory for the spilled rows, defaults to the system temporary directory')
+    parser.add_argument('--check', action='store_true', required=False,
+                        help='Only scan the input and report its title, tables, dropped rows and tables without costs')
+    parser.add_argument('--stats', action='store_true', required=False,
+                        help='Print the time spent in each stage and counters as JSON on stderr')
+    parser.add_argument('--overwrite', choices=['ask', 'always', 'never'], default='ask', required=False,
+                        help='What to do when the output file already exists')
     return parser.parse_args()
 
 
+def output_path(output: Optional[str], input_file: Path, from_stdin: bool, output_format: str,
+                template: Optional[str] = None) -> Optional[Path]:
+    """ where a report goes, None for the console. Defaults are named after the input, and the template if given """
+    if output == '-':
+        return None
+    if output:
+        return Path(output)
+    if from_stdin:
+        # nothing to name the output after, so it goes to the console
+        return None
+    tag = f'_{template}' if template else ''
+    plain = plain_name(input_file)
+    if output_format != 'text':
+        from reporter_cli.formats import EXTENSIONS
+        return input_file.with_name(f"{plain.stem}{tag}_output{EXTENSIONS[output_format]}")
+    # reports of compressed inputs are named after the uncompressed file
+    return input_file.with_name(f"{plain.stem}{tag}_output{plain.suffix}")
+
+
 def main(args):
+    if not args.stats:
+        return run(args)
+    with stats.collecting() as run_stats:
+        try:
+            return run(args)
+        finally:
+            print(run_stats.to_json(), file=sys.stderr)
+
+
+def run(args):
+    from_stdin = args.input == '-'
+    # a memory budget would bound nothing if the whole input was loaded first
+    streaming = args.stream or from_stdin or args.memory_budget is not None
+    mapped = args.mmap or bool(args.index)
     input_file = Path(args.input)
-    if args.output:
-        output_file = Path(args.output)
-    else:
-        output_file = input_file.with_name(f"{input_file.stem}_output{input_file.suffix}")
+    templates = args.template or [None]
+    several = len(templates) > 1
+    if args.output and len(args.output) != len(templates):
+        print("Error: --output needs one file name for each --template.")
+        sys.exit(1)
+    outputs = args.output or [None] * len(templates)
+    # a single report keeps the plain default name
+    output_files = [output_path(output, input_file, from_stdin, args.format, template if several else None)
+                    for output, template in zip(outputs, templates)]
+    output_file = output_files[0]
+    template_file = templates[0]
+
+    if several and args.format != 'text':
+        print("Error: several templates can only be rendered with --format text.")
+        sys.exit(1)
+
+    if several and (args.console or None in output_files):
+        print("Error: several templates each need an output file, they cannot be written to the console.")
+        sys.exit(1)
+
+    if mapped and streaming:
+        print("Error: --mmap/--index cannot be combined with --stream, --memory-budget or reading from stdin.")
+        sys.exit(1)
+
+    if args.cache and args.memory_budget is not None:
+        print("Error: --cache cannot be combined with --memory-budget.")
+        sys.exit(1)
 
-    template_file = f"{args.template}" if args.template else None
+    if args.cache and (mapped or streaming):
+        print("Error: --cache cannot be combined with --mmap/--index, --stream or reading from stdin.")
+        sys.exit(1)
 
     # Check if input file exists
-    if not input_file.exists():
+    if not from_stdin and not input_file.exists():
         print(f"Error: Input file '{input_file}' does not exist.")
         sys.exit(1)
 
+    if args.check:
+        from reporter_cli.check import check_buffer, check_file, format_result
+        result = check_buffer(sys.stdin.buffer.read()) if from_stdin else check_file(str(input_file))
+        print(format_result(result))
+        sys.exit(0 if result.ok else 1)
+
     # Check if template file exists in templates/ folder, if provided
-    if template_file and not Path(f"reporter_cli/templates/{template_file}").exists():
-        print(f"Error: Template file '{template_file}' does not exist.")
-        sys.exit(1)
+    for template in templates:
+        if template and not Path(f"reporter_cli/templates/{template}").exists():
+            print(f"Error: Template file '{template}' does not exist.")
+            sys.exit(1)
 
     # Warn if output file exists
-    if output_file.exists():
-        overwrite = input(f"Warning: Output file '{output_file}' already exists, are you ok with this overwriting? (yes/no): ")
-        if not (overwrite.lower() == 'yes' or overwrite.lower() == 'y'):
-            print("Operation aborted by the user.")
+    for existing in output_files:
+        if not (existing and existing.exists()):
+            continue
+        if args.overwrite == 'never':
+            print(f"Output file '{existing}' already exists, skipping.")
             sys.exit(0)
+        if args.overwrite == 'ask':
+            if from_stdin:
+                print(f"Error: Output file '{existing}' already exists and stdin is not available to confirm "
+                      f"overwriting, use --overwrite.")
+                sys.exit(1)
+            overwrite = input(f"Warning: Output file '{existing}' already exists, are you ok with this overwriting? (yes/no): ")
+            if not (overwrite.lower() == 'yes' or overwrite.lower() == 'y'):
+                print("Operation aborted by the user.")
+                sys.exit(0)
 
     # Process input file and extract any tables + project name from first line starting with #
+    cache = None
+    bill_of_materials = None
     try:
-        processor = TextProcessor(input_file)
-        tables = processor.tables
-        project_name = processor.project_name
+        if args.cache:
+            from reporter_cli.cache import ParseCache, cached_parse
+            cache = ParseCache(args.cache_dir)
+            project_name, tables, bill_of_materials = cached_parse(input_file, cache, jobs=args.jobs)
+        else:
+            if streaming:
+                processor = StreamingTextProcessor(sys.stdin if from_stdin else input_file)
+            elif mapped:
+                processor = MappedTextProcessor(input_file, args.index)
+            else:
+                processor = TextProcessor(input_file, jobs=args.jobs)
+            tables = processor.tables
+            project_name = processor.project_name
     except Exception as e:
         print(f"Error processing input file: {e}")
         sys.exit(1)
 
-    if not tables:
+    if not streaming and not tables:
         print('No tables extracted, exiting')
         sys.exit(0)
 
-    # Create a bill of materials that can be nicely rendered
-    try:
-        bill_of_materials = TableBOM(tables, project_name)
-    except Exception as e:
-        print(f"Error converting table to bill of materials: {e}")
-        sys.exit(1)
+    # Create a bill of materials that can be nicely rendered, unless it came from the cache
+    if bill_of_materials is None:
+        try:
+            if args.memory_budget is not None:
+                from reporter_cli.spill import SpillingTableBOM
+                bill_of_materials = SpillingTableBOM(tables, project_name, int(args.memory_budget * 1024 * 1024),
+                                                     args.spill_dir)
+            else:
+                bill_of_materials = TableBOM(tables, project_name)
+            if streaming:
+                # a streamed title is only known once the tables have been read
+                bill_of_materials.project_name = processor.project_name
+        except Exception as e:
+            print(f"Error converting table to bill of materials: {e}")
+            sys.exit(1)
+        if mapped:
+            # every row is in the bill of materials now, so the mapping and its file don't stay open while rendering
+            processor.close()
 
-    # try to render the file as a string
+    if streaming and not processor.table_count:
+        print('No tables extracted, exiting')
+        sys.exit(0)
+
+    # Data formats are written straight from the bill of materials, without a template
+    if args.format != 'text':
+        from reporter_cli.formats import write_report
+        try:
+            write_report(bill_of_materials, args.format, output_file)
+        except Exception as e:
+            print(f"Error writing file: {e}")
+            sys.exit(1)
+        if output_file:
+            print(f'{output_file} written successfully')
+        if cache:
+            cache.evict()
+        if args.memory_budget is not None:
+            bill_of_materials.close()
+        return
+
+    # Several templates are rendered side by side from the one bill of materials
+    if several:
+        try:
+            write_reports(bill_of_materials, list(zip(templates, output_files)), cache_dir=args.cache_dir)
+        except Exception as e:
+            print(f"Error writing file: {e}")
+            sys.exit(1)
+        for written in output_files:
+            print(f'{written} written successfully')
+        if cache:
+            cache.evict()
+        if args.memory_budget is not None:
+            bill_of_materials.close()
+        return
+
+    # Set up the renderer, the report itself is only rendered while it is written
     try:
         if template_file:
-            renderer = BOMRenderer(bill_of_materials, template_file)
+            renderer = BOMRenderer(bill_of_materials, template_file, cache_dir=args.cache_dir, render=False)
         else:
-            renderer = BOMRenderer(bill_of_materials)
+            renderer = BOMRenderer(bill_of_materials, cache_dir=args.cache_dir, render=False)
     except Exception as e:
         print(f"Error during rendering: {e}")
         sys.exit(1)
 
-    if args.console:
-        print(renderer.output)
-
-    # Write the output file
+    # Render straight into the output file and/or the console
     try:
-        renderer.write_file(output_file)
+        renderer.write_stream(output_file, console=args.console or output_file is None)
     except Exception as e:
         print(f"Error writing file: {e}")
         sys.exit(1)
+    if output_file:
+        print(f'{output_file} written successfully')
+
+    if cache:
+        cache.evict()
+    if args.memory_budget is not None:
+        bill_of_materials.close()
 
 
 def cli():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        command = importlib.import_module(COMMANDS[sys.argv[1]])
+        command.main(command.parse_args(sys.argv[2:]))
+        return
     args = parse_args()
     main(args)
 
@@ -0,0 +1,109 @@
+import argparse
+import pickle
+import sys
+import time
+
+from pathlib import Path
+from typing import List, Optional
+from reporter_cli.batch import TEMPLATE_DIR, output_path
+from reporter_cli.model import PARSER_VERSION, IncrementalTextProcessor, TableBOM, BOMRenderer
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter follow',
+                                     description='Keep a report up to date with an append-only input')
+    parser.add_argument('--input', type=str, required=True, help='Input file name')
+    parser.add_argument('--output', type=str, required=False, help='Output file name')
+    parser.add_argument('--template', type=str, default='project_summary_template', help='Template name')
+    parser.add_argument('--console', action='store_true', help='Prints the report to the console after each update')
+    parser.add_argument('--state', type=str, required=False,
+                        help='File to keep the parser state and bill of materials in between runs')
+    parser.add_argument('--interval', type=float, default=2.0, help='Seconds between checks for appended data')
+    parser.add_argument('--once', action='store_true', help='Process what has been appended and exit')
+    parser.add_argument('--cache-dir', type=str, required=False,
+                        help='Directory to keep compiled templates in between runs (default $REPORTER_CACHE_DIR)')
+    return parser.parse_args(argv)
+
+
+class Follower:
+    """ Keeps a TableBOM in step with an append-only file, optionally saving its state between runs """
+    def __init__(self,
+                 input_file: Path,
+                 state_file: Optional[Path] = None):
+        self.input_file = Path(input_file)
+        self.state_file = Path(state_file) if state_file else None
+        self.processor = None
+        self.bom = None
+        if self.state_file and self.state_file.exists():
+            self._load()
+        if self.processor is None:
+            self.reset()
+
+    def reset(self):
+        self.processor = IncrementalTextProcessor(self.input_file)
+        self.bom = TableBOM([], None)
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'rb') as f:
+                version, input_file, processor, bom = pickle.load(f)
+        except Exception as e:
+            print(f'Ignoring unreadable state file {self.state_file}. Error: {e}')
+            return
+        # state from another parser version or another input would give a wrong report
+        if version == PARSER_VERSION and input_file == str(self.input_file.resolve()):
+            self.processor, self.bom = processor, bom
+
+    def save(self):
+        if self.state_file:
+            temp = self.state_file.with_name(self.state_file.name + '.tmp')
+            with open(temp, 'wb') as f:
+                pickle.dump((PARSER_VERSION, str(self.input_file.resolve()), self.processor, self.bom), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            temp.replace(self.state_file)
+
+    def poll(self) -> bool:
+        """ parses whatever was appended since the last poll, returns True if the bill of materials changed """
+        if self.input_file.stat().st_size < self.processor.offset:
+            # truncated or replaced, so nothing read so far can be trusted
+            print(f'{self.input_file} shrank, starting over')
+            self.reset()
+        tables = self.processor.update()
+        self.bom.project_name = self.processor.project_name
+        if not tables:
+            return False
+        self.bom.add_tables(tables, resume=self.processor.resumed)
+        return True
+
+
+def main(args):
+    input_file = Path(args.input)
+    output_file = Path(args.output) if args.output else output_path(input_file)
+
+    if not input_file.exists():
+        print(f"Error: Input file '{input_file}' does not exist.")
+        sys.exit(1)
+    if not (TEMPLATE_DIR / args.template).exists():
+        print(f"Error: Template file '{args.template}' does not exist.")
+        sys.exit(1)
+
+    follower = Follower(input_file, args.state)
+    try:
+        while True:
+            try:
+                changed = follower.poll()
+                if changed:
+                    renderer = BOMRenderer(follower.bom, args.template, cache_dir=args.cache_dir, render=False)
+                    renderer.write_stream(output_file, console=args.console)
+                    print(f'{output_file} updated, {follower.processor.table_count} tables so far')
+                elif args.once:
+                    print('No new tables')
+                follower.save()
+            except Exception as e:
+                print(f"Error following input file: {e}")
+                sys.exit(1)
+            if args.once:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        follower.save()
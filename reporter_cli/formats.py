@@ -0,0 +1,158 @@
+import csv
+import io
+import json
+import struct
+import sys
+
+from array import array
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, TextIO
+from reporter_cli import stats
+from reporter_cli.model import TableBOM, BOMRenderer, format_minor
+
+# Machine readable writers for a TableBOM, which skip the template engine entirely.
+# Every format carries the same records: one 'item' per cost table entry, one 'subtotal' per material and a final
+# 'total'. Materials without any costs get a subtotal of 0. Costs are written as exact decimals (12.50) in the text
+# formats and as integer minor units (1250) in the binary one.
+
+# file extension used for default output names
+EXTENSIONS = {'jsonl': '.jsonl', 'csv': '.csv', 'binary': '.bom'}
+
+CSV_HEADER = ('record', 'project', 'material', 'item', 'cost', 'currency')
+
+BINARY_MAGIC = b'RPTBOM2\0'
+BINARY_LENGTH = struct.Struct('<Q')
+
+
+def write_jsonl(bom: TableBOM, f: TextIO):
+    """ one JSON object per line, strings are escaped once per material rather than once per row """
+    dumps = json.dumps
+    project = dumps(bom.project_name)
+    # only a handful of distinct currencies, so escape each once
+    currency_json = lru_cache(maxsize=None)(dumps)
+    for name, material in bom.bill_of_materials.items():
+        prefix = f'{{"record": "item", "project": {project}, "material": {dumps(name)}, "item": '
+        f.writelines(f'{prefix}{dumps(item)}, "cost": {format_minor(cost)}, "currency": {currency_json(currency)}}}\n'
+                     for item, cost, currency in material.iter_costs())
+        f.write(f'{{"record": "subtotal", "project": {project}, "material": {dumps(name)}, '
+                f'"cost": {format_minor(material.sub_total_minor)}, "currency": {dumps(bom.currency_symbol)}}}\n')
+    f.write(f'{{"record": "total", "project": {project}, "cost": {format_minor(bom.total_minor)}, '
+            f'"currency": {dumps(bom.currency_symbol)}}}\n')
+
+
+def write_csv(bom: TableBOM, f: TextIO):
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(CSV_HEADER)
+    project = bom.project_name
+    for name, material in bom.bill_of_materials.items():
+        writer.writerows(('item', project, name, item, format_minor(cost), currency)
+                         for item, cost, currency in material.iter_costs())
+        writer.writerow(('subtotal', project, name, '', format_minor(material.sub_total_minor), bom.currency_symbol))
+    writer.writerow(('total', project, '', '', format_minor(bom.total_minor), bom.currency_symbol))
+
+
+def _write_block(f: BinaryIO, data: bytes):
+    f.write(BINARY_LENGTH.pack(len(data)))
+    f.write(data)
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_binary(bom: TableBOM, f: BinaryIO):
+    """ compact columnar dump: a JSON header then length prefixed little-endian columns.
+
+    The header holds the project, currency, total and each material with its subtotal and number of items.
+    The columns are the item costs as int64 minor units, their currencies and the item names as newline separated UTF-8.
+    Items are grouped by material, in the same order as the header.
+    """
+    materials = bom.bill_of_materials.items()
+    header = {'project': bom.project_name,
+              'currency': bom.currency_symbol,
+              'total_minor': bom.total_minor,
+              'materials': [{'name': name, 'sub_total_minor': material.sub_total_minor, 'items': material.cost_count}
+                            for name, material in materials]}
+    costs = array('q')
+    currencies = []
+    names = []
+    for _, material in materials:
+        for item, cost, currency in material.iter_costs():
+            names.append(item)
+            costs.append(cost)
+            currencies.append(currency)
+
+    f.write(BINARY_MAGIC)
+    _write_block(f, json.dumps(header).encode('utf-8'))
+    _write_block(f, _little_endian(costs))
+    _write_block(f, '\n'.join(currencies).encode('utf-8'))
+    _write_block(f, '\n'.join(names).encode('utf-8'))
+
+
+def read_binary(f: BinaryIO) -> Dict:
+    """ reads a dump from write_binary back into its header plus 'costs', 'currencies' and 'names' columns """
+    if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError('not a binary bill of materials')
+
+    def block():
+        length, = BINARY_LENGTH.unpack(f.read(BINARY_LENGTH.size))
+        return f.read(length)
+
+    dump = json.loads(block())
+    costs = array('q')
+    costs.frombytes(block())
+    if sys.byteorder == 'big':
+        costs.byteswap()
+    dump['costs'] = costs
+    currencies, names = block().decode('utf-8'), block().decode('utf-8')
+    dump['currencies'] = currencies.split('\n') if costs else []
+    dump['names'] = names.split('\n') if costs else []
+    return dump
+
+
+WRITERS = {'jsonl': write_jsonl, 'csv': write_csv, 'binary': write_binary}
+
+
+@contextmanager
+def _open_output(output_file: Optional[Path], binary: bool) -> Iterator:
+    if output_file is None:
+        yield sys.stdout.buffer if binary else sys.stdout
+        return
+    if binary:
+        with open(output_file, 'wb') as f:
+            yield f
+    else:
+        with open(output_file, 'w', encoding='utf-8', newline='') as f:
+            yield f
+
+
+def write_report(bom: TableBOM, output_format: str, output_file: Optional[Path] = None):
+    """ writes the bill of materials in one of the WRITERS formats to output_file, or to stdout if there is none """
+    with stats.current().stage('write'), _open_output(output_file, output_format == 'binary') as f:
+        WRITERS[output_format](bom, f)
+        f.flush()
+    if output_file:
+        stats.current().incr('bytes_written', Path(output_file).stat().st_size)
+
+
+def render_bytes(bom: TableBOM, output_format: str = 'text', template: str = 'project_summary_template',
+                 cache_dir: Optional[Path] = None) -> bytes:
+    """ the report as it would be written to a file, in any format, for callers that do their own writing """
+    run_stats = stats.current()
+    if output_format == 'text':
+        renderer = BOMRenderer(bom, template, cache_dir=cache_dir, render=False)
+        with run_stats.stage('render'):
+            return ''.join(renderer.stream()).encode('utf-8')
+    with run_stats.stage('write'):
+        if output_format == 'binary':
+            f = io.BytesIO()
+            WRITERS[output_format](bom, f)
+            return f.getvalue()
+        f = io.StringIO(newline='')
+        WRITERS[output_format](bom, f)
+        return f.getvalue().encode('utf-8')
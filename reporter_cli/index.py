@@ -0,0 +1,299 @@
+import argparse
+import hashlib
+import json
+import sqlite3
+import sys
+
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from reporter_cli.batch import TEMPLATE_DIR, collect_inputs
+from reporter_cli.model import PARSER_VERSION, TextProcessor, TableBOM, BOMRenderer, decompress
+
+# Every extracted row in a SQLite database, so reports and queries don't have to parse the sources again.
+# items holds one row per table row with its cost in minor units (NULL when the row has none) and all of its cells as
+# a JSON list. tables keeps each header, which is enough to rebuild the exact tables TextProcessor returned.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    project TEXT,
+    parser_version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tables (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    position INTEGER NOT NULL,
+    material TEXT NOT NULL,
+    header TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    table_id INTEGER NOT NULL REFERENCES tables(id),
+    project TEXT,
+    material TEXT NOT NULL,
+    item TEXT NOT NULL,
+    cost INTEGER,
+    currency TEXT,
+    cells TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tables_source ON tables(source_id, position);
+CREATE INDEX IF NOT EXISTS items_source ON items(source_id);
+CREATE INDEX IF NOT EXISTS items_project ON items(project);
+CREATE INDEX IF NOT EXISTS items_material ON items(material);
+CREATE INDEX IF NOT EXISTS items_item ON items(item);
+CREATE INDEX IF NOT EXISTS items_cost ON items(cost);
+'''
+
+DEFAULT_DB = 'reporter.db'
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter index',
+                                     description='Keep the rows of many inputs in a SQLite index and report from it')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB, help=f'Index database (default {DEFAULT_DB})')
+    actions = parser.add_subparsers(dest='action', required=True)
+
+    update = actions.add_parser('update', help='Index new and changed inputs')
+    update.add_argument('inputs', nargs='+',
+                        help='Input files, directories, glob patterns or @manifest files listing one input per line')
+    update.add_argument('--pattern', type=str, default='*.txt', help='File pattern used inside directories')
+    update.add_argument('--workers', type=int, required=False, help='Number of worker processes, defaults to CPU count')
+    update.add_argument('--prune', action='store_true', help='Drop indexed sources that no longer exist')
+
+    query = actions.add_parser('query', help='Run a read-only SQL query and print the rows tab separated')
+    query.add_argument('sql', type=str)
+
+    report = actions.add_parser('report', help='Render the report of an indexed input without parsing it')
+    report.add_argument('source', type=str, help='Input file as it was indexed')
+    report.add_argument('--output', type=str, required=False, help="Output file name, or '-' for stdout (default)")
+    report.add_argument('--template', type=str, default='project_summary_template', help='Template name')
+    report.add_argument('--format', choices=['text', 'jsonl', 'csv', 'binary'], default='text',
+                        help='Render with the template (text) or write the bill of materials as data')
+    return parser.parse_args(argv)
+
+
+def parse_source(path: str, known_sha256: Optional[str] = None) -> Tuple[str, Optional[str], Optional[List]]:
+    """ hashes an input and, unless its content is already indexed, extracts its tables """
+    content = Path(path).read_bytes()
+    sha256 = hashlib.sha256(content).hexdigest()
+    if sha256 == known_sha256:
+        return sha256, None, None
+    processor = TextProcessor(path, text=decompress(content).decode('utf-8'))
+    return sha256, processor.project_name, processor.tables
+
+
+def _parse_source(task: Tuple[str, Optional[str]]) -> Tuple:
+    """ parse_source with the error of a source that could not be read or decoded, so it doesn't stop the others """
+    try:
+        return (*parse_source(*task), None)
+    except Exception as e:
+        return None, None, None, str(e)
+
+
+class RowIndex:
+    """ SQLite index of every extracted row, keyed by source path and kept current by mtime, size and content hash """
+    # sources written per transaction
+    COMMIT_EVERY = 64
+
+    def __init__(self, db_path: Path = DEFAULT_DB, read_only: bool = False):
+        self.db_path = Path(db_path)
+        if read_only:
+            self.connection = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
+        else:
+            self.connection = sqlite3.connect(self.db_path)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+        # (path, error) of every input the last update could not index
+        self.failed: List[Tuple[str, str]] = []
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sources(self) -> Dict[str, Tuple[int, int, int, str, int]]:
+        """ path -> (id, mtime_ns, size, sha256, parser_version) for every indexed source """
+        cursor = self.connection.execute('SELECT path, id, mtime_ns, size, sha256, parser_version FROM sources')
+        return {path: tuple(rest) for path, *rest in cursor}
+
+    def update(self, input_files: Iterable[Path], workers: Optional[int] = None, prune: bool = False) -> Dict[str, int]:
+        """ indexes the inputs that are new or changed since the last update and returns how many of each kind.
+
+        An input that cannot be read or decoded is left as it was in the index and listed in failed, the others are
+        still indexed and committed.
+        """
+        counts = {'indexed': 0, 'unchanged': 0, 'touched': 0, 'removed': 0, 'failed': 0}
+        self.failed = []
+        known = self.sources()
+        tasks, stat_results = [], {}
+        for input_file in input_files:
+            path = str(Path(input_file).resolve())
+            try:
+                stat = Path(path).stat()
+            except OSError as e:
+                self.failed.append((path, str(e)))
+                counts['failed'] += 1
+                continue
+            stat_results[path] = stat
+            entry = known.get(path)
+            if entry and entry[1:3] == (stat.st_mtime_ns, stat.st_size) and entry[4] == PARSER_VERSION:
+                counts['unchanged'] += 1
+            else:
+                # only the hash is needed when the content turns out to be the same
+                tasks.append((path, entry[3] if entry and entry[4] == PARSER_VERSION else None))
+
+        for i, (path, sha256, project, tables, error) in enumerate(self._parse(tasks, workers), 1):
+            stat = stat_results[path]
+            if error is not None:
+                self.failed.append((path, error))
+                counts['failed'] += 1
+            elif tables is None:
+                self.connection.execute('UPDATE sources SET mtime_ns = ?, size = ? WHERE path = ?',
+                                        (stat.st_mtime_ns, stat.st_size, path))
+                counts['touched'] += 1
+            else:
+                self._replace_source(path, stat.st_mtime_ns, stat.st_size, sha256, project, tables)
+                counts['indexed'] += 1
+            if i % self.COMMIT_EVERY == 0:
+                self.connection.commit()
+
+        if prune:
+            for path, entry in known.items():
+                if path not in stat_results and not Path(path).exists():
+                    self._delete_rows(entry[0])
+                    self.connection.execute('DELETE FROM sources WHERE id = ?', (entry[0],))
+                    counts['removed'] += 1
+        self.connection.commit()
+        return counts
+
+    @staticmethod
+    def _parse(tasks: List[Tuple[str, Optional[str]]], workers: Optional[int]) -> Iterator[Tuple]:
+        if workers == 1 or len(tasks) < 2:
+            for task in tasks:
+                yield (task[0], *_parse_source(task))
+            return
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for task, parsed in zip(tasks, pool.map(_parse_source, tasks, chunksize=8)):
+                yield (task[0], *parsed)
+
+    def _delete_rows(self, source_id: int):
+        self.connection.execute('DELETE FROM items WHERE source_id = ?', (source_id,))
+        self.connection.execute('DELETE FROM tables WHERE source_id = ?', (source_id,))
+
+    def _replace_source(self, path: str, mtime_ns: int, size: int, sha256: str, project: Optional[str], tables: List):
+        connection = self.connection
+        row = connection.execute('SELECT id FROM sources WHERE path = ?', (path,)).fetchone()
+        if row:
+            source_id = row[0]
+            self._delete_rows(source_id)
+            connection.execute('UPDATE sources SET mtime_ns = ?, size = ?, sha256 = ?, project = ?, parser_version = ? '
+                               'WHERE id = ?', (mtime_ns, size, sha256, project, PARSER_VERSION, source_id))
+        else:
+            source_id = connection.execute('INSERT INTO sources (path, mtime_ns, size, sha256, project, parser_version) '
+                                           'VALUES (?, ?, ?, ?, ?, ?)',
+                                           (path, mtime_ns, size, sha256, project, PARSER_VERSION)).lastrowid
+        # costs come from the same column detection TableBOM uses
+        bom = TableBOM([], project)
+        for position, (header, data) in enumerate(tables):
+            if not header:
+                continue
+            table_id = connection.execute('INSERT INTO tables (source_id, position, material, header) '
+                                          'VALUES (?, ?, ?, ?)',
+                                          (source_id, position, header[0], json.dumps(header))).lastrowid
+            rows, costs, currencies = bom.extract_costs(header, data) if data else ((), (), ())
+            priced = dict(zip(rows, zip(costs, currencies)))
+            connection.executemany(
+                'INSERT INTO items (source_id, table_id, project, material, item, cost, currency, cells) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((source_id, table_id, project, header[0], row[0], *priced.get(i, (None, None)), json.dumps(row))
+                 for i, row in enumerate(data)))
+
+    def query(self, sql: str, parameters: Tuple = ()) -> Tuple[List[str], List[Tuple]]:
+        """ the column names and rows of a query """
+        cursor = self.connection.execute(sql, parameters)
+        return [column[0] for column in cursor.description or ()], cursor.fetchall()
+
+    def load_tables(self, path: Path) -> Tuple[Optional[str], List[Tuple[List, List]]]:
+        """ the project name and tables of an indexed source, as TextProcessor extracted them """
+        row = self.connection.execute('SELECT id, project FROM sources WHERE path = ?',
+                                      (str(Path(path).resolve()),)).fetchone()
+        if row is None:
+            raise KeyError(f"'{path}' is not indexed")
+        source_id, project = row
+        tables = {}
+        for table_id, header in self.connection.execute(
+                'SELECT id, header FROM tables WHERE source_id = ? ORDER BY position', (source_id,)):
+            tables[table_id] = (json.loads(header), [])
+        for table_id, cells in self.connection.execute(
+                'SELECT table_id, cells FROM items WHERE source_id = ? ORDER BY id', (source_id,)):
+            tables[table_id][1].append(json.loads(cells))
+        return project, list(tables.values())
+
+
+def main(args):
+    if args.action != 'update' and not Path(args.db).exists():
+        print(f"Error: Index '{args.db}' does not exist, run 'reporter index update' first.")
+        sys.exit(1)
+
+    if args.action == 'update':
+        try:
+            inputs = collect_inputs(args.inputs, args.pattern)
+        except OSError as e:
+            print(f"Error reading manifest: {e}")
+            sys.exit(1)
+        try:
+            with RowIndex(args.db) as index:
+                counts = index.update(inputs, args.workers, args.prune)
+        except (OSError, sqlite3.Error, UnicodeDecodeError) as e:
+            print(f"Error updating index: {e}")
+            sys.exit(1)
+        for path, error in index.failed:
+            print(f"failed   {path} {error}")
+        print(f"{counts['indexed']} indexed, {counts['unchanged'] + counts['touched']} unchanged, "
+              f"{counts['removed']} removed, {counts['failed']} failed")
+        if counts['failed']:
+            sys.exit(1)
+
+    elif args.action == 'query':
+        try:
+            with RowIndex(args.db, read_only=True) as index:
+                columns, rows = index.query(args.sql)
+        except sqlite3.Error as e:
+            print(f"Error in query: {e}")
+            sys.exit(1)
+        print('\t'.join(columns))
+        for row in rows:
+            print('\t'.join('' if value is None else str(value) for value in row))
+
+    elif args.action == 'report':
+        if not (TEMPLATE_DIR / args.template).exists():
+            print(f"Error: Template file '{args.template}' does not exist.")
+            sys.exit(1)
+        try:
+            with RowIndex(args.db, read_only=True) as index:
+                project, tables = index.load_tables(args.source)
+        except KeyError as e:
+            print(f"Error: {e.args[0]}")
+            sys.exit(1)
+        if not tables:
+            print('No tables extracted, exiting')
+            sys.exit(0)
+        bom = TableBOM(tables, project)
+        output_file = Path(args.output) if args.output and args.output != '-' else None
+        if args.format != 'text':
+            from reporter_cli.formats import write_report
+            write_report(bom, args.format, output_file)
+        else:
+            BOMRenderer(bom, args.template, render=False).write_stream(output_file, console=output_file is None)
+        if output_file:
+            print(f'{output_file} written successfully')
@@ -1,48 +1,221 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from bisect import bisect_left
+from contextlib import ExitStack, nullcontext
+from itertools import islice
 from pathlib import Path
+import importlib
+import io
+import os
 import re
-from typing import Tuple, List, Dict, Optional
-from jinja2 import Environment, select_autoescape, PackageLoader
+import sys
+import time
+from typing import TYPE_CHECKING, BinaryIO, Tuple, List, Dict, Optional, Iterable, Iterator, Union
+from reporter_cli import stats, tokenizer
+
+if TYPE_CHECKING:
+    from decimal import Decimal
+    from jinja2 import Environment
+
+# jinja2, the process pool and the modules only some inputs need (decimal, mmap, struct, threading, queue, codecs) are
+# imported where they are first needed, to keep CLI startup fast
+
+# bump whenever a change to parsing or the bill of materials would make cached results stale
+PARSER_VERSION = 4
+
+# amounts are kept as integers of the minor unit, every supported currency has 100 of them to the major unit
+MINOR_UNITS = 100
+
+
+def to_decimal(minor: int) -> 'Decimal':
+    """ exact value of an amount in minor units, e.g. 1250 -> Decimal('12.50') """
+    from decimal import Decimal
+    return Decimal(minor).scaleb(-2)
+
+
+def format_minor(minor: int) -> str:
+    """ an amount in minor units as a plain decimal string with two places, e.g. 1250 -> '12.50' """
+    sign = '-' if minor < 0 else ''
+    major, cents = divmod(abs(minor), MINOR_UNITS)
+    return f'{sign}{major}.{cents:02d}'
+
+
+def format_money(value) -> str:
+    """ template filter printing a cost with two decimal places, exact for the Decimal values of a bill of materials """
+    from decimal import Decimal
+    return f'{Decimal(value):.2f}'
+
+
+# compressed inputs are recognised by extension or magic bytes and read with the stdlib module for the format
+COMPRESSION_SUFFIXES = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma'}
+COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'lzma'))
+# decompressed bytes handed from the decompressing thread to the parser at a time, and how many can be waiting
+DECOMPRESS_BLOCK = 1024 * 1024
+DECOMPRESS_QUEUE = 8
+# characters of a plain input read into lines at a time when streaming
+READ_BLOCK = 256 * 1024
+
+
+def detect_compression(filename: Path, head: Optional[bytes] = None) -> Optional[str]:
+    """ the module that decompresses a file ('gzip', 'bz2' or 'lzma'), or None for plain text """
+    module = COMPRESSION_SUFFIXES.get(Path(filename).suffix.lower())
+    if module:
+        return module
+    if head is None:
+        try:
+            with open(filename, 'rb') as f:
+                head = f.read(6)
+        except OSError:
+            return None
+    for magic, module in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            return module
+    return None
+
+
+def plain_name(filename: Path) -> Path:
+    """ the file name without a compression extension, e.g. spec.txt.gz -> spec.txt """
+    filename = Path(filename)
+    return filename.with_suffix('') if filename.suffix.lower() in COMPRESSION_SUFFIXES else filename
+
+
+def open_binary(filename: Path) -> BinaryIO:
+    """ opens a file for reading bytes, decompressing it on the fly if it is compressed """
+    module = detect_compression(filename)
+    if module is None:
+        return open(filename, 'rb')
+    return importlib.import_module(module).open(filename, 'rb')
+
+
+def decompress(content: bytes) -> bytes:
+    """ the decompressed content of a compressed file read into memory, or the content itself """
+    module = detect_compression(Path(), content[:6])
+    return importlib.import_module(module).decompress(content) if module else content
+
+
+def read_text(filename: Path) -> str:
+    """ reads a whole input, compressed or not, the way TextProcessor does """
+    with io.TextIOWrapper(open_binary(filename), encoding='utf-8') as f:
+        return f.read()
+
+
+def iter_lines(filename: Path) -> Iterator[str]:
+    """ yields the lines of an input. A compressed one is decompressed by a background thread, a bounded number of
+    blocks ahead of the caller, so inflating the next block overlaps with parsing this one.
+
+    Getting the lines counts as the read stage, apart from whatever the caller does with them.
+    """
+    for lines in stats.current().timed(_line_batches(filename), 'read'):
+        yield from lines
+
+
+def read_batches(f) -> Iterator[List[str]]:
+    """ the lines of an open text file, READ_BLOCK characters worth at a time """
+    return iter(lambda: f.readlines(READ_BLOCK), [])
+
+
+def _line_batches(filename: Path) -> Iterator[List[str]]:
+    if detect_compression(filename) is None:
+        with open(filename, 'r', encoding='utf-8') as f:
+            yield from read_batches(f)
+        return
+
+    import codecs
+    import queue
+    import threading
+
+    blocks = queue.Queue(maxsize=DECOMPRESS_QUEUE)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def produce():
+        try:
+            with open_binary(filename) as f:
+                while not stop.is_set():
+                    block = f.read(DECOMPRESS_BLOCK)
+                    put(block)
+                    if not block:
+                        return
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=produce, name='reporter-decompress', daemon=True)
+    thread.start()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    carry = ''
+    decompressed = 0
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, BaseException):
+                raise block
+            decompressed += len(block)
+            text = carry + decoder.decode(block, final=not block)
+            # universal newlines, like reading a plain file in text mode
+            lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+            if not block:
+                last = lines.pop()
+                yield [line + '\n' for line in lines] + ([last] if last else [])
+                return
+            # a trailing \r may be the first half of \r\n, so it waits for the next block too
+            carry = lines.pop()
+            if text.endswith('\r'):
+                carry = lines.pop() + '\r' if lines else '\r'
+            yield [line + '\n' for line in lines]
+    finally:
+        stop.set()
+        thread.join()
+        stats.current().incr('bytes_decompressed', decompressed)
 
 
 class TextProcessor:
     """ Class to encapuslate opening a file and extracting tables and project name """
+    # inputs larger than this are split into chunks of about this many characters when parsing with several jobs
+    CHUNK_SIZE = 4 * 1024 * 1024
+
     def __init__(self,
-                 filename: Path):
+                 filename: Path,
+                 jobs: int = 1,
+                 text: Optional[str] = None):
         self.filename = Path(filename)
-        self.text = self._read_file()
+        self.jobs = jobs
+        run_stats = stats.current()
         self.project_name = None
-        self.tables = self.extract_tables()
+        self.table_count = 0
+        if text is None and jobs <= 1 and detect_compression(self.filename):
+            # parse while a background thread decompresses, rather than inflating the whole input first
+            self.text = None
+            with run_stats.stage('extract_tables'):
+                self.tables = list(self.iter_tables(iter_lines(self.filename)))
+            return
+        # text can be handed in when the caller has already read the file
+        with run_stats.stage('read'):
+            self.text = self._read_file() if text is None else text
+        with run_stats.stage('extract_tables'):
+            self.tables = self.extract_tables()
 
     def _read_file(self):
-        with self.filename.open('r', encoding='utf-8') as f:
-            return f.read()
+        return read_text(self.filename)
 
     @staticmethod
     def _process_table(table: List) -> Tuple[List, List]:
         """ Extract header and rows from table """
-        try:
-            header = [cell.strip() for cell in table[0].split('|') if cell.strip()]
-        except Exception as e:
-            print(f'Header Could not be Parsed. Error:{e}')
-            header = []
-        try:
-            data = []
-            for row in table[2:]:
-                cells = [cell.strip() for cell in row.split('|') if cell.strip()]
-                if len(cells) == len(header):
-                    data.append(cells)
-        except Exception as e:
-            print(f'Data Could not be Parsed. Error:{e}')
-            data = []
-        return header, data
+        return tokenizer.process_table(table)
 
-    def extract_tables(self) -> List:
-        """ Extract Tables from text"""
-        tables = []
+    def iter_tables(self, lines: Iterable[str]) -> Iterator[Tuple[List, List]]:
+        """ Yield tables from an iterable of lines as soon as each one is closed """
         current_table = []
         inside_table = False
+        scanned = 0
         try:
-            for line in self.text.splitlines():
+            for scanned, line in enumerate(lines, 1):
                 line = line.strip()
                 if line.startswith('|') and line.endswith('|'):
                     if not inside_table:
@@ -52,163 +225,872 @@ class TextProcessor:
                         current_table.append(line)
                 elif line.startswith('#'):
                     if not self.project_name:
-                        self.project_name = ''.join(line[1:].strip())
+                        # the first title with any text, as the tokenizer picks it
+                        self.project_name = tokenizer.title_text(line)
                 else:
                     if inside_table:
                         inside_table = False
                         if len(current_table) >= 2:
-                            tables.append(self._process_table(current_table))
+                            self.table_count += 1
+                            stats.current().incr('tables_found')
+                            yield self._process_table(current_table)
                         current_table = []
 
             if inside_table and len(current_table) >= 2:
-                tables.append(self._process_table(current_table))
+                self.table_count += 1
+                stats.current().incr('tables_found')
+                yield self._process_table(current_table)
         except Exception as e:
             print(f'Could not extract tables from provided text. Error: {e}')
+        finally:
+            stats.current().incr('lines_scanned', scanned)
+
+    def extract_tables(self) -> List:
+        """ Extract Tables from text"""
+        if self.jobs > 1 and len(self.text) > self.CHUNK_SIZE:
+            return self._extract_tables_parallel()
+        project_name, tables = tokenizer.extract_tables(self.text)
+        if not self.project_name:
+            self.project_name = project_name
+        self.table_count += len(tables)
         return tables
 
+    def split_chunks(self, size: int) -> Iterator[str]:
+        """ Splits the text roughly every `size` characters, always just before a line outside any table.
+
+        A table or title line is never the first line of a chunk, so no table can straddle two chunks.
+        """
+        text = self.text
+        start = 0
+        while start < len(text):
+            split = None
+            line_start = text.find('\n', start + size) + 1
+            while line_start:
+                line_end = text.find('\n', line_start)
+                line = text[line_start:line_end if line_end != -1 else len(text)].strip()
+                if not ((line.startswith('|') and line.endswith('|')) or line.startswith('#')):
+                    split = line_start
+                    break
+                line_start = line_end + 1
+            if split is None:
+                yield text[start:]
+                return
+            yield text[start:split]
+            start = split
+
+    def _extract_tables_parallel(self) -> List:
+        from concurrent.futures import ProcessPoolExecutor
+
+        tables = []
+        with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+            for project_name, chunk_tables, chunk_stats in pool.map(_extract_chunk, self.split_chunks(self.CHUNK_SIZE)):
+                # the first title of the document still wins
+                if not self.project_name:
+                    self.project_name = project_name
+                stats.current().merge(chunk_stats)
+                self.table_count += len(chunk_tables)
+                tables.extend(chunk_tables)
+        return tables
+
+
+def _extract_chunk(chunk: str) -> Tuple[Optional[str], List, Dict]:
+    """ Worker side of TextProcessor._extract_tables_parallel """
+    with stats.collecting(notify=False) as chunk_stats:
+        project_name, tables = tokenizer.extract_tables(chunk)
+    return project_name, tables, chunk_stats.as_dict()
+
+
+class StreamingTextProcessor(TextProcessor):
+    """ Extracts tables lazily from a file name, an open file handle or any iterable of lines.
+
+    Nothing is read until `tables` is consumed, so memory is bounded by the largest single table
+    rather than by the whole document. The project name is only known once the title line has been read.
+    """
+    def __init__(self,
+                 source: Union[Path, str, Iterable[str]]):
+        self.source = source
+        self.filename = Path(source) if isinstance(source, (str, Path)) else None
+        self.text = None
+        self.project_name = None
+        self.table_count = 0
+        # the tables are parsed while the caller consumes them, which is timed apart from the caller's own work
+        self.tables = stats.current().timed(self.iter_tables(self._iter_lines()), 'extract_tables')
+
+    def _iter_lines(self) -> Iterator[str]:
+        if self.filename is not None:
+            yield from iter_lines(self.filename)
+        elif hasattr(self.source, 'readlines'):
+            for lines in stats.current().timed(read_batches(self.source), 'read'):
+                yield from lines
+        else:
+            yield from self.source
+
+
+class IncrementalTextProcessor(TextProcessor):
+    """ Parses an append-only file a batch of new lines at a time.
+
+    Each update() only reads the complete lines appended since the last one. Rows of a table still open at the end of
+    the file are handed out straight away and the table is resumed by the next update. The whole object pickles, so
+    the parser state can be kept between runs.
+    """
+    def __init__(self,
+                 filename: Path):
+        self.filename = Path(filename)
+        self.text = None
+        self.project_name = None
+        self.table_count = 0
+        self.tables = []
+        # bytes of the file parsed so far, always ending at a line break
+        self.offset = 0
+        # the table open at the end of what has been read so far
+        self._header = None
+        self._open_lines = 0
+        self._pending = []
+        # the open table has handed out rows already
+        self._emitted = False
+        # the first table of the last update continues the last one of the update before
+        self.resumed = False
+
+    def update(self) -> List[Tuple[List, List]]:
+        """ parses newly appended lines, returning new rows as (header, data) tables """
+        with self.filename.open('rb') as f:
+            f.seek(self.offset)
+            appended = f.read()
+        # a partial last line is left for the next update
+        end = appended.rfind(b'\n') + 1
+        self.offset += end
+        tables = []
+        self.resumed = False
+        lines = appended[:end].decode('utf-8').splitlines()
+        run_stats = stats.current()
+        run_stats.incr('lines_scanned', len(lines))
+        for line in lines:
+            line = line.strip()
+            if line.startswith('|') and line.endswith('|'):
+                if self._header is None:
+                    self._header = line
+                self._open_lines += 1
+                if self._open_lines == 2:
+                    self.table_count += 1
+                    run_stats.incr('tables_found')
+                if self._open_lines == 2 and tokenizer.is_separator(line):
+                    continue
+                if self._open_lines >= 2:
+                    self._pending.append(line)
+            elif line.startswith('#'):
+                if not self.project_name:
+                    self.project_name = tokenizer.title_text(line)
+            elif self._header is not None:
+                self._flush(tables)
+                self._header = None
+                self._open_lines = 0
+                self._emitted = False
+        self._flush(tables)
+        # only the latest update is kept, earlier rows live on in whatever consumed them
+        self.tables = tables
+        return tables
+
+    def _flush(self, tables: List):
+        if self._pending:
+            # the separator row was skipped by update(), so every pending line is a row, even one that looks like it
+            header = tokenizer.split_cells(self._header)
+            if not tables and self._emitted:
+                self.resumed = True
+            tables.append((header, tokenizer.process_rows(header, self._pending)))
+            self._pending = []
+            self._emitted = True
+
+
+class TableIndex:
+    """ Byte offsets of the title line and of every table block in a file.
+
+    Saved next to a large input it lets a later run go straight to the tables without scanning the prose again.
+    It is only reused while the size and modification time of the file still match.
+    """
+    MAGIC = b'RPTIDX1\n'
+    # struct format of the size, modification time and title span
+    HEADER = '<QQqq'
+
+    def __init__(self,
+                 size: int,
+                 mtime_ns: int,
+                 title: Optional[Tuple[int, int]],
+                 spans: array):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.title = title
+        # flat array of (start, end) pairs, one pair per table block
+        self.spans = spans
+
+    def __len__(self):
+        return len(self.spans) // 2
+
+    def span(self, i: int) -> Tuple[int, int]:
+        return self.spans[2 * i], self.spans[2 * i + 1]
+
+    def matches(self, filename: Path) -> bool:
+        """ checks the index still describes the file on disk """
+        stat = Path(filename).stat()
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def save(self, index_file: Path):
+        import struct
+        title_start, title_end = self.title if self.title else (-1, -1)
+        spans = array('Q', self.spans)
+        if sys.byteorder == 'big':
+            spans.byteswap()
+        with open(index_file, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack(self.HEADER, self.size, self.mtime_ns, title_start, title_end))
+            f.write(spans.tobytes())
+
+    @classmethod
+    def load(cls, index_file: Path) -> 'TableIndex':
+        import struct
+        with open(index_file, 'rb') as f:
+            if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError(f'{index_file} is not a table index')
+            header = f.read(struct.calcsize(cls.HEADER))
+            try:
+                size, mtime_ns, title_start, title_end = struct.unpack(cls.HEADER, header)
+            except struct.error as e:
+                raise ValueError(f'{index_file} is truncated: {e}')
+            spans = array('Q')
+            spans.frombytes(f.read())
+        if sys.byteorder == 'big':
+            spans.byteswap()
+        title = (title_start, title_end) if title_start >= 0 else None
+        return cls(size, mtime_ns, title, spans)
+
+
+class MappedTables(Sequence):
+    """ Tables of a memory mapped file, only decoded and parsed when they are asked for """
+    def __init__(self,
+                 buffer,
+                 index: TableIndex):
+        self.buffer = buffer
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> Tuple[List, List]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('table index out of range')
+        start, end = self.index.span(i)
+        # title lines do not close a table, so they can sit inside a block
+        text = str(self.buffer[start:end], 'utf-8')
+        return tokenizer.process_table(tokenizer.TEXT_PATTERNS.table_line.findall(text))
+
+
+class MappedTextProcessor(TextProcessor):
+    """ Memory maps a file and indexes its title and tables in one pass over the raw bytes.
+
+    Tables are materialised lazily through `tables`. Passing `index_file` saves the index after scanning,
+    or reuses it without scanning when it still matches the file.
+    """
+    def __init__(self,
+                 filename: Path,
+                 index_file: Optional[Path] = None):
+        self.filename = Path(filename)
+        self.text = None
+        if detect_compression(self.filename):
+            raise ValueError('compressed inputs cannot be memory mapped')
+        import mmap
+        self._file = self.filename.open('rb')
+        try:
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            self.buffer = b''
+        self.index_reused = False
+        if index_file and Path(index_file).exists():
+            try:
+                index = TableIndex.load(index_file)
+                self.index_reused = index.matches(self.filename)
+            except (OSError, ValueError) as e:
+                print(f'Ignoring unreadable table index {index_file}. Error: {e}')
+        if not self.index_reused:
+            with stats.current().stage('scan'):
+                index = self.scan()
+            if index_file:
+                index.save(index_file)
+        self.index = index
+        self.project_name = self._read_title()
+        self.table_count = len(index)
+        stats.current().incr('tables_found', len(index))
+        self.tables = MappedTables(self.buffer, index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if not isinstance(self.buffer, bytes):
+            self.buffer.close()
+        self._file.close()
+
+    @classmethod
+    def scan_buffer(cls, buffer) -> Tuple[Optional[Tuple[int, int]], array]:
+        """ The span of the first title line and the (start, end) pairs of every block of two or more table lines """
+        scanner = tokenizer.Tokenizer(buffer)
+        spans = array('Q')
+        for start, end, _ in scanner.blocks():
+            spans.extend((start, end))
+        return scanner.title(), spans
+
+    def scan(self) -> TableIndex:
+        """ Records the first title line and the extent of every block of two or more table lines """
+        title, spans = self.scan_buffer(self.buffer)
+        stat = self.filename.stat()
+        return TableIndex(stat.st_size, stat.st_mtime_ns, title, spans)
+
+    def _read_title(self) -> Optional[str]:
+        if not self.index.title:
+            return None
+        start, end = self.index.title
+        return tokenizer.title_text(self.buffer[start:end].decode('utf-8').strip())
+
+
+class ItemRow(Mapping):
+    """ Read only view of one row of a material, indexable like the row dicts templates expect """
+    __slots__ = ('_material', '_row')
+
+    def __init__(self, material: 'Material', row: int):
+        self._material = material
+        self._row = row
+
+    def __getitem__(self, key: str):
+        if key == 'item_name':
+            return self._material.names[self._row]
+        value = self._material.columns[key][self._row]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        yield 'item_name'
+        for attr, column in self._material.columns.items():
+            if column[self._row] is not None:
+                yield attr
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CostItem:
+    """ One entry of a cost table, the cost is held in minor units and read as an exact Decimal """
+    __slots__ = ('item_name', 'minor', 'Currency')
+
+    def __init__(self, item_name: str, minor: int, currency: str):
+        self.item_name = item_name
+        self.minor = minor
+        self.Currency = currency
+
+    @property
+    def Cost(self) -> 'Decimal':
+        return to_decimal(self.minor)
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __eq__(self, other):
+        return isinstance(other, CostItem) and (self.item_name, self.minor, self.Currency) == \
+            (other.item_name, other.minor, other.Currency)
+
+    def __repr__(self):
+        return repr({'item_name': self.item_name, 'Cost': self.Cost, 'Currency': self.Currency})
+
+
+class RowsView(Sequence):
+    """ Sequence of ItemRow views over every row of a material """
+    __slots__ = ('_material',)
+
+    def __init__(self, material: 'Material'):
+        self._material = material
+
+    def __len__(self):
+        return len(self._material.names)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[ItemRow, List[ItemRow]]:
+        if isinstance(i, slice):
+            return [ItemRow(self._material, j) for j in range(len(self))[i]]
+        return ItemRow(self._material, range(len(self))[i])
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CostTable(Sequence):
+    """ Sequence of CostItem views over the costs of a material """
+    __slots__ = ('_material',)
+
+    def __init__(self, material: 'Material'):
+        self._material = material
+
+    def __len__(self):
+        return len(self._material.costs)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[CostItem, List[CostItem]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(len(self))[i]]
+        material = self._material
+        i = range(len(self))[i]
+        return CostItem(material.names[material.cost_rows[i]], material.costs[i], material.currencies[i])
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class Material(Mapping):
+    """ Every row of one material stored column-wise.
+
+    Item names, attribute columns and costs are kept in flat lists and arrays instead of a dict per row.
+    It still reads like the old {'items', 'sub_total', 'cost_table'} dict, so templates don't change.
+    """
+    __slots__ = ('names', 'columns', 'cost_rows', 'costs', 'currencies', 'sub_total_minor')
+
+    def __init__(self):
+        self.names = []
+        # attribute name -> one cell per row, None where the row's table didn't have that column
+        self.columns = {}
+        # row of each cost, in step with costs and currencies
+        self.cost_rows = array('L')
+        # costs in minor units
+        self.costs = array('q')
+        self.currencies = []
+        self.sub_total_minor = 0
+
+    def add_rows(self, attrs: List[str], data: List) -> int:
+        """ appends the rows of a table and returns the position of its first row """
+        offset = len(self.names)
+        positions = {sys.intern(attr): i for i, attr in enumerate(attrs, 1)}
+        for attr in positions:
+            if attr not in self.columns:
+                self.columns[attr] = [None] * offset
+        self.names.extend(sys.intern(row[0]) for row in data)
+        for attr, column in self.columns.items():
+            i = positions.get(attr)
+            if i is None:
+                column.extend([None] * len(data))
+            else:
+                column.extend(row[i] if i < len(row) else None for row in data)
+        return offset
+
+    @property
+    def sub_total(self) -> 'Decimal':
+        return to_decimal(self.sub_total_minor)
+
+    @property
+    def cost_count(self) -> int:
+        return len(self.costs)
+
+    def iter_costs(self) -> Iterator[Tuple[str, int, str]]:
+        """ (item name, cost in minor units, currency) for every cost, in document order """
+        names = self.names
+        return ((names[row], cost, currency) for row, cost, currency in zip(self.cost_rows, self.costs, self.currencies))
+
+    def add_costs(self, offset: int, rows: Iterable[int], costs: Iterable[int], currencies: Iterable[str]):
+        self.cost_rows.extend(offset + row for row in rows)
+        self.costs.extend(costs)
+        self.currencies.extend(currencies)
+
+    def remove_costs(self, first_row: int) -> int:
+        """ drops the costs of every row from first_row on, returning their total in minor units """
+        start = bisect_left(self.cost_rows, first_row)
+        removed = sum(self.costs[start:])
+        del self.cost_rows[start:]
+        del self.costs[start:]
+        del self.currencies[start:]
+        self.sub_total_minor -= removed
+        return removed
+
+    def keys(self):
+        return ('items', 'sub_total', 'cost_table') if self.costs else ('items', 'sub_total')
+
+    def __getitem__(self, key: str):
+        if key == 'items':
+            return RowsView(self)
+        if key == 'sub_total':
+            return self.sub_total
+        if key == 'cost_table' and self.costs:
+            return CostTable(self)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class OpenTable:
+    """ A table that is still growing, like the last one of a followed file, and what TableBOM.column_types has seen
+    of its cells so far. Each batch of rows then gets the currency column the whole table would get.
+    """
+    __slots__ = ('header', 'offset', 'column', 'sampled', 'sample_currency', 'any_currency')
+
+    def __init__(self, header: List[str]):
+        self.header = header
+        # position of the first row in its material, once it has rows
+        self.offset = None
+        # the currency column the costs so far were taken from
+        self.column = None
+        self.sampled = [0] * len(header)
+        self.sample_currency = [False] * len(header)
+        self.any_currency = [False] * len(header)
+
+    def add_rows(self, data: List):
+        for column in range(1, len(self.header)):
+            for cell in (row[column] for row in data):
+                if not cell:
+                    continue
+                currency = TableBOM.CURRENCY_PATTERN.fullmatch(cell.replace(',', '')) is not None
+                if self.sampled[column] < TableBOM.SAMPLE_ROWS:
+                    self.sampled[column] += 1
+                    self.sample_currency[column] = self.sample_currency[column] or currency
+                self.any_currency[column] = self.any_currency[column] or currency
+
+    def currency_column(self) -> Optional[int]:
+        """ the column TableBOM.extract_costs would pick for all the rows so far """
+        for found in (self.sample_currency, self.any_currency):
+            if any(found):
+                return found.index(True)
+        return None
+
 
 class TableBOM:
     """ Class to interpret and extracted table as a bill of materials """
+    # a currency symbol then a number with optional decimals, matched after removing commas
+    CURRENCY_PATTERN = re.compile(r'([$£€])(\d+)(?:\.(\d{1,2}))?')
+    NUMBER_PATTERN = re.compile(r'-?\d+(?:\.\d+)?')
+    # rows looked at when deciding what a column contains
+    SAMPLE_ROWS = 20
+
     def __init__(self,
                  tables: list,
                  project_name: str):
         self.tables = tables
-        self.total_cost = 0.0
+        # in minor units, see total_cost for the amount
+        self.total_minor = 0
         self.currency_symbol = None
-        self.bill_of_materials = self.make_bom()
+        # the last table given to add_tables, which the next call may continue
+        self._open = None
+        with stats.current().stage('make_bom'):
+            self.bill_of_materials = self.make_bom()
         self.project_name = project_name
 
     def __repr__(self):
         return f"{self.bill_of_materials}"
 
+    def name_width(self) -> int:
+        """ length of the longest item name, which templates pad the names to """
+        return max((len(name) for material in self.bill_of_materials.values() for name in material.names), default=10)
+
+    @property
+    def total_cost(self) -> 'Decimal':
+        return to_decimal(self.total_minor)
+
     @staticmethod
-    def is_currency(value: str) -> Tuple[Optional[float], Optional[str]]:
+    def minor_units(match: re.Match) -> int:
+        """ the amount of a CURRENCY_PATTERN match in minor units, without going through a float """
+        whole, fraction = match.group(2, 3)
+        minor = int(whole) * MINOR_UNITS
+        if fraction:
+            minor += int(fraction) * (10 if len(fraction) == 1 else 1)
+        return minor
+
+    @classmethod
+    def is_currency(cls, value: str) -> Tuple[Optional['Decimal'], Optional[str]]:
         """ check for currency value assuming symbol is at the start"""
-        # regex that looks for a currency symbol then a number with optional decimals
-        pattern = r'^([$£€])(\d+(\.\d{1,2})?)$'
         # remove commas - bad for european formatting !!
-        value = value.replace(',', '')
-        # Match the value with the pattern
-        match = re.match(pattern, value)
+        match = cls.CURRENCY_PATTERN.fullmatch(value.replace(',', ''))
 
         if match:
             # Extract symbol and number from the match groups
             symbol = match.group(1)
-            number = float(match.group(2))
+            number = to_decimal(cls.minor_units(match))
             return number, symbol
         else:
             return None, None
 
-    def extract_costs(self, data_list: List) -> Tuple:
-        """ Tries to find currency column and make a cost table and sub-total for each 'material' """
-        items = data_list
-        has_currency = False
-        currency_column = None
-        # Find columns that have currency values and create a costs table
-        cost_table = []
-        try:
-            for item in items:
-                for key, value in item.items():
-                    number, symbol = self.is_currency(value)
-                    if symbol:
-                        self.currency_symbol = symbol
-                        has_currency = True
-                        # if we find a currency column, lets only use that one and block any extra ones
-                        if not currency_column:
-                            currency_column = key
-                        if number is not None:
-                            if key == currency_column:
-                                cost_table.append({'item_name': item['item_name']} | {'Cost': number, 'Currency': symbol})
-                    # reset currency column in case tables have different column names
-                    currency_column = None
-
-            if has_currency:
-                sub_tot = 0
-                for item in cost_table:
-                    sub_tot += item['Cost']
-                return cost_table, sub_tot
+    @classmethod
+    def column_types(cls, header: List, data: List) -> List[str]:
+        """ Classifies each column of a table once as 'currency', 'numeric' or 'text' from a sample of its cells.
+
+        The sample is the first SAMPLE_ROWS cells of each column that aren't blank. When none of them is currency the
+        rest of the table is scanned as well, so costs below a run of blank or 'TBD' cells aren't lost.
+        The first column names the items, so it is always text.
+        """
+        types = ['text']
+        for column in range(1, len(header)):
+            cells = list(islice((cell.replace(',', '') for cell in (row[column] for row in data) if cell),
+                                cls.SAMPLE_ROWS))
+            if any(map(cls.CURRENCY_PATTERN.fullmatch, cells)):
+                types.append('currency')
+            elif cells and all(map(cls.NUMBER_PATTERN.fullmatch, cells)):
+                types.append('numeric')
             else:
-                return [], 0
+                types.append('text')
+        if 'currency' not in types:
+            for column in range(1, len(header)):
+                if any(cls.CURRENCY_PATTERN.fullmatch(row[column].replace(',', '')) for row in data if row[column]):
+                    types[column] = 'currency'
+        return types
+
+    def extract_costs(self, header: List, data: List) -> Tuple[array, array, List[str]]:
+        """ Finds the first currency column of a table and returns the rows with a cost, their costs in minor units
+        and currencies """
+        try:
+            types = self.column_types(header, data)
+            if 'currency' not in types:
+                return array('L'), array('q'), []
+            column = types.index('currency')
+            return self.parse_costs([row[column] for row in data])
         except Exception as e:
             print(f'Error in parsing table for currency values. Error: {e}')
-            return [], 0
+            return array('L'), array('q'), []
+
+    def parse_costs(self, cells: List[str]) -> Tuple[array, array, List[str]]:
+        """ the positions of the cells of a currency column that hold a cost, their costs in minor units and currencies
+        """
+        rows, costs, currencies = array('L'), array('q'), []
+        # parse the whole column in one pass, rows that aren't currency are left out of the costs
+        matches = map(self.CURRENCY_PATTERN.fullmatch, [cell.replace(',', '') for cell in cells])
+        minor_units = self.minor_units
+        for row, match in enumerate(matches):
+            if match:
+                rows.append(row)
+                costs.append(minor_units(match))
+                currencies.append(sys.intern(match.group(1)))
+        if currencies:
+            self.currency_symbol = currencies[-1]
+        stats.current().incr('currency_cells', len(costs))
+        return rows, costs, currencies
 
-    def make_bom(self) -> Dict:
+    def make_bom(self) -> Dict[str, Material]:
         """ complies tables into a bill of materials for rendering"""
+        # build up the materials in the order they first appear, so the tables can be consumed in a single pass
+        bom = {}
+        self._add_tables(bom, self.tables)
+        return bom
 
-        try:
-            # build up a set of materials to fill up our bom with
-            indices = set()
+    def add_tables(self, tables: Iterable[Tuple[List, List]], resume: bool = False):
+        """ folds more tables into the bill of materials, updating the subtotals and total rather than recomputing them.
 
-            for table in self.tables:
-                header, data = table
-                index, *_ = header
-                # check if the table actuall has data, if not don't bother with adding it to the bom
-                if data:
-                    indices.add(index)
+        Tables whose header matches an existing material extend it, so a long table can be added a few rows at a time.
+        With resume the first table is more rows of the last table of the previous call, as IncrementalTextProcessor
+        hands out a table still open at the end of the file. Its costs then come from the currency column of the whole
+        table, so they match a parse of the finished file.
+        """
+        tables = list(tables)
+        for i, (header, data) in enumerate(tables):
+            if i == 0 and resume and self._open is not None:
+                self._extend_open(data)
+            elif i == len(tables) - 1:
+                self._open = OpenTable(header)
+                self._extend_open(data)
+            else:
+                self._add_tables(self.bill_of_materials, [(header, data)])
 
-            bom = {index: {'items': [], 'sub_total': 0.0} for index in indices}
+    def _extend_open(self, data: List):
+        if not data:
+            return
+        table = self._open
+        try:
+            index, *attrs = table.header
+            material = self.bill_of_materials.setdefault(sys.intern(index), Material())
+            offset = material.add_rows(attrs, data)
+            if table.offset is None:
+                table.offset = offset
+            table.add_rows(data)
+            column = table.currency_column()
+            if column != table.column:
+                # the new rows changed which column holds the costs, so the earlier rows are priced again
+                self.total_minor -= material.remove_costs(table.offset)
+                table.column = column
+                offset = table.offset
+                cells = material.columns[table.header[column]][offset:]
+            else:
+                cells = [row[column] for row in data] if column is not None else []
+            rows, costs, currencies = self.parse_costs(cells)
+            material.add_costs(offset, rows, costs, currencies)
+            sub_total = sum(costs)
+            material.sub_total_minor += sub_total
+            self.total_minor += sub_total
         except Exception as e:
-            raise Exception(f'BOM Structure Error: {e}')
+            raise Exception(f'Something went wrong setting up the data from the tables {e}')
 
+    def _add_tables(self, bom: Dict[str, Material], tables: Iterable[Tuple[List, List]]):
         try:
-            # add a list of rows to our bom to make it easier on our template.
-            for table in self.tables:
+            for table in tables:
                 header, data = table
-
+                # check if the table actuall has data, if not don't bother with adding it to the bom
                 if data:
                     index, *attrs = header
-                    for row in data:
-                        name, *vals = row
-                        bom[index]['items'].append({'item_name': name} | {a: v for a, v in zip(attrs, vals)})
-
-            for material, mat_bom in bom.items():
-                cost_table, sub_total = self.extract_costs(mat_bom['items'])
-                if cost_table:
-                    bom[material]['cost_table'] = cost_table
-                    bom[material]['sub_total'] = sub_total
-                    self.total_cost += sub_total
+                    material = bom.setdefault(sys.intern(index), Material())
+                    offset = material.add_rows(attrs, data)
+                    rows, costs, currencies = self.extract_costs(header, data)
+                    material.add_costs(offset, rows, costs, currencies)
+                    sub_total = sum(costs)
+                    material.sub_total_minor += sub_total
+                    self.total_minor += sub_total
         except Exception as e:
             raise Exception(f'Something went wrong setting up the data from the tables {e}')
-        return bom
+
+
+# one jinja environment per bytecode cache directory, shared by every renderer in the process
+_environments: Dict[Optional[str], 'Environment'] = {}
+
+
+def get_environment(cache_dir: Optional[Path] = None) -> 'Environment':
+    """ Returns the process wide environment, which compiles each template once and reuses it.
+
+    With a cache_dir (or REPORTER_CACHE_DIR) compiled templates are also kept on disk for the next run.
+    Both caches check the template source, so editing a template invalidates them.
+    """
+    cache_dir = cache_dir or os.environ.get('REPORTER_CACHE_DIR')
+    key = str(cache_dir) if cache_dir else None
+    env = _environments.get(key)
+    if env is None:
+        from jinja2 import Environment, FileSystemBytecodeCache, select_autoescape, PackageLoader
+
+        bytecode_cache = None
+        if cache_dir:
+            template_cache = Path(cache_dir) / 'templates'
+            template_cache.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(str(template_cache))
+        env = Environment(loader=PackageLoader('reporter_cli', 'templates'),
+                          autoescape=select_autoescape(),
+                          bytecode_cache=bytecode_cache)
+        env.filters['money'] = format_money
+        _environments[key] = env
+    return env
 
 
 class BOMRenderer:
     """ simple text renderer using our TableBOM class"""
+    # buffer for writing a streamed report
+    BUFFER_SIZE = 64 * 1024
+
     def __init__(self,
                  bom: TableBOM,
-                 template: str = 'project_summary_template'):
+                 template: str = 'project_summary_template',
+                 cache_dir: Optional[Path] = None,
+                 render: bool = True):
         self.bom = bom
         self.template_name = template
-        self.env = Environment(loader=PackageLoader('reporter_cli', 'templates'),
-                               autoescape=select_autoescape())
+        self.env = get_environment(cache_dir)
         self.template = self.env.get_template(self.template_name)
-        self.output = self.make_report()
+        # leave render off to only ever stream the report with write_stream
+        self.output = self.make_report() if render else None
+
+    def _context(self) -> Dict:
+        width = self.bom.name_width()
+        return {'bom': self.bom.bill_of_materials,
+                'title': self.bom.project_name,
+                'total_cost': self.bom.total_cost,
+                'currency': self.bom.currency_symbol,
+                'max_len': width}
 
     def make_report(self) -> str:
         """ renders a bill of materials object with a jinja2 template"""
         try:
-            max_len = [[b['item_name'] for b in v['items']] for a, v in self.bom.bill_of_materials.items()]
-
-            if max_len:
-                width = max([max([len(item_name) for item_name in col]) for col in max_len])
-            else:
-                width = 10
-
-            return self.template.render(bom=self.bom.bill_of_materials,
-                                        title=self.bom.project_name,
-                                        total_cost=self.bom.total_cost,
-                                        currency=self.bom.currency_symbol,
-                                        max_len=width)
+            with stats.current().stage('render'):
+                return self.template.render(**self._context())
         except Exception as e:
             print(f'Error with template rendering: {e}')
             return ''
 
+    def stream(self) -> Iterator[str]:
+        """ renders the report piece by piece """
+        return self.template.generate(**self._context())
+
+    def write_stream(self, output_file: Optional[Path] = None, console: bool = False):
+        """ renders straight into the output file and/or stdout, so the whole report is never held in memory.
+
+        Both destinations are fed from a single rendering pass.
+        """
+        run_stats = stats.current()
+        started_wall, started_cpu = time.perf_counter(), time.process_time()
+        # time spent in writes, which the stats keep apart from rendering
+        write_wall = write_cpu = 0.0
+        targets = []
+        with ExitStack() as stack:
+            if output_file:
+                targets.append(stack.enter_context(open(output_file, 'w', encoding='utf-8',
+                                                        buffering=self.BUFFER_SIZE)))
+            if console:
+                targets.append(sys.stdout)
+            for chunk in self.stream():
+                if run_stats.enabled:
+                    wall, cpu = time.perf_counter(), time.process_time()
+                    for target in targets:
+                        target.write(chunk)
+                    write_wall += time.perf_counter() - wall
+                    write_cpu += time.process_time() - cpu
+                else:
+                    for target in targets:
+                        target.write(chunk)
+            if console:
+                # same as printing the rendered report
+                sys.stdout.write('\n')
+        if run_stats.enabled:
+            run_stats.add_time('render', time.perf_counter() - started_wall - write_wall,
+                               time.process_time() - started_cpu - write_cpu)
+            run_stats.add_time('write', write_wall, write_cpu)
+            if output_file:
+                run_stats.incr('bytes_written', Path(output_file).stat().st_size)
+
     def write_file(self, output_file):
         """ writes output file """
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
+            with stats.current().stage('write'), open(output_file, 'w', encoding='utf-8') as f:
                 f.write(self.output)
                 print(f'{output_file} written successfully')
+            stats.current().incr('bytes_written', Path(output_file).stat().st_size)
         except IOError as e:
             print(f"Error writing to file {output_file}: {e}")
+
+
+def write_reports(bom: TableBOM,
+                  reports: List[Tuple[str, Path]],
+                  cache_dir: Optional[Path] = None):
+    """ Renders several templates from one bill of materials at the same time, each straight into its own file.
+
+    Rendering only reads the bill of materials, so every template shares the one that was built. Each thread collects
+    its own stats, which are added to the caller's once all of them are done.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not reports:
+        return
+    run_stats = stats.current()
+    renderers = [(BOMRenderer(bom, template, cache_dir=cache_dir, render=False), output_file)
+                 for template, output_file in reports]
+
+    def render(renderer: BOMRenderer, output_file: Path) -> Optional[Dict]:
+        # part of the caller's run, which notifies the hooks
+        with stats.collecting(notify=False) if run_stats.enabled else nullcontext() as render_stats:
+            renderer.write_stream(output_file)
+        return render_stats.as_dict() if render_stats else None
+
+    with ThreadPoolExecutor(max_workers=len(renderers), thread_name_prefix='reporter-render') as pool:
+        futures = [pool.submit(render, renderer, output_file) for renderer, output_file in renderers]
+    for future in futures:
+        render_stats = future.result()
+        if render_stats:
+            run_stats.merge(render_stats)
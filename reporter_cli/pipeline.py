@@ -0,0 +1,169 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from contextlib import nullcontext
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+from reporter_cli import stats
+from reporter_cli.batch import Job, Result
+from reporter_cli.cache import ParseCache, cached_parse
+from reporter_cli.formats import render_bytes
+from reporter_cli.model import TextProcessor, TableBOM, read_text
+
+# A batch run as three overlapping stages: reading inputs, parsing and rendering them, and writing the reports.
+# Reads and writes run in a thread pool so slow storage doesn't hold up the CPU bound middle stage, which runs in
+# worker processes. Bounded queues between the stages keep a fast stage from running ahead of a slow one, so only a
+# few files are ever held in memory.
+
+# marks the end of the work on a queue
+_DONE = object()
+
+
+def _timed(function: Callable, *args) -> Tuple[object, float, float]:
+    """ calls function in the current thread, returning its result with the wall and CPU time it took """
+    wall, cpu = time.perf_counter(), time.thread_time()
+    value = function(*args)
+    return value, time.perf_counter() - wall, time.thread_time() - cpu
+
+
+def _read(job: Job) -> Union[str, bytes, None]:
+    if Path(job.output_file).exists() and not job.overwrite:
+        return None
+    # the parse cache is keyed on the raw bytes, the parser reads text the same way TextProcessor does
+    if job.parse_cache:
+        return Path(job.input_file).read_bytes()
+    return read_text(job.input_file)
+
+
+def _write(output_file: str, report: bytes):
+    with open(output_file, 'wb') as f:
+        f.write(report)
+
+
+def process_job(job: Job, content: Union[str, bytes]) -> Tuple[str, str, Optional[bytes], Optional[Dict]]:
+    """ parses and renders an input that has already been read, returning the status, message, report and stats """
+    with stats.collecting(notify=False) if job.collect_stats else nullcontext() as job_stats:
+        if job.parse_cache:
+            _, tables, bom = cached_parse(job.input_file, ParseCache(job.cache_dir), content=content)
+        else:
+            processor = TextProcessor(job.input_file, text=content)
+            tables = processor.tables
+            bom = TableBOM(tables, processor.project_name) if tables else None
+        report = render_bytes(bom, job.output_format, job.template, job.cache_dir) if tables else None
+    run_stats = job_stats.as_dict() if job.collect_stats else None
+    if not tables:
+        return 'empty', 'no tables extracted', None, run_stats
+    return 'written', job.output_file, report, run_stats
+
+
+async def run_pipeline(jobs: List[Job], emit: Callable[[Result], None], executor: Executor, workers: int,
+                       concurrency: int = 8, queue_size: Optional[int] = None):
+    """ runs every job through the read, process and write stages, calling emit with each result as it completes.
+
+    Up to concurrency reads and as many writes are in flight at once, with workers jobs being processed.
+    """
+    loop = asyncio.get_running_loop()
+    queue_size = queue_size or 2 * concurrency
+    io_pool = ThreadPoolExecutor(max_workers=2 * concurrency, thread_name_prefix='reporter-io')
+    to_process = asyncio.Queue(maxsize=queue_size)
+    to_write = asyncio.Queue(maxsize=queue_size)
+    pending = iter(jobs)
+
+    def finish(job, started, status, message='', job_stats=None):
+        run_stats = job_stats.as_dict() if job_stats else None
+        if run_stats:
+            # the stats of all three stages, merged here in the parent process
+            stats.notify_hooks(run_stats)
+        emit(Result(job.input_file, status, message, time.perf_counter() - started, run_stats))
+
+    async def reader():
+        for job in pending:
+            started = time.perf_counter()
+            job_stats = stats.Stats() if job.collect_stats else None
+            try:
+                content, wall, cpu = await loop.run_in_executor(io_pool, _timed, _read, job)
+            except Exception as e:
+                finish(job, started, 'failed', str(e), job_stats)
+                continue
+            if content is None:
+                finish(job, started, 'skipped', f"'{job.output_file}' already exists", job_stats)
+                continue
+            if job_stats:
+                job_stats.add_time('read', wall, cpu)
+            await to_process.put((job, started, job_stats, content))
+
+    async def processor():
+        while (item := await to_process.get()) is not _DONE:
+            job, started, job_stats, content = item
+            try:
+                status, message, report, run_stats = await loop.run_in_executor(executor, process_job, job, content)
+            except Exception as e:
+                finish(job, started, 'failed', str(e), job_stats)
+                continue
+            if job_stats and run_stats:
+                job_stats.merge(run_stats)
+            if report is None:
+                finish(job, started, status, message, job_stats)
+            else:
+                await to_write.put((job, started, job_stats, report))
+
+    async def writer():
+        while (item := await to_write.get()) is not _DONE:
+            job, started, job_stats, report = item
+            try:
+                _, wall, cpu = await loop.run_in_executor(io_pool, _timed, _write, job.output_file, report)
+            except Exception as e:
+                finish(job, started, 'failed', str(e), job_stats)
+                continue
+            if job_stats:
+                job_stats.add_time('write', wall, cpu)
+                job_stats.incr('bytes_written', len(report))
+            finish(job, started, 'written', job.output_file, job_stats)
+
+    try:
+        processors = [asyncio.create_task(processor()) for _ in range(workers)]
+        writers = [asyncio.create_task(writer()) for _ in range(concurrency)]
+        await asyncio.gather(*(reader() for _ in range(concurrency)))
+        for _ in processors:
+            await to_process.put(_DONE)
+        await asyncio.gather(*processors)
+        for _ in writers:
+            await to_write.put(_DONE)
+        await asyncio.gather(*writers)
+    finally:
+        io_pool.shutdown()
+
+
+def run_pipelined(jobs: List[Job], workers: Optional[int] = None, concurrency: int = 8,
+                  queue_size: Optional[int] = None) -> Iterator[Result]:
+    """ Yields one result per job, in the order they complete, from run_pipeline on an event loop thread """
+    results = queue.Queue()
+    if workers == 1:
+        # processing stays in this process, which keeps things debuggable
+        executor = ThreadPoolExecutor(max_workers=1)
+    else:
+        workers = workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers)
+
+    def run():
+        try:
+            asyncio.run(run_pipeline(jobs, results.put, executor, workers, concurrency, queue_size))
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(_DONE)
+
+    thread = threading.Thread(target=run, name='reporter-pipeline', daemon=True)
+    thread.start()
+    try:
+        while (result := results.get()) is not _DONE:
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+    finally:
+        thread.join()
+        executor.shutdown()
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import json
+import os
+import stat
+import sys
+import time
+
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from reporter_cli import stats
+from reporter_cli.batch import TEMPLATE_DIR
+from reporter_cli.formats import WRITERS, render_bytes
+from reporter_cli.model import TextProcessor, TableBOM, get_environment
+
+CONTENT_TYPES = {'text': 'text/plain; charset=utf-8',
+                 'jsonl': 'application/x-ndjson',
+                 'csv': 'text/csv; charset=utf-8',
+                 'binary': 'application/octet-stream'}
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+# largest request body accepted, inline specs included
+MAX_BODY = 64 * 1024 * 1024
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter serve',
+                                     description='Serve reports over HTTP on a Unix socket or TCP port, '
+                                                 'keeping templates and the parser warm between requests')
+    parser.add_argument('--socket', type=str, required=False, help='Unix socket path to listen on')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on without --socket')
+    parser.add_argument('--port', type=int, default=8150, help='Port to listen on without --socket')
+    parser.add_argument('--workers', type=int, required=False,
+                        help='Number of worker processes for parsing and rendering, defaults to CPU count')
+    parser.add_argument('--cache-dir', type=str, required=False,
+                        help='Directory to keep compiled templates in between runs (default $REPORTER_CACHE_DIR)')
+    return parser.parse_args(argv)
+
+
+def warm_up(cache_dir: Optional[str] = None):
+    """ compiles every template in a worker before the first request needs them """
+    env = get_environment(cache_dir)
+    for template in TEMPLATE_DIR.iterdir():
+        if template.is_file():
+            env.get_template(template.name)
+
+
+def build_report(request: Dict, cache_dir: Optional[str] = None) -> Tuple[int, str, bytes, Dict]:
+    """ runs the same TextProcessor -> TableBOM -> BOMRenderer pipeline as the CLI for one request.
+
+    Returns the status, content type, body and stats of the run, so it can be shipped back from a worker process.
+    """
+    output_format = request.get('format', 'text')
+    template = request.get('template', 'project_summary_template')
+    if output_format not in WRITERS and output_format != 'text':
+        return 400, 'text/plain', f"Unknown format '{output_format}'".encode('utf-8'), {}
+    if not (TEMPLATE_DIR / template).is_file():
+        return 400, 'text/plain', f"Template file '{template}' does not exist.".encode('utf-8'), {}
+
+    # the hooks are notified by the server once the stats are back, which is not this process with a pool
+    with stats.collecting(notify=False) as run_stats:
+        if 'text' in request:
+            processor = TextProcessor(Path('<inline>'), text=request['text'])
+        elif 'input' in request:
+            input_file = Path(request['input'])
+            if not input_file.is_file():
+                return 404, 'text/plain', f"Input file '{input_file}' does not exist.".encode('utf-8'), {}
+            processor = TextProcessor(input_file)
+        else:
+            return 400, 'text/plain', b"A request needs an 'input' path or inline 'text'", {}
+        if not processor.tables:
+            return 422, 'text/plain', b'No tables extracted', run_stats.as_dict()
+        bom = TableBOM(processor.tables, processor.project_name)
+        body = render_bytes(bom, output_format, template, cache_dir)
+    return 200, CONTENT_TYPES[output_format], body, run_stats.as_dict()
+
+
+class Metrics:
+    """ Request counts, latencies and throughput since the server started """
+    # latencies kept for the percentiles
+    WINDOW = 1024
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes_sent = 0
+        self.latencies = deque(maxlen=self.WINDOW)
+        # per stage timings of the pipeline, merged from the workers
+        self.pipeline = stats.Stats()
+
+    def record(self, status: int, seconds: float, size: int):
+        self.requests += 1
+        if status >= 400:
+            self.errors += 1
+        self.bytes_sent += size
+        self.latencies.append(seconds)
+
+    def as_dict(self) -> Dict:
+        uptime = time.perf_counter() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+        return {'uptime': uptime,
+                'requests': self.requests,
+                'errors': self.errors,
+                'in_flight': self.in_flight,
+                'bytes_sent': self.bytes_sent,
+                'requests_per_second': self.requests / uptime if uptime else 0.0,
+                'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                               'max': latencies[-1] * 1000 if latencies else 0.0},
+                'pipeline': self.pipeline.as_dict()}
+
+
+class ReportServer:
+    """ Answers HTTP requests on a Unix socket or TCP port, handing parsing and rendering to a pool of workers.
+
+    POST /report takes a JSON body with an 'input' path or inline 'text', and optionally 'template' and 'format'.
+    GET /metrics returns the Metrics as JSON and GET /health answers ok.
+    """
+    def __init__(self,
+                 executor: Optional[Executor] = None,
+                 workers: Optional[int] = None,
+                 cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.executor = executor or ProcessPoolExecutor(max_workers=workers, initializer=warm_up,
+                                                        initargs=(cache_dir,))
+        self.metrics = Metrics()
+
+    async def start(self, socket_path: Optional[str] = None, host: str = '127.0.0.1', port: int = 8150):
+        if socket_path:
+            if os.path.exists(socket_path):
+                # a socket left behind by an earlier server, anything else is not ours to remove
+                if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                    raise FileExistsError(f"'{socket_path}' exists and is not a socket")
+                os.unlink(socket_path)
+            return await asyncio.start_unix_server(self.handle, path=socket_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        self.executor.shutdown()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ serves requests on one connection until the client closes it or asks to """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                started = time.perf_counter()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError('negative Content-Length')
+                except ValueError:
+                    await self.respond(writer, 400, 'text/plain', b'Malformed request', started)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, 'text/plain', b'Request body too large', started)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, content_type, payload = await self.dispatch(method, path, body)
+                await self.respond(writer, status, content_type, payload, started)
+                if headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, status: int, content_type: str, payload: bytes,
+                      started: float):
+        writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                     f'Content-Type: {content_type}\r\n'
+                     f'Content-Length: {len(payload)}\r\n\r\n'.encode('latin-1'))
+        writer.write(payload)
+        await writer.drain()
+        self.metrics.record(status, time.perf_counter() - started, len(payload))
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> Tuple[int, str, bytes]:
+        if path == '/health':
+            return 200, 'text/plain', b'ok'
+        if path == '/metrics':
+            return 200, 'application/json', json.dumps(self.metrics.as_dict(), indent=2).encode('utf-8')
+        if path != '/report':
+            return 404, 'text/plain', f'No such path {path}'.encode('utf-8')
+        if method != 'POST':
+            return 405, 'text/plain', b'Reports are requested with POST'
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError as e:
+            return 400, 'text/plain', f'Invalid request: {e}'.encode('utf-8')
+
+        self.metrics.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            status, content_type, payload, run_stats = await loop.run_in_executor(
+                self.executor, build_report, request, self.cache_dir)
+        except Exception as e:
+            return 500, 'text/plain', f'Error building report: {e}'.encode('utf-8')
+        finally:
+            self.metrics.in_flight -= 1
+        if run_stats:
+            self.metrics.pipeline.merge(run_stats)
+            stats.notify_hooks(run_stats)
+        return status, content_type, payload
+
+
+def main(args):
+    server = ReportServer(workers=args.workers, cache_dir=args.cache_dir)
+
+    async def serve():
+        listener = await server.start(args.socket, args.host, args.port)
+        where = args.socket or f'http://{args.host}:{args.port}'
+        print(f'Serving reports on {where}')
+        async with listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print('Stopped', file=sys.stderr)
+    except OSError as e:
+        print(f'Error starting server: {e}')
+        sys.exit(1)
+    finally:
+        server.close()
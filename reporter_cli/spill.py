@@ -0,0 +1,242 @@
+import heapq
+import pickle
+import sys
+import tempfile
+
+from collections.abc import Iterable, Mapping
+from decimal import Decimal
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from reporter_cli import stats
+from reporter_cli.model import TableBOM, CostItem, to_decimal
+
+# A bill of materials that keeps at most a memory budget of rows in memory and spills the rest to disk.
+# Rows are buffered per material; once the buffer passes the budget it is written out as a run, sorted by material
+# (in order of first appearance) and then by position in the document. Reading a material back is a k-way merge of
+# its segment in every run plus whatever is still buffered, which gives the rows in exactly the order the in-memory
+# TableBOM holds them. Subtotals, the total and the name width are kept as running values while the rows come in.
+
+# a spilled row: (position in the document, item name, {attribute: cell}, cost in minor units or None, currency)
+Record = Tuple[int, str, Dict[str, str], Optional[int], Optional[str]]
+
+# rows pickled together in a run, trading memory while merging against pickle overhead
+BLOCK_ROWS = 1024
+# runs merged into one once there are this many, which bounds the files open during a merge
+MAX_RUNS = 64
+
+
+class SpillStore:
+    """ Buffers rows per material and writes them to sorted runs on disk when the budget is exceeded """
+    def __init__(self,
+                 memory_budget: int,
+                 directory: Optional[Path] = None):
+        self.memory_budget = memory_budget
+        self._directory = tempfile.TemporaryDirectory(prefix='reporter-spill-', dir=directory)
+        self.directory = Path(self._directory.name)
+        # material order -> rows not spilled yet
+        self.buffer: Dict[int, List[Record]] = {}
+        self.buffered_bytes = 0
+        # one (run file, {material order: (offset, rows)}) per spill
+        self.runs: List[Tuple[Path, Dict[int, Tuple[int, int]]]] = []
+        self._run_number = 0
+
+    def add(self, order: int, record: Record, size: int):
+        self.buffer.setdefault(order, []).append(record)
+        self.buffered_bytes += size
+        if self.buffered_bytes > self.memory_budget:
+            self.spill()
+
+    def spill(self):
+        """ writes the buffered rows out as one run, grouped by material and in document order within each """
+        if not self.buffer:
+            return
+        spilled = sum(map(len, self.buffer.values()))
+        self.runs.append(self._write_run({order: self.buffer[order] for order in sorted(self.buffer)}))
+        run_stats = stats.current()
+        run_stats.incr('spilled_runs')
+        run_stats.incr('spilled_rows', spilled)
+        self.buffer = {}
+        self.buffered_bytes = 0
+        if len(self.runs) >= MAX_RUNS:
+            self.compact()
+
+    def _write_run(self, materials: Dict[int, Iterable[Record]]) -> Tuple[Path, Dict[int, Tuple[int, int]]]:
+        """ writes the rows of each material, in the given order, to a new run file """
+        self._run_number += 1
+        run_file = self.directory / f'run{self._run_number:06}'
+        segments = {}
+        with open(run_file, 'wb') as f:
+            for order, records in materials.items():
+                offset, count = f.tell(), 0
+                block = []
+                for record in records:
+                    block.append(record)
+                    if len(block) == BLOCK_ROWS:
+                        pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                        count += len(block)
+                        block = []
+                if block:
+                    pickle.dump(block, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    count += len(block)
+                segments[order] = (offset, count)
+        return run_file, segments
+
+    def compact(self):
+        """ merges every run into a single one, streaming one material at a time """
+        runs = self.runs
+        orders = sorted({order for _, index in runs for order in index})
+        self.runs = [self._write_run({order: self._merge_runs(runs, order) for order in orders})]
+        for run_file, _ in runs:
+            run_file.unlink()
+        stats.current().incr('spill_merges')
+
+    @staticmethod
+    def _read_segment(run_file: Path, offset: int, count: int) -> Iterator[Record]:
+        with open(run_file, 'rb') as f:
+            f.seek(offset)
+            while count > 0:
+                block = pickle.load(f)
+                count -= len(block)
+                yield from block
+
+    def _merge_runs(self, runs: List[Tuple[Path, Dict[int, Tuple[int, int]]]], order: int,
+                    buffered: Iterable[Record] = ()) -> Iterator[Record]:
+        segments = [self._read_segment(run_file, *index[order]) for run_file, index in runs if order in index]
+        if buffered:
+            segments.append(iter(buffered))
+        if len(segments) == 1:
+            return segments[0]
+        return heapq.merge(*segments, key=itemgetter(0))
+
+    def records(self, order: int) -> Iterator[Record]:
+        """ every row of a material in document order, merged from the runs and the buffer """
+        return self._merge_runs(self.runs, order, self.buffer.get(order, ()))
+
+    def close(self):
+        self._directory.cleanup()
+
+
+class SpilledRows(Iterable):
+    """ Re-iterable rows of a spilled material, each pass is a fresh merge from disk """
+    def __init__(self, material: 'SpilledMaterial', costs_only: bool):
+        self._material = material
+        self._costs_only = costs_only
+
+    def __len__(self):
+        return self._material.cost_count if self._costs_only else self._material.row_count
+
+    def __iter__(self):
+        material = self._material
+        records = material.store.records(material.order)
+        if self._costs_only:
+            return (CostItem(name, cost, currency) for _, name, _, cost, currency in records if cost is not None)
+        columns = material.columns
+        return ({'item_name': name, **{attr: attrs[attr] for attr in columns if attr in attrs}}
+                for _, name, attrs, _, _ in records)
+
+
+class SpilledMaterial(Mapping):
+    """ Running totals of one material, whose rows live in a SpillStore. Reads like Material. """
+    def __init__(self,
+                 store: SpillStore,
+                 order: int):
+        self.store = store
+        self.order = order
+        # attribute names in the order they were first seen, like Material.columns
+        self.columns: Dict[str, None] = {}
+        self.row_count = 0
+        self.cost_count = 0
+        self.sub_total_minor = 0
+
+    @property
+    def sub_total(self) -> Decimal:
+        return to_decimal(self.sub_total_minor)
+
+    def iter_costs(self) -> Iterator[Tuple[str, int, str]]:
+        return ((name, cost, currency) for _, name, _, cost, currency in self.store.records(self.order)
+                if cost is not None)
+
+    def keys(self):
+        return ('items', 'sub_total', 'cost_table') if self.cost_count else ('items', 'sub_total')
+
+    def __getitem__(self, key: str):
+        if key == 'items':
+            return SpilledRows(self, costs_only=False)
+        if key == 'sub_total':
+            return self.sub_total
+        if key == 'cost_table' and self.cost_count:
+            return SpilledRows(self, costs_only=True)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+class SpillingTableBOM(TableBOM):
+    """ TableBOM that holds about memory_budget bytes of rows and spills the rest to disk.
+
+    It renders and writes exactly like TableBOM. The rows are kept in temporary files until close().
+    """
+    # rough per row overhead of the tuple, dict and strings on top of the cell text
+    ROW_OVERHEAD = 200
+
+    def __init__(self,
+                 tables: Iterable,
+                 project_name: str,
+                 memory_budget: int,
+                 spill_dir: Optional[Path] = None):
+        self.store = SpillStore(memory_budget, spill_dir)
+        self._width = None
+        self._rows = 0
+        super().__init__(tables, project_name)
+        # the rows are in the store now, holding on to the tables would keep them all in memory too
+        self.tables = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.store.close()
+
+    def name_width(self) -> int:
+        return self._width if self._width is not None else 10
+
+    def _add_tables(self, bom: Dict[str, SpilledMaterial], tables: Iterable[Tuple[List, List]]):
+        try:
+            for table in tables:
+                header, data = table
+                if not data:
+                    continue
+                index, *attrs = header
+                material = bom.get(index)
+                if material is None:
+                    material = bom[sys.intern(index)] = SpilledMaterial(self.store, len(bom))
+                for attr in attrs:
+                    material.columns.setdefault(sys.intern(attr), None)
+                rows, costs, currencies = self.extract_costs(header, data)
+                priced = dict(zip(rows, zip(costs, currencies)))
+                width = self._width or 0
+                for i, row in enumerate(data):
+                    cost, currency = priced.get(i, (None, None))
+                    name = row[0]
+                    width = max(width, len(name))
+                    # Material.add_rows keeps the last cell of a repeated attribute, and so does the dict
+                    cells = dict(zip(attrs, row[1:]))
+                    self.store.add(material.order, (self._rows, name, cells, cost, currency),
+                                   self.ROW_OVERHEAD + sum(map(len, row)))
+                    self._rows += 1
+                self._width = width
+                material.row_count += len(data)
+                material.cost_count += len(costs)
+                sub_total = sum(costs)
+                material.sub_total_minor += sub_total
+                self.total_minor += sub_total
+        except Exception as e:
+            raise Exception(f'Something went wrong setting up the data from the tables {e}')
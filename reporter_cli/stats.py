@@ -0,0 +1,143 @@
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class Stats:
+    """ Wall and CPU time per pipeline stage, plus counters, for one run.
+
+    The model classes report into whichever Stats is active through collecting(), so nothing has to be passed
+    around. Stages that run more than once, like rendering in a batch, add up. A stage that runs inside another, like
+    a streamed parse inside building the bill of materials, only counts towards the inner one.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = {}
+        # [wall, cpu] of the stages nested in each stage that is running, innermost last
+        self._nested: List[List[float]] = []
+
+    def add_time(self, name: str, wall: float, cpu: float, calls: int = 1):
+        stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+        stage['wall'] += wall
+        stage['cpu'] += cpu
+        stage['calls'] += calls
+
+    @contextmanager
+    def stage(self, name: str, calls: int = 1) -> Iterator[None]:
+        wall, cpu = time.perf_counter(), time.process_time()
+        nested = [0.0, 0.0]
+        self._nested.append(nested)
+        try:
+            yield
+        finally:
+            self._nested.pop()
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self.add_time(name, wall - nested[0], cpu - nested[1], calls)
+            if self._nested:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        """ yields the items of iterable, timing the work of producing them as one call of the stage name.
+
+        Meant for work done lazily while the caller consumes it, like a streamed parse, where the time between items
+        belongs to the caller.
+        """
+        iterator = iter(iterable)
+        try:
+            while True:
+                with self.stage(name, calls=0):
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        return
+                yield item
+        finally:
+            self.add_time(name, 0.0, 0.0)
+            if hasattr(iterator, 'close'):
+                iterator.close()
+
+    def incr(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def merge(self, other: Dict):
+        """ adds the as_dict() output of another run, e.g. one from a worker process """
+        for name, stage in other.get('stages', {}).items():
+            self.add_time(name, stage['wall'], stage['cpu'], stage['calls'])
+        for name, amount in other.get('counters', {}).items():
+            self.incr(name, amount)
+
+    def as_dict(self) -> Dict:
+        return {'stages': {name: dict(stage) for name, stage in self.stages.items()},
+                'counters': dict(self.counters)}
+
+    def to_json(self) -> str:
+        import json
+        return json.dumps(self.as_dict(), indent=2)
+
+
+class _NullStats(Stats):
+    """ Used when nothing is collecting, so instrumented code never has to check """
+    enabled = False
+
+    def add_time(self, name: str, wall: float, cpu: float, calls: int = 1):
+        pass
+
+    @contextmanager
+    def stage(self, name: str, calls: int = 1) -> Iterator[None]:
+        yield
+
+    def timed(self, iterable: Iterable, name: str) -> Iterator:
+        return iter(iterable)
+
+    def incr(self, name: str, amount: int = 1):
+        pass
+
+
+NULL_STATS = _NullStats()
+
+_current: ContextVar[Stats] = ContextVar('reporter_stats', default=NULL_STATS)
+_hooks: List[Callable[[Dict], None]] = []
+
+
+def current() -> Stats:
+    """ the Stats being collected into, or a no-op one """
+    return _current.get()
+
+
+def add_hook(hook: Callable[[Dict], None]):
+    """ registers a callable that gets the as_dict() of every run, once its collecting() block ends or the stats a
+    worker sent back have been merged
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[Dict], None]):
+    _hooks.remove(hook)
+
+
+def notify_hooks(run: Dict):
+    """ hands the as_dict() of a finished run to the hooks """
+    for hook in list(_hooks):
+        hook(run)
+
+
+@contextmanager
+def collecting(stats: Optional[Stats] = None, notify: bool = True) -> Iterator[Stats]:
+    """ makes stats (or a new Stats) the active one for the block, then hands the result to the hooks.
+
+    Workers, chunks and threads collecting part of a run pass notify=False, the process that merges the parts
+    notifies the hooks once.
+    """
+    stats = stats if stats is not None else Stats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if notify:
+            notify_hooks(stats.as_dict())
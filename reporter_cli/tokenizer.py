@@ -0,0 +1,165 @@
+import gc
+import re
+
+from contextlib import contextmanager
+from typing import AnyStr, Iterator, List, Optional, Tuple
+from reporter_cli import stats
+
+# Table tokenizer for raw bytes (a bytes object or mmap) or text.
+# A run of consecutive table and title lines is found with one regex match, anchored on the line break before it, so
+# the regex engine skips over prose without a string ever being created for a prose line. Title lines inside a run
+# don't close the table. Only the table lines of a run are split into cells: the pipe at either end is dropped, the
+# cells in between are kept even when empty, an escaped pipe (\|) is part of a cell rather than a boundary, and the
+# separator row under the header is recognised and skipped.
+
+# a run of table lines and title lines, from the start of the buffer or after the line break in front of it
+_RUN = rb'((?:[ \t\f\v]*(?:\|(?:.*\|)?|#.*)[ \t\f\v]*\r?(?:\n|\Z))+)'
+# a table line within a run
+_TABLE_LINE = rb'^[ \t\f\v]*(\|(?:.*\|)?)[ \t\f\v]*\r?$'
+# a title line, whose text is the first group
+_TITLE = rb'[ \t\f\v]*#(.*?)[ \t\f\v]*\r?$'
+
+
+class _Patterns:
+    """ the patterns above, compiled for either bytes or text """
+    def __init__(self, decode: bool):
+        def compile(pattern: bytes, flags: int = 0):
+            return re.compile(pattern.decode('ascii') if decode else pattern, flags)
+        self.first_run = compile(_RUN)
+        self.run = compile(b'\n' + _RUN)
+        self.table_line = compile(_TABLE_LINE, re.MULTILINE)
+        self.first_title = compile(_TITLE, re.MULTILINE)
+        self.title = compile(b'\n' + _TITLE, re.MULTILINE)
+
+
+BYTES_PATTERNS = _Patterns(decode=False)
+TEXT_PATTERNS = _Patterns(decode=True)
+
+# the row under the header, e.g. |---|:---:|
+SEPARATOR_PATTERN = re.compile(r'\|(?:[ \t]*:?-+:?[ \t]*\|)+')
+
+# a pipe that is not escaped
+CELL_BOUNDARY = re.compile(r'(?<!\\)\|')
+BYTES_CELL_BOUNDARY = re.compile(CELL_BOUNDARY.pattern.encode('ascii'))
+
+
+@contextmanager
+def paused_gc():
+    """ Pauses the cyclic garbage collector, which otherwise runs over and over while millions of cells are created """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def split_cells(line: AnyStr) -> List[AnyStr]:
+    """ the stripped cells of a table line, bytes or text, e.g. '| a |  | b\\|c |' -> ['a', '', 'b|c'] """
+    if len(line) < 2:
+        # a lone pipe
+        return []
+    inner = line[1:-1]
+    if isinstance(line, str):
+        if '\\|' not in inner:
+            return [cell.strip() for cell in inner.split('|')]
+        return [cell.replace('\\|', '|').strip() for cell in CELL_BOUNDARY.split(inner)]
+    if b'\\|' not in inner:
+        return [cell.strip() for cell in inner.split(b'|')]
+    return [cell.replace(b'\\|', b'|').strip() for cell in BYTES_CELL_BOUNDARY.split(inner)]
+
+
+def is_separator(line: AnyStr) -> bool:
+    if not isinstance(line, str):
+        line = str(line, 'ascii', 'replace')
+    return SEPARATOR_PATTERN.fullmatch(line) is not None
+
+
+def title_text(line: str) -> Optional[str]:
+    """ the project name a stripped title line gives, or None for a bare '#', which doesn't count as the title """
+    return line[1:].strip() or None
+
+
+def table_rows(lines: List[AnyStr]) -> List[AnyStr]:
+    """ the lines of a table under the header and its separator row, if it has one """
+    return lines[2:] if len(lines) > 1 and is_separator(lines[1]) else lines[1:]
+
+
+def process_rows(header: List[str], rows: List[str]) -> List[List[str]]:
+    """ the cells of each row line, rows with a different number of cells to the header are dropped """
+    width = len(header)
+    with paused_gc():
+        data = [cells for cells in map(split_cells, rows) if len(cells) == width]
+    run_stats = stats.current()
+    run_stats.incr('rows_kept', len(data))
+    # rows with a different number of cells to the header
+    run_stats.incr('rows_dropped', len(rows) - len(data))
+    return data
+
+
+def process_table(lines: List[AnyStr]) -> Tuple[List[str], List[List[str]]]:
+    """ header and rows of a block of table lines, rows with a different number of cells to the header are dropped """
+    if lines and not isinstance(lines[0], str):
+        lines = [str(line, 'utf-8') for line in lines]
+    header = split_cells(lines[0]) if lines else []
+    return header, process_rows(header, table_rows(lines))
+
+
+class Tokenizer:
+    """ Finds the title line and the table blocks of a buffer, which is bytes, an mmap or text """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.patterns = TEXT_PATTERNS if isinstance(buffer, str) else BYTES_PATTERNS
+
+    def _matches(self, first: re.Pattern, rest: re.Pattern) -> Iterator[re.Match]:
+        """ matches of first at the start of the buffer, then of rest, which begins with the line break before it """
+        match = first.match(self.buffer)
+        if match:
+            yield match
+        yield from rest.finditer(self.buffer, match.end() if match else 0)
+
+    def title(self) -> Optional[Tuple[int, int]]:
+        """ the span of the first title line with any text """
+        for match in self._matches(self.patterns.first_title, self.patterns.title):
+            if match.group(1).strip():
+                start, end = match.span()
+                # without the line break in front of it
+                return start + (self.buffer[start:start + 1] in (b'\n', '\n')), end
+        return None
+
+    def project_name(self) -> Optional[str]:
+        span = self.title()
+        if span is None:
+            return None
+        line = self.buffer[span[0]:span[1]]
+        if not isinstance(line, str):
+            line = str(line, 'utf-8')
+        return title_text(line.strip())
+
+    def blocks(self) -> Iterator[Tuple[int, int, List[AnyStr]]]:
+        """ Yields (start, end, table lines) for every block of two or more table lines.
+
+        The lines are stripped and of the same type as the buffer. The span runs from the start of the first line to
+        the end of the last one, leaving out the final line break.
+        """
+        table_line = self.patterns.table_line
+        for match in self._matches(self.patterns.first_run, self.patterns.run):
+            start, end = match.span(1)
+            lines = table_line.findall(self.buffer, start, end)
+            if len(lines) >= 2:
+                if self.buffer[end - 1:end] in (b'\n', '\n'):
+                    end -= 1
+                yield start, end, lines
+
+
+def extract_tables(buffer: AnyStr) -> Tuple[Optional[str], List[Tuple[List, List]]]:
+    """ the project name and every (header, rows) table of a buffer """
+    tokenizer = Tokenizer(buffer)
+    with paused_gc():
+        tables = [process_table(lines) for _, _, lines in tokenizer.blocks()]
+    run_stats = stats.current()
+    run_stats.incr('tables_found', len(tables))
+    newline = '\n' if isinstance(buffer, str) else b'\n'
+    run_stats.incr('lines_scanned', buffer.count(newline) + (0 if buffer[-1:] in ('', b'', newline) else 1))
+    return tokenizer.project_name(), tables
@@ -0,0 +1,442 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from reporter_cli.batch import TEMPLATE_DIR, Job, Result, collect_inputs, output_path, render_job
+from reporter_cli.formats import EXTENSIONS
+
+# A work queue kept in a directory on a shared filesystem, so workers on any number of hosts can render one corpus
+# without a broker. Every input is a small JSON job file that moves between directories with rename(), which POSIX
+# makes atomic: a worker claims a job by renaming it from pending/ into leased/ under its own name, and only one rename
+# can win. While it renders the job the worker keeps touching the lease. A lease that hasn't been touched for the lease
+# timeout belongs to a worker that died, and whichever worker notices first renames it back into pending/ for another
+# attempt. Finished jobs move to done/ or failed/ with their result in results/, and every worker keeps a heartbeat
+# file in workers/, which is what `reporter queue status` reports from.
+#
+# pending/<id>.<attempt>   leased/<id>.<attempt>.<worker>   done/<id>   failed/<id>   results/<id>.json
+
+PENDING, LEASED, DONE, FAILED = 'pending', 'leased', 'done', 'failed'
+RESULTS, WORKERS, TMP = 'results', 'workers', 'tmp'
+CONFIG = 'queue.json'
+
+# seconds without a touch after which a lease is given up as dead, and attempts before a job is failed for good
+DEFAULT_LEASE = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog='reporter queue',
+                                     description='Share the rendering of many inputs between hosts through a work '
+                                                 'queue directory on a shared filesystem')
+    actions = parser.add_subparsers(dest='action', required=True)
+
+    submit = actions.add_parser('submit', help='Add inputs to the queue, skipping any that are already in it')
+    submit.add_argument('queue', type=str, help='Queue directory, created if needed')
+    submit.add_argument('inputs', nargs='+',
+                        help='Input files, directories, glob patterns or @manifest files listing one input per line')
+    submit.add_argument('--pattern', type=str, default='*.txt', help='File pattern used inside directories')
+    submit.add_argument('--output-dir', type=str, required=False,
+                        help='Directory for the reports, defaults to next to each input')
+    submit.add_argument('--template', type=str, default='project_summary_template', help='Template name')
+    submit.add_argument('--format', choices=['text', 'jsonl', 'csv', 'binary'], default='text',
+                        help='Render with the template (text) or write the bill of materials as data')
+    submit.add_argument('--overwrite', choices=['always', 'never'], default='never',
+                        help='What to do with reports that already exist')
+    submit.add_argument('--lease', type=float, required=False,
+                        help=f'Seconds a claimed job may go without a heartbeat before it is retried '
+                             f'(default {DEFAULT_LEASE:g})')
+    submit.add_argument('--max-attempts', type=int, required=False,
+                        help=f'Claims of a job before it is failed (default {DEFAULT_MAX_ATTEMPTS})')
+
+    work = actions.add_parser('work', help='Render jobs from the queue until it is empty')
+    work.add_argument('queue', type=str, help='Queue directory')
+    work.add_argument('--workers', type=int, required=False,
+                      help='Number of worker processes on this host, defaults to CPU count')
+    work.add_argument('--poll', type=float, default=2.0, help='Seconds between looks at a queue with nothing to claim')
+    work.add_argument('--wait', action='store_true', help='Keep waiting for new jobs once the queue is empty')
+    work.add_argument('--cache-dir', type=str, required=False,
+                      help='Directory to keep compiled templates in between runs (default $REPORTER_CACHE_DIR)')
+    work.add_argument('--quiet', action='store_true', help='Only list files that were not written')
+
+    status = actions.add_parser('status', help='Show the progress and throughput of the queue and its workers')
+    status.add_argument('queue', type=str, help='Queue directory')
+    status.add_argument('--format', choices=['text', 'json'], default='text', help='Output format')
+    return parser.parse_args(argv)
+
+
+def worker_name() -> str:
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class Lease:
+    """ A claimed job. Inside a with block a thread keeps touching the lease file, so the claim stays live. """
+    def __init__(self,
+                 path: Path,
+                 job_id: str,
+                 attempt: int,
+                 job: Dict,
+                 interval: float):
+        self.path = path
+        self.job_id = job_id
+        self.attempt = attempt
+        self.job = job
+        self.interval = interval
+        # set once the lease file has gone, i.e. another worker took the job over
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _renew(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._renew, name='reporter-lease', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class WorkQueue:
+    """ The job files of a queue directory, and the atomic renames that move them from state to state """
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        # pending job names this worker has listed but not tried to claim yet
+        self._candidates: List[str] = []
+
+    def path(self, *parts: str) -> Path:
+        return self.directory.joinpath(*parts)
+
+    def create(self, lease: Optional[float] = None, max_attempts: Optional[int] = None) -> Dict:
+        """ makes the directories and writes the settings, keeping the earlier ones that aren't given """
+        for name in (PENDING, LEASED, DONE, FAILED, RESULTS, WORKERS, TMP):
+            self.path(name).mkdir(parents=True, exist_ok=True)
+        config = {'lease': DEFAULT_LEASE, 'max_attempts': DEFAULT_MAX_ATTEMPTS}
+        if self.path(CONFIG).exists():
+            config.update(self.config())
+        if lease is not None:
+            config['lease'] = lease
+        if max_attempts is not None:
+            config['max_attempts'] = max_attempts
+        self._write_json(self.path(CONFIG), config)
+        return config
+
+    def config(self) -> Dict:
+        with open(self.path(CONFIG), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_json(self, path: Path, value: Dict):
+        """ writes to a temporary file first, so readers on other hosts never see a partial file """
+        tmp = self.path(TMP, f'{path.name}.{worker_name()}.{threading.get_ident()}')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def job_id(input_file: str) -> str:
+        return hashlib.sha1(input_file.encode('utf-8')).hexdigest()[:20]
+
+    def known_ids(self) -> set:
+        """ ids of every job in the queue, whatever its state """
+        return {name.split('.', 1)[0] for state in (PENDING, LEASED, DONE, FAILED)
+                for name in os.listdir(self.path(state))}
+
+    def submit(self, jobs: List[Dict]) -> Tuple[int, int]:
+        """ adds jobs, each with at least an input, returning how many were added and how many were already queued """
+        known = self.known_ids()
+        added = 0
+        for job in jobs:
+            job_id = self.job_id(job['input'])
+            if job_id in known:
+                continue
+            self._write_json(self.path(PENDING, f'{job_id}.0'), job)
+            known.add(job_id)
+            added += 1
+        return added, len(jobs) - added
+
+    def clock(self) -> float:
+        """ the time as the shared filesystem sees it, so hosts with skewed clocks agree on when a lease expired """
+        clock = self.path(TMP, 'clock')
+        clock.touch()
+        return clock.stat().st_mtime
+
+    def claim(self, worker: str, lease: float) -> Optional[Lease]:
+        """ renames a pending job into leased/ under this worker's name, None if there is nothing left to claim """
+        # the listing is reused between claims, and refreshed once if every job left in it was taken
+        for _ in range(2):
+            if not self._candidates:
+                self._candidates = os.listdir(self.path(PENDING))
+                # workers that list the queue at the same time go through it in different orders
+                random.shuffle(self._candidates)
+            while self._candidates:
+                name = self._candidates.pop()
+                pending = self.path(PENDING, name)
+                leased = self.path(LEASED, f'{name}.{worker}')
+                try:
+                    # rename keeps the modification time, so the lease is dated before it exists
+                    os.utime(pending)
+                    os.rename(pending, leased)
+                    with open(leased, 'r', encoding='utf-8') as f:
+                        job = json.load(f)
+                except FileNotFoundError:
+                    # claimed by another worker in the meantime
+                    continue
+                job_id, job_attempt = name.split('.')
+                return Lease(leased, job_id, int(job_attempt), job, lease / 3)
+        return None
+
+    def leases(self) -> List[Tuple[str, float]]:
+        """ (name, modification time) of every lease """
+        leases = []
+        for entry in os.scandir(self.path(LEASED)):
+            try:
+                leases.append((entry.name, entry.stat().st_mtime))
+            except FileNotFoundError:
+                continue
+        return leases
+
+    def requeue_expired(self) -> int:
+        """ hands the jobs of leases that went stale back to pending/, or fails them after too many attempts """
+        config = self.config()
+        now = self.clock()
+        requeued = 0
+        for name, mtime in self.leases():
+            if now - mtime < config['lease']:
+                continue
+            job_id, attempt, worker = name.split('.', 2)
+            attempt = int(attempt) + 1
+            given_up = attempt >= config['max_attempts']
+            target = self.path(FAILED, job_id) if given_up else self.path(PENDING, f'{job_id}.{attempt}')
+            try:
+                os.rename(self.path(LEASED, name), target)
+            except FileNotFoundError:
+                # finished, or requeued by another worker
+                continue
+            if given_up:
+                self._write_result(job_id, {'status': 'failed', 'attempts': attempt, 'worker': worker,
+                                            'message': f'lease expired {attempt} times'})
+            requeued += 1
+        return requeued
+
+    def _write_result(self, job_id: str, result: Dict):
+        self._write_json(self.path(RESULTS, f'{job_id}.json'), result)
+
+    def finish(self, lease: Lease, result: Result, worker: str) -> bool:
+        """ moves a job to done/ or failed/, False if the lease was lost and another worker has the job now """
+        target = self.path(FAILED if result.status == 'failed' else DONE, lease.job_id)
+        try:
+            os.rename(lease.path, target)
+        except FileNotFoundError:
+            return False
+        self._write_result(lease.job_id, {'input': result.input_file, 'status': result.status,
+                                          'message': result.message, 'seconds': result.seconds,
+                                          'attempts': lease.attempt + 1, 'worker': worker})
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        return {state: len(os.listdir(self.path(state))) for state in (PENDING, LEASED, DONE, FAILED)}
+
+    def heartbeat(self, worker: str, heartbeat: Dict):
+        self._write_json(self.path(WORKERS, f'{worker}.json'), heartbeat)
+
+    def workers(self) -> List[Dict]:
+        """ the last heartbeat of every worker, with `seen`, the time it was written by the filesystem's clock """
+        workers = []
+        for entry in os.scandir(self.path(WORKERS)):
+            try:
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    heartbeat = json.load(f)
+                heartbeat['seen'] = entry.stat().st_mtime
+            except (FileNotFoundError, ValueError):
+                continue
+            workers.append(heartbeat)
+        return sorted(workers, key=lambda heartbeat: heartbeat['worker'])
+
+
+def process(job: Dict, worker: str, cache_dir: Optional[str] = None) -> Result:
+    """ renders one job with the batch pipeline. The report is written under a temporary name and then renamed into
+    place, so a worker that dies halfway never leaves a partial report behind.
+    """
+    output_file = Path(job['output'])
+    if output_file.exists() and job['overwrite'] != 'always':
+        return Result(job['input'], 'skipped', f"'{output_file}' already exists", 0.0)
+    partial = output_file.with_name(f'.{output_file.name}.{worker}.part')
+    result = render_job(Job(job['input'], str(partial), job['template'], True, cache_dir,
+                            output_format=job['format']))
+    if result.status != 'written':
+        partial.unlink(missing_ok=True)
+        return result
+    os.replace(partial, output_file)
+    return result._replace(message=str(output_file))
+
+
+def work(queue_dir: str, poll: float = 2.0, wait: bool = False, cache_dir: Optional[str] = None,
+         quiet: bool = False) -> Dict[str, int]:
+    """ One worker: claims and renders jobs until the queue is empty, returning the count of each status.
+
+    While other workers still hold leases it keeps polling, so it can take over the jobs of any of them that die.
+    """
+    queue = WorkQueue(queue_dir)
+    lease_seconds = queue.config()['lease']
+    worker = worker_name()
+    counts = {'written': 0, 'skipped': 0, 'empty': 0, 'failed': 0}
+    heartbeat = {'worker': worker, 'host': socket.gethostname(), 'pid': os.getpid(), 'state': 'running',
+                 'started': time.time(), 'updated': time.time(), 'busy': 0.0, 'counts': counts}
+    queue.heartbeat(worker, heartbeat)
+    try:
+        while True:
+            lease = queue.claim(worker, lease_seconds)
+            if lease is None:
+                if queue.requeue_expired():
+                    continue
+                if not wait and not queue.leases():
+                    break
+                time.sleep(poll)
+                continue
+            with lease:
+                result = process(lease.job, worker, cache_dir)
+            if queue.finish(lease, result, worker):
+                counts[result.status] += 1
+                heartbeat['busy'] += result.seconds
+                if not (quiet and result.status == 'written'):
+                    print(f"{result.status:8} {result.input_file} {result.message}".rstrip(), flush=True)
+            heartbeat['updated'] = time.time()
+            queue.heartbeat(worker, heartbeat)
+    finally:
+        heartbeat['state'] = 'stopped'
+        heartbeat['updated'] = time.time()
+        queue.heartbeat(worker, heartbeat)
+    return counts
+
+
+class WorkerStatus(NamedTuple):
+    worker: str
+    state: str
+    processed: int
+    failed: int
+    rate: float
+
+
+def status(queue_dir: str) -> Dict:
+    """ progress of the queue, and the state and throughput of every worker that has heartbeated into it """
+    queue = WorkQueue(queue_dir)
+    config = queue.config()
+    now = queue.clock()
+    counts = queue.counts()
+    lease_holders = {}
+    expired = 0
+    for name, mtime in queue.leases():
+        if now - mtime >= config['lease']:
+            expired += 1
+        else:
+            lease_holders[name.split('.', 2)[2]] = mtime
+    workers = []
+    heartbeats = queue.workers()
+    for heartbeat in heartbeats:
+        processed = sum(heartbeat['counts'].values())
+        elapsed = heartbeat['updated'] - heartbeat['started']
+        if heartbeat['state'] == 'stopped':
+            state = 'stopped'
+        elif heartbeat['worker'] in lease_holders or now - heartbeat['seen'] < config['lease']:
+            state = 'running'
+        else:
+            # no heartbeat or live lease for a whole lease timeout
+            state = 'lost'
+        workers.append(WorkerStatus(heartbeat['worker'], state, processed, heartbeat['counts']['failed'],
+                                    processed / elapsed if elapsed > 0 else 0.0))
+    throughput = sum(worker.rate for worker in workers if worker.state == 'running')
+    # from the first worker starting to the last heartbeat
+    span = max((heartbeat['updated'] for heartbeat in heartbeats), default=0.0) - \
+        min((heartbeat['started'] for heartbeat in heartbeats), default=0.0)
+    remaining = counts[PENDING] + counts[LEASED]
+    return {'jobs': sum(counts.values()), **counts, 'expired': expired,
+            'workers': [worker._asdict() for worker in workers],
+            'throughput': throughput,
+            'overall': sum(worker.processed for worker in workers) / span if span > 0 else 0.0,
+            'eta': remaining / throughput if throughput and remaining else None}
+
+
+def format_status(queue_status: Dict) -> str:
+    lines = [f"{queue_status['jobs']} jobs: {queue_status[DONE]} done, {queue_status[FAILED]} failed, "
+             f"{queue_status[LEASED]} leased ({queue_status['expired']} expired), {queue_status[PENDING]} pending"]
+    workers = queue_status['workers']
+    states = {state: sum(1 for worker in workers if worker['state'] == state)
+              for state in ('running', 'stopped', 'lost')}
+    lines.append(f"{len(workers)} workers: {states['running']} running, {states['stopped']} stopped, "
+                 f"{states['lost']} lost")
+    width = max((len(worker['worker']) for worker in workers), default=10)
+    lines.extend(f"  {worker['worker'].ljust(width)}  {worker['state']:8} {worker['processed']:>8} files "
+                 f"{worker['failed']:>6} failed {worker['rate']:>9.2f} files/s" for worker in workers)
+    eta = f", about {queue_status['eta']:.0f}s left" if queue_status['eta'] is not None else ''
+    lines.append(f"throughput {queue_status['throughput']:.2f} files/s now, {queue_status['overall']:.2f} files/s "
+                 f"overall{eta}")
+    return '\n'.join(lines)
+
+
+def main(args):
+    queue = WorkQueue(args.queue)
+    if args.action != 'submit' and not queue.path(CONFIG).exists():
+        print(f"Error: '{args.queue}' is not a work queue, create it with reporter queue submit.")
+        sys.exit(1)
+
+    if args.action == 'submit':
+        if not (TEMPLATE_DIR / args.template).exists():
+            print(f"Error: Template file '{args.template}' does not exist.")
+            sys.exit(1)
+        try:
+            inputs = collect_inputs(args.inputs, args.pattern)
+        except OSError as e:
+            print(f"Error reading manifest: {e}")
+            sys.exit(1)
+        output_dir = Path(args.output_dir).absolute() if args.output_dir else None
+        suffix = EXTENSIONS.get(args.format)
+        # absolute paths, as workers can run from any directory
+        jobs = [{'input': str(path.absolute()), 'output': str(output_path(path.absolute(), output_dir, suffix)),
+                 'template': args.template, 'format': args.format, 'overwrite': args.overwrite} for path in inputs]
+        if len({job['output'] for job in jobs}) != len(jobs):
+            print('Error: Several inputs share a name and would write the same report, '
+                  'use separate output directories.')
+            sys.exit(1)
+        if output_dir:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        queue.create(args.lease, args.max_attempts)
+        added, queued = queue.submit(jobs)
+        print(f"{added} jobs added, {queued} already queued")
+
+    elif args.action == 'work':
+        worker_args = (args.queue, args.poll, args.wait, args.cache_dir, args.quiet)
+        if args.workers == 1:
+            results = [work(*worker_args)]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            workers = args.workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(work, *zip(*[worker_args] * workers)))
+        counts = {status: sum(result[status] for result in results) for status in results[0]}
+        print(f"{sum(counts.values())} files: {counts['written']} written, {counts['skipped']} skipped, "
+              f"{counts['empty']} without tables, {counts['failed']} failed")
+        if counts['failed']:
+            sys.exit(1)
+
+    elif args.action == 'status':
+        queue_status = status(args.queue)
+        if args.format == 'json':
+            print(json.dumps(queue_status, indent=2))
+        else:
+            print(format_status(queue_status))
@@ -3,7 +3,7 @@ from setuptools import setup, find_packages
 setup(
     name='reporter_cli',
     version='0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     install_requires=[
         'jinja2',
         'pytest'
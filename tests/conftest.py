@@ -0,0 +1,17 @@
+import pytest
+
+SPEC = '''# {project}
+
+| Tables |  Price |
+|--------|--------|
+|    A   |  $1600 |
+|    B   |    $12 |
+'''
+
+
+@pytest.fixture
+def spec_text():
+    """ a specification with one table of two priced rows, $1612 in all, under the given project name """
+    def make(project):
+        return SPEC.format(project=project)
+    return make
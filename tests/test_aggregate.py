@@ -0,0 +1,82 @@
+import json
+import pytest
+
+from reporter_cli import aggregate
+from reporter_cli.model import TableBOM
+
+SPEC = '''# {project}
+
+| Tables |  Price |
+|--------|--------|
+|    A   |  ${a} |
+|    B   |    $12.50 |
+
+| Chairs | Price |
+|--------|-------|
+|   AA   |  $10  |
+'''
+
+
+@pytest.fixture
+def spec_dir(tmp_path):
+    for i in range(5):
+        (tmp_path / f"spec{i}.txt").write_text(SPEC.format(project=f"Project {i}", a=100 * (i + 1)))
+    (tmp_path / "empty.txt").write_text("no tables here")
+    return tmp_path
+
+
+def test_aggregator_merge_matches_single_pass():
+    boms = [TableBOM([(["Tables", "Price"], [[f"T{i}", f"${i}.0{j}"] for j in range(3)])], f"P{i}") for i in range(6)]
+    single = aggregate.Aggregator(top=4)
+    for bom in boms:
+        single.add_bom(bom)
+    merged = aggregate.Aggregator(top=4)
+    for part in (boms[:2], boms[2:]):
+        partial = aggregate.Aggregator(top=4)
+        for bom in part:
+            partial.add_bom(bom)
+        merged.merge(partial)
+
+    assert merged.as_dict() == single.as_dict()
+    assert [(cost, item) for cost, _, _, item, _ in single.top()] == [(502, "T5"), (501, "T5"), (500, "T5"), (402, "T4")]
+    assert single.total_minor == sum(100 * i * 3 + 3 for i in range(6))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_aggregate(spec_dir, workers):
+    inputs = sorted(str(p) for p in spec_dir.iterdir())
+    aggregator = aggregate.run_aggregate(inputs, top=3, workers=workers, chunksize=2)
+
+    assert aggregator.files == 5
+    assert aggregator.groups() == [("Tables", 1500 * 100 + 5 * 1250, 10), ("Chairs", 5 * 1000, 5)]
+    assert aggregator.groups("item", limit=1) == [("Tables / A", 1500 * 100, 5)]
+    assert [(project, cost) for cost, project, _, _, _ in aggregator.top()] == \
+        [("Project 4", 50000), ("Project 3", 40000), ("Project 2", 30000)]
+
+
+def test_main_json(spec_dir, capsys):
+    aggregate.main(aggregate.parse_args([str(spec_dir), "--workers", "1", "--top", "1", "--format", "json"]))
+
+    result = json.loads(capsys.readouterr().out)
+    assert result["total"] == "1612.50"
+    assert result["top"] == [{"cost": "500.00", "currency": "$", "project": "Project 4", "material": "Tables",
+                              "item": "A"}]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unreadable_inputs_are_counted_and_skipped(spec_dir, capsys, workers):
+    (spec_dir / "latin1.txt").write_bytes("# Caf\xe9\n| Tables | Price |\n|---|---|\n| A | $1 |\n".encode("latin-1"))
+    inputs = sorted(str(p) for p in spec_dir.iterdir()) + [str(spec_dir / "missing.txt")]
+
+    aggregator = aggregate.run_aggregate(inputs, top=3, workers=workers, chunksize=2)
+    assert aggregator.files == 5
+    assert aggregator.total_minor == 161250
+    assert [input_file for input_file, _ in aggregator.failed] == [str(spec_dir / "latin1.txt"),
+                                                                    str(spec_dir / "missing.txt")]
+
+    with pytest.raises(SystemExit) as exc_info:
+        aggregate.main(aggregate.parse_args([str(spec_dir), "--workers", str(workers)]))
+    assert exc_info.value.code == 1
+    out = capsys.readouterr().out
+    assert "5 files, 15 items, total $1612.50" in out
+    assert f"1 files failed:\n  failed   {spec_dir / 'latin1.txt'} 'utf-8' codec can't decode" in out
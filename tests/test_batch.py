@@ -0,0 +1,57 @@
+import pytest
+
+from reporter_cli import batch
+
+@pytest.fixture
+def spec_dir(tmp_path, spec_text):
+    spec = spec_text("Batch Project")
+    spec_dir = tmp_path / "specs"
+    (spec_dir / "nested").mkdir(parents=True)
+    (spec_dir / "one.txt").write_text(spec)
+    (spec_dir / "nested" / "two.txt").write_text(spec)
+    (spec_dir / "empty.txt").write_text("no tables here")
+    # a report from an earlier run should not be picked up as an input
+    (spec_dir / "one_output.txt").write_text("old report")
+    return spec_dir
+
+
+def test_collect_inputs(spec_dir, tmp_path):
+    manifest = tmp_path / "manifest"
+    manifest.write_text(f"# comment\n{spec_dir / 'one.txt'}\n\n")
+
+    assert [p.name for p in batch.collect_inputs([str(spec_dir)])] == ["empty.txt", "two.txt", "one.txt"]
+    assert batch.collect_inputs([f"@{manifest}"]) == [spec_dir / "one.txt"]
+    assert batch.collect_inputs([str(spec_dir / "*.txt"), str(spec_dir / "one.txt")]) == \
+        sorted([spec_dir / "empty.txt", spec_dir / "one.txt", spec_dir / "one_output.txt"])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_batch(spec_dir, tmp_path, workers):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    inputs = batch.collect_inputs([str(spec_dir)])
+    jobs = [batch.Job(str(p), str(batch.output_path(p, output_dir)), 'project_summary_template', False)
+            for p in inputs]
+
+    results = list(batch.run_batch(jobs, workers=workers, chunksize=2))
+
+    assert [r.status for r in results] == ["empty", "written", "written"]
+    assert "The total cost will be $1612.00." in (output_dir / "two_output.txt").read_text()
+
+    # a second run leaves existing reports alone
+    results = list(batch.run_batch(jobs, workers=workers))
+    assert [r.status for r in results] == ["empty", "skipped", "skipped"]
+
+
+def test_main_reports_failures(spec_dir, monkeypatch, capsys):
+    def failing_bom(*args, **kwargs):
+        raise Exception("boom")
+    monkeypatch.setattr(batch, 'TableBOM', failing_bom)
+
+    args = batch.parse_args([str(spec_dir / "one.txt"), "--workers", "1", "--overwrite", "always"])
+    with pytest.raises(SystemExit) as exc_info:
+        batch.main(args)
+    assert exc_info.value.code == 1
+    out = capsys.readouterr().out
+    assert f"failed   {spec_dir / 'one.txt'} boom" in out
+    assert "1 files in" in out and "1 failed" in out
@@ -0,0 +1,30 @@
+import io
+
+from benchmarks.generate import generate_spec
+from benchmarks.suite import compare, run_suite
+from reporter_cli.model import StreamingTextProcessor, TableBOM
+
+
+def test_generate_spec_parses_back():
+    f = io.StringIO()
+    rows = generate_spec(f, tables=12, rows=5, columns=4, prose_ratio=2.0, currency_mix=('$', '€'), seed=1)
+
+    processor = StreamingTextProcessor(io.StringIO(f.getvalue()))
+    tables = list(processor.tables)
+    assert rows == 60
+    assert processor.project_name == "Synthetic Project"
+    assert len(tables) == 12
+    assert all(len(header) == 4 and len(data) == 5 for header, data in tables)
+    assert sum(len(m.costs) for m in TableBOM(tables, "x").bill_of_materials.values()) == 60
+
+
+def test_run_suite_and_compare(tmp_path):
+    suite = run_suite(["tiny"], tmp_path, repeat=1)
+    stages = suite["results"]["tiny"]
+    assert set(stages) == {"extract_tables", "make_bom", "make_report"}
+    assert all(result["seconds"] > 0 and result["peak_bytes"] > 0 for result in stages.values())
+    assert compare(suite, suite) == []
+
+    slower = {"results": {"tiny": {"make_bom": dict(stages["make_bom"], seconds=stages["make_bom"]["seconds"] * 2)}}}
+    regressions = compare(suite, slower, threshold=0.5)
+    assert len(regressions) == 1 and regressions[0].startswith("tiny make_bom seconds")
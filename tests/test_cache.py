@@ -0,0 +1,51 @@
+import os
+import pytest
+
+from reporter_cli.cache import ParseCache, cached_parse
+from reporter_cli.model import TextProcessor
+
+@pytest.fixture
+def cache(tmp_path):
+    return ParseCache(tmp_path / "cache")
+
+
+def test_cached_parse_skips_unchanged_inputs(tmp_path, cache, monkeypatch, spec_text):
+    spec = spec_text("Cached Project")
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(spec)
+
+    first = cached_parse(input_file, cache)
+    assert first.project_name == "Cached Project"
+    assert first.bom.total_cost == 1612.0
+
+    def fail(*args, **kwargs):
+        raise AssertionError("parsed again")
+    monkeypatch.setattr(TextProcessor, "extract_tables", fail)
+
+    second = cached_parse(input_file, cache)
+    assert second.tables == first.tables
+    assert second.bom.bill_of_materials["Tables"]["sub_total"] == 1612.0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # any change to the content is a different key
+    input_file.write_text(spec + "\n")
+    with pytest.raises(AssertionError):
+        cached_parse(input_file, cache)
+
+    stats = cache.stats()
+    assert (stats["entries"], stats["hits"], stats["misses"]) == (1, 1, 2)
+
+
+def test_evict_least_recently_used(cache):
+    for i, key in enumerate(["old", "stale", "new"]):
+        cache.put(key, ("x" * 1000, [], None))
+        os.utime(cache.directory / f"{key}.pickle", (i, i))
+    cache.get("old")
+
+    cache.max_bytes = 2 * (cache.directory / "new.pickle").stat().st_size
+    assert cache.evict() == 1
+    assert sorted(p.stem for p in cache.directory.glob("*.pickle")) == ["new", "old"]
+
+    cache.clear()
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["hits"] == 0
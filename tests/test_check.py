@@ -0,0 +1,78 @@
+import gzip
+import io
+import pytest
+import sys
+
+from pathlib import Path
+from benchmarks.generate import generate_spec
+from reporter_cli import batch, check, cli, stats
+from reporter_cli.model import TextProcessor, TableBOM
+
+MIXED = '''Some prose | with a pipe
+| Tables | Price |
+|---|---|
+| A | $1,600 |
+| B | £12 | extra |
+# a title inside a table keeps it open
+| C | €1.5 |
+
+| Notes | Text |
+|---|---|
+| a | b |
+'''
+
+
+def full_pipeline(path):
+    """ the counts the checker should agree with, from the real parser and TableBOM """
+    with stats.collecting() as run_stats:
+        processor = TextProcessor(path)
+    without_currency = sum(1 for header, data in processor.tables
+                           if 'currency' not in TableBOM.column_types(header, data))
+    counters = run_stats.counters
+    return (processor.project_name is not None, counters.get('tables_found', 0), counters.get('rows_kept', 0),
+            counters.get('rows_dropped', 0), without_currency)
+
+
+def test_check_agrees_with_the_pipeline(tmp_path):
+    inputs = [Path(__file__).parent.parent / "example_input.txt", tmp_path / "mixed.txt", tmp_path / "generated.txt",
+              tmp_path / "late_costs.txt"]
+    inputs[1].write_text(MIXED)
+    # costs only after more rows than TableBOM samples
+    inputs[3].write_text("# Late\n| Parts | Price |\n|---|---|\n" + "| p | TBD |\n" * TableBOM.SAMPLE_ROWS +
+                         "| big | $5000 |\n")
+    with open(inputs[2], "w", encoding="utf-8") as f:
+        generate_spec(f, tables=30, rows=15, columns=4, currency_mix=("$", "£", "€"), seed=3)
+
+    for path in inputs:
+        result = check.check_file(str(path))
+        assert (result.title, result.tables, result.rows, result.dropped_rows, result.tables_without_currency) == \
+            full_pipeline(path)
+    assert check.check_file(str(inputs[3])).ok
+
+    mixed = check.check_file(str(inputs[1]))
+    assert not mixed.ok
+    assert check.format_result(mixed) == \
+        f"problem  {inputs[1]} tables=2 rows=3 - 1 rows dropped, 1 tables without costs"
+
+
+def test_batch_check(tmp_path, capsys):
+    (tmp_path / "good.txt").write_text("# Good\n| Tables | Price |\n|---|---|\n| A | $1 |\n")
+    (tmp_path / "zipped.txt.gz").write_bytes(gzip.compress(b"# Zipped\n| Tables | Price |\n|---|---|\n| A | $1 |\n"))
+    (tmp_path / "bad.txt").write_text(MIXED)
+
+    args = batch.parse_args([str(tmp_path / "*.txt*"), "--check", "--workers", "2", "--quiet"])
+    with pytest.raises(SystemExit) as exc_info:
+        batch.main(args)
+    assert exc_info.value.code == 1
+    out = capsys.readouterr().out.splitlines()
+    assert len(out) == 2 and out[0].startswith(f"problem  {tmp_path / 'bad.txt'}")
+    assert "3 files checked in" in out[1] and "2 ok, 1 with problems" in out[1]
+
+
+def test_cli_check_stdin(monkeypatch, capsys):
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(b"# Piped\n| T | P |\n|---|---|\n| A | $1 |\n")))
+    sys.argv = ["cli.py", "--input", "-", "--check"]
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main(cli.parse_args())
+    assert exc_info.value.code == 0
+    assert capsys.readouterr().out == "ok       - tables=1 rows=1\n"
@@ -1,8 +1,16 @@
+import io
+import json
+import os
 import pytest
+import subprocess
 import sys
 
 from pathlib import Path
-from reporter_cli import cli, model
+from reporter_cli import cli, model, stats
+
+# cold start budget for importing the CLI, as a multiple of the time the interpreter spends on its own startup imports,
+# so it scales with the machine. The CLI takes about 4x, importing jinja2 up front takes it to 10-13x
+IMPORT_BUDGET = 7
 
 
 @pytest.fixture
@@ -45,8 +53,8 @@ def test_parse_args():
     sys.argv = test_args
     args = cli.parse_args()
     assert args.input == "input.txt"
-    assert args.output == "output.txt"
-    assert args.template == "template.txt"
+    assert args.output == ["output.txt"]
+    assert args.template == ["template.txt"]
 
 
 def test_main_output_file_exists(mock_path_exists, monkeypatch, tmp_path):
@@ -264,3 +272,147 @@ def test_error_during_bom(monkeypatch, tmp_path):
         cli.main(args)
     print(f"Exited with code: {exc_info.value.code}")
     assert exc_info.value.code == 1
+
+
+def test_main_reads_stdin(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('''# Piped
+| Tables |  Price |
+|--------|--------|
+|    A   |  $1600 |
+'''))
+
+    test_args = ["cli.py", "--input", "-"]
+    sys.argv = test_args
+    args = cli.parse_args()
+    cli.main(args)
+
+    out = capsys.readouterr().out
+    assert "Project `Piped` requires the following material:" in out
+    assert "The total cost will be $1600.00." in out
+
+
+def test_main_never_overwrites(tmp_path, capsys):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("| A | B |\n|---|---|\n| a | $1 |\n")
+    output_file = tmp_path / "output.txt"
+    output_file.write_text("existing output data")
+
+    test_args = ["cli.py", "--input", str(input_file), "--output", str(output_file), "--overwrite", "never"]
+    sys.argv = test_args
+    args = cli.parse_args()
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main(args)
+    assert exc_info.value.code == 0
+    assert output_file.read_text() == "existing output data"
+
+
+def test_main_compressed_input(tmp_path, capsys):
+    import gzip
+    input_file = tmp_path / "input.txt.gz"
+    input_file.write_bytes(gzip.compress(b"# Zipped\n| Tables | Price |\n|---|---|\n| A | $1600 |\n"))
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--stream"]
+    cli.main(cli.parse_args())
+
+    assert "The total cost will be $1600.00." in (tmp_path / "input_output.txt").read_text()
+
+
+def test_main_closes_mapped_input(monkeypatch, tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("# Mapped\n| Tables | Price |\n|---|---|\n| A | $1600 |\n")
+    processors = []
+
+    class RecordingProcessor(model.MappedTextProcessor):
+        def __init__(self, *args):
+            super().__init__(*args)
+            processors.append(self)
+
+    def render(bom, reports, cache_dir=None):
+        # the mapping is already closed by the time the report is rendered
+        assert processors[0].buffer.closed
+        return model.write_reports(bom, reports, cache_dir)
+
+    monkeypatch.setattr(cli, "MappedTextProcessor", RecordingProcessor)
+    monkeypatch.setattr(cli, "write_reports", render)
+    sys.argv = ["cli.py", "--input", str(input_file), "--mmap"]
+    cli.main(cli.parse_args())
+
+    assert processors[0].buffer.closed
+    assert "The total cost will be $1600.00." in (tmp_path / "input_output.txt").read_text()
+
+
+def test_main_several_templates(tmp_path, capsys):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("# Fan\n| Tables | Price |\n|---|---|\n| A | $1600 |\n| B | $12 |\n")
+    for template in ("project_summary_template", "boring"):
+        sys.argv = ["cli.py", "--input", str(input_file), "--template", template, "--output",
+                    str(tmp_path / f"single_{template}.txt")]
+        cli.main(cli.parse_args())
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--template", "project_summary_template", "boring", "--stats"]
+    runs = []
+    stats.add_hook(runs.append)
+    try:
+        cli.main(cli.parse_args())
+    finally:
+        stats.remove_hook(runs.append)
+    # the render threads are part of the one run
+    assert len(runs) == 1
+
+    for template in ("project_summary_template", "boring"):
+        assert (tmp_path / f"input_{template}_output.txt").read_text() == \
+            (tmp_path / f"single_{template}.txt").read_text()
+    run_stats = json.loads(capsys.readouterr().err)
+    # one parse, two renders
+    assert run_stats["stages"]["extract_tables"]["calls"] == 1
+    assert run_stats["stages"]["render"]["calls"] == 2
+    assert run_stats["counters"]["tables_found"] == 1
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--template", "project_summary_template", "boring",
+                "--output", str(tmp_path / "only_one.txt")]
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main(cli.parse_args())
+    assert exc_info.value.code == 1
+    assert not (tmp_path / "only_one.txt").exists()
+
+    # nothing to render
+    model.write_reports(model.TableBOM([], "Fan"), [])
+
+
+def import_times(*args, top_level=False):
+    """ runs python -X importtime and returns the cumulative import time of each module, or of the modules imported
+    directly rather than by another module
+    """
+    # with bytecode written, as an installed package has it, rather than compiling the sources on every run
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True,
+                            cwd=Path(__file__).parent.parent, env=env)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit() and not (top_level and name.startswith("  ")):
+                times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_budget():
+    # the first run writes any bytecode that is missing or stale
+    import_times("-c", "import reporter_cli.cli")
+    times = import_times("-c", "import reporter_cli.cli")
+
+    # heavy dependencies are only loaded by the stages that need them
+    assert not any(name.startswith(("jinja2", "multiprocessing", "concurrent", "decimal", "mmap", "threading"))
+                   for name in times)
+    # the best of a few runs of each, which keeps a busy machine from failing the test
+    startup = min(sum(import_times("-c", "pass", top_level=True).values()) for _ in range(3))
+    cli_import = min([times["reporter_cli.cli"]] +
+                     [import_times("-c", "import reporter_cli.cli")["reporter_cli.cli"] for _ in range(2)])
+    assert cli_import < IMPORT_BUDGET * startup
+
+
+def test_help_does_not_import_renderer():
+    times = import_times("-m", "reporter_cli", "--help")
+
+    assert "reporter_cli.model" in times
+    assert "jinja2" not in times
@@ -0,0 +1,119 @@
+import pytest
+
+from reporter_cli import follow
+from reporter_cli.model import IncrementalTextProcessor, TextProcessor, TableBOM, BOMRenderer
+
+LOG = '''# Procurement Log
+
+| Tables |  Price |
+|--------|--------|
+|    A   |  $1600 |
+|    B   |    $12 |
+
+Some notes
+
+| Chairs |  Price |
+|--------|--------|
+|   AA   |    $10 |
+|    Z   |     $1 |
+'''
+
+
+def append(path, text):
+    with open(path, 'a') as f:
+        f.write(text)
+
+
+def test_incremental_processor_resumes_open_table(tmp_path):
+    log = tmp_path / "log.txt"
+    log.write_text("")
+    processor = IncrementalTextProcessor(log)
+
+    # the partial last line waits for the rest of it
+    append(log, LOG[:LOG.index("|    B")] + "|    B   |")
+    assert processor.update() == [(["Tables", "Price"], [["A", "$1600"]])]
+    assert processor.project_name == "Procurement Log"
+
+    append(log, "    $12 |\n")
+    assert processor.update() == [(["Tables", "Price"], [["B", "$12"]])]
+
+    append(log, LOG[LOG.index("\nSome notes"):])
+    assert processor.update() == [(["Chairs", "Price"], [["AA", "$10"], ["Z", "$1"]])]
+    assert processor.update() == []
+    assert processor.table_count == 2
+
+
+def test_follower_state_matches_full_parse(tmp_path):
+    log = tmp_path / "log.txt"
+    state = tmp_path / "state"
+    log.write_text(LOG[:LOG.index("|    B")])
+
+    follower = follow.Follower(log, state)
+    assert follower.poll()
+    follower.save()
+
+    append(log, LOG[LOG.index("|    B"):])
+    follower = follow.Follower(log, state)
+    assert follower.processor.offset > 0
+    assert follower.poll()
+    assert not follower.poll()
+
+    processor = TextProcessor(log)
+    expected = TableBOM(processor.tables, processor.project_name)
+    assert follower.bom.total_cost == expected.total_cost == 1623.0
+    assert follower.bom.bill_of_materials["Tables"]["sub_total"] == 1612.0
+    assert list(follower.bom.bill_of_materials["Tables"]["cost_table"]) == \
+        list(expected.bill_of_materials["Tables"]["cost_table"])
+
+
+def test_main_once(tmp_path, capsys):
+    log = tmp_path / "log.txt"
+    log.write_text(LOG)
+    output_file = tmp_path / "report.txt"
+
+    args = follow.parse_args(["--input", str(log), "--output", str(output_file), "--state", str(tmp_path / "state"),
+                              "--once"])
+    follow.main(args)
+    assert "The total cost will be $1623.00." in output_file.read_text()
+
+    follow.main(args)
+    assert capsys.readouterr().out.endswith("No new tables\n")
+
+    # without --output the report is named the way batch names it
+    follow.main(follow.parse_args(["--input", str(log), "--once"]))
+    assert (tmp_path / "log_output.txt").read_text() == output_file.read_text()
+
+
+def test_incremental_processor_keeps_rows_that_look_like_separators(tmp_path):
+    text = "| x | $1 |\n|---|---|\n|---|---|\n| x | $1 |\n"
+    log = tmp_path / "log.txt"
+    log.write_text(text)
+    expected = TextProcessor(log).tables
+    assert expected == [(["x", "$1"], [["---", "---"], ["x", "$1"]])]
+    assert IncrementalTextProcessor(log).update() == expected
+
+    # nor when the table is resumed by the next update
+    log.write_text(text[:text.index("|---|---|\n|") + 10])
+    processor = IncrementalTextProcessor(log)
+    assert processor.update() == []
+    append(log, text[text.index("|---|---|\n|") + 10:])
+    assert processor.update() == expected
+
+
+@pytest.mark.parametrize("batches", [
+    # the costs of the first batch are in Q, but the whole table has them in P
+    ["| M | P | Q |\n", "| x |  | $1 |\n", "| y | $2 | $3 |\n"],
+    ["| M | P | Q |\n|---|---|---|\n| x | TBD | $1 |\n", "| y | TBD | $3 |\n| z | $2 | $3 |\n", "\n| N | P |\n| a | $1 |\n"],
+])
+def test_follower_prices_an_open_table_like_a_full_parse(tmp_path, batches):
+    log = tmp_path / "log.txt"
+    log.write_text("# Batched\n")
+    follower = follow.Follower(log)
+    for batch in batches:
+        append(log, batch)
+        follower.poll()
+
+    processor = TextProcessor(log)
+    expected = TableBOM(processor.tables, processor.project_name)
+    assert follower.bom.total_cost == expected.total_cost
+    assert BOMRenderer(follower.bom).output == BOMRenderer(expected).output
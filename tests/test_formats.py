@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import pytest
+import sys
+
+from reporter_cli import cli, formats
+from reporter_cli.model import TableBOM
+
+
+@pytest.fixture
+def bom():
+    tables = [
+        (["Tables", "Price"], [["A", "$1600"], ["B \"big\"", "$12.50"]]),
+        (["Notes", "Text"], [["a", "b"]]),
+        (["Chairs", "Price"], [["AA", "$10"]]),
+    ]
+    return TableBOM(tables, "Project, Name")
+
+
+def test_write_jsonl(bom):
+    f = io.StringIO()
+    formats.write_jsonl(bom, f)
+    records = [json.loads(line) for line in f.getvalue().splitlines()]
+
+    assert records[1] == {"record": "item", "project": "Project, Name", "material": "Tables", "item": "B \"big\"",
+                          "cost": 12.5, "currency": "$"}
+    assert [r["record"] for r in records] == ["item", "item", "subtotal", "subtotal", "item", "subtotal", "total"]
+    assert [r["cost"] for r in records if r["record"] != "item"] == [1612.5, 0.0, 10.0, 1622.5]
+
+
+def test_write_csv(bom):
+    f = io.StringIO()
+    formats.write_csv(bom, f)
+    rows = list(csv.reader(io.StringIO(f.getvalue())))
+
+    assert rows[0] == list(formats.CSV_HEADER)
+    assert rows[2] == ["item", "Project, Name", "Tables", "B \"big\"", "12.50", "$"]
+    assert rows[-1] == ["total", "Project, Name", "", "", "1622.50", "$"]
+
+
+def test_binary_round_trip(bom):
+    f = io.BytesIO()
+    formats.write_binary(bom, f)
+    f.seek(0)
+    dump = formats.read_binary(f)
+
+    assert dump["project"] == "Project, Name"
+    assert dump["total_minor"] == 162250
+    assert [(m["name"], m["sub_total_minor"], m["items"]) for m in dump["materials"]] == \
+        [("Tables", 161250, 2), ("Notes", 0, 0), ("Chairs", 1000, 1)]
+    assert list(dump["costs"]) == [160000, 1250, 1000]
+    assert dump["names"] == ["A", "B \"big\"", "AA"]
+    assert dump["currencies"] == ["$", "$", "$"]
+
+
+def test_main_writes_jsonl_to_stdout(tmp_path, capsys):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("# Piped\n| Tables | Price |\n|---|---|\n| A | $1600 |\n")
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--format", "jsonl", "--output", "-"]
+    cli.main(cli.parse_args())
+
+    records = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert records[-1] == {"record": "total", "project": "Piped", "cost": 1600.0, "currency": "$"}
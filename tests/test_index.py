@@ -0,0 +1,93 @@
+import os
+import pytest
+import sys
+
+from reporter_cli import cli, index
+
+SPEC = '''# {project}
+
+| Tables |  Price | Colour |
+|--------|--------|--------|
+|    A   |  ${a} | red |
+|    B   |    $12.50 | blue |
+
+| Notes | Text |
+|-------|------|
+| a | b |
+'''
+
+
+@pytest.fixture
+def spec_dir(tmp_path):
+    spec_dir = tmp_path / "specs"
+    spec_dir.mkdir()
+    for i in range(3):
+        (spec_dir / f"spec{i}.txt").write_text(SPEC.format(project=f"Project {i}", a=100 * (i + 1)))
+    return spec_dir
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_update_only_touches_changed_sources(spec_dir, tmp_path, workers):
+    inputs = sorted(spec_dir.iterdir())
+    with index.RowIndex(tmp_path / "index.db") as row_index:
+        assert row_index.update(inputs, workers) == {"indexed": 3, "unchanged": 0, "touched": 0, "removed": 0,
+                                                         "failed": 0}
+        assert row_index.update(inputs, workers)["unchanged"] == 3
+
+        # same content with a new mtime only updates the source, new content replaces its rows
+        os.utime(inputs[0], ns=(0, 0))
+        inputs[1].write_text(SPEC.format(project="Renamed", a=5))
+        inputs[2].unlink()
+        counts = row_index.update(inputs[:2], workers, prune=True)
+        assert counts == {"indexed": 1, "unchanged": 0, "touched": 1, "removed": 1, "failed": 0}
+
+        columns, rows = row_index.query("SELECT project, material, item, cost, currency FROM items ORDER BY id")
+    assert columns == ["project", "material", "item", "cost", "currency"]
+    assert rows == [("Project 0", "Tables", "A", 10000, "$"), ("Project 0", "Tables", "B", 1250, "$"),
+                    ("Project 0", "Notes", "a", None, None),
+                    ("Renamed", "Tables", "A", 500, "$"), ("Renamed", "Tables", "B", 1250, "$"),
+                    ("Renamed", "Notes", "a", None, None)]
+
+
+def test_report_from_index_matches_cli(spec_dir, tmp_path, capsys):
+    db = str(tmp_path / "index.db")
+    sys.argv = ["reporter", "index", "--db", db, "update", str(spec_dir), "--workers", "1"]
+    cli.cli()
+    assert "3 indexed, 0 unchanged, 0 removed, 0 failed" in capsys.readouterr().out
+
+    source = spec_dir / "spec1.txt"
+    sys.argv = ["reporter", "index", "--db", db, "report", str(source)]
+    cli.cli()
+    from_index = capsys.readouterr().out
+
+    sys.argv = ["reporter", "--input", str(source), "--output", "-"]
+    cli.main(cli.parse_args())
+    assert from_index == capsys.readouterr().out
+    assert "The total cost will be $212.50." in from_index
+
+    sys.argv = ["reporter", "index", "--db", db, "query", "SELECT SUM(cost) FROM items WHERE material = 'Tables'"]
+    cli.cli()
+    assert capsys.readouterr().out == "SUM(cost)\n63750\n"
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_update_skips_sources_that_fail(spec_dir, tmp_path, capsys, workers):
+    (spec_dir / "latin1.txt").write_bytes("# Caf\xe9\n| Tables | Price |\n|---|---|\n| A | $1 |\n".encode("latin-1"))
+    inputs = sorted(spec_dir.iterdir()) + [spec_dir / "missing.txt"]
+    with index.RowIndex(tmp_path / "index.db") as row_index:
+        assert row_index.update(inputs, workers) == {"indexed": 3, "unchanged": 0, "touched": 0, "removed": 0,
+                                                     "failed": 2}
+        assert sorted(path for path, _ in row_index.failed) == [str(spec_dir / "latin1.txt"),
+                                                                 str(spec_dir / "missing.txt")]
+
+    # what could be indexed was committed
+    with index.RowIndex(tmp_path / "index.db", read_only=True) as row_index:
+        assert len(row_index.sources()) == 3
+
+    sys.argv = ["reporter", "index", "--db", str(tmp_path / "index.db"), "update", str(spec_dir), "--workers", "1"]
+    with pytest.raises(SystemExit) as exc_info:
+        cli.cli()
+    assert exc_info.value.code == 1
+    out = capsys.readouterr().out
+    assert f"failed   {spec_dir / 'latin1.txt'} 'utf-8' codec can't decode" in out
+    assert "0 indexed, 3 unchanged, 0 removed, 1 failed" in out
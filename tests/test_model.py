@@ -1,6 +1,8 @@
 import pytest
+from decimal import Decimal
 from pathlib import Path
-from reporter_cli.model import TextProcessor, TableBOM, BOMRenderer
+from reporter_cli.model import TextProcessor, StreamingTextProcessor, MappedTextProcessor, TableBOM, BOMRenderer, \
+    IncrementalTextProcessor, get_environment
 
 
 @pytest.fixture
@@ -138,3 +140,239 @@ Subtotal for Header1: $30.00
 
 The total cost will be $30.00.'''
     assert content == expected_output
+
+
+def test_streaming_text_processor_from_lines(sample_text):
+    lines = iter(sample_text.splitlines(keepends=True))
+    processor = StreamingTextProcessor(lines)
+
+    # nothing is read until the tables are consumed
+    assert processor.project_name is None
+
+    first = next(processor.tables)
+    assert first == (["Header1", "Header2"], [["Data1", "$10.00"], ["Data2", "$20.00"]])
+    assert processor.project_name == "Project Name"
+
+    # the first table is yielded as soon as it closes, before the rest of the document is read
+    assert next(lines).strip() == "| Another Header1 | Another Header2 |"
+
+
+def test_streaming_text_processor_matches_text_processor(tmp_path, sample_text):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(sample_text)
+
+    processor = StreamingTextProcessor(input_file)
+    tables = list(processor.tables)
+
+    assert tables == TextProcessor(str(input_file)).tables
+    assert processor.project_name == "Project Name"
+    assert processor.table_count == 2
+
+
+def test_mapped_text_processor_matches_text_processor(tmp_path, sample_text):
+    input_file = tmp_path / "input.txt"
+    # windows line endings and a title line inside a table should not change the result
+    input_file.write_bytes((sample_text + "\r\n| A | B |\r\n|---|---|\r\n# ignored\r\n| x | $1 |\r\n").encode())
+
+    with MappedTextProcessor(input_file) as processor:
+        assert processor.project_name == "Project Name"
+        assert len(processor.tables) == 3
+        assert list(processor.tables) == TextProcessor(str(input_file)).tables
+
+
+@pytest.mark.parametrize("text, title", [("#\n# \n#  Late Title \n| A | B |\n|---|---|\n| x | $1 |\n", "Late Title"),
+                                         ("#\n| A | B |\n|---|---|\n| x | $1 |\n", None)])
+def test_every_processor_takes_the_first_title_with_text(tmp_path, text, title):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(text)
+
+    streamed = StreamingTextProcessor(input_file)
+    list(streamed.tables)
+    incremental = IncrementalTextProcessor(input_file)
+    incremental.update()
+    with MappedTextProcessor(input_file) as mapped:
+        names = [TextProcessor(input_file).project_name, mapped.project_name, streamed.project_name,
+                 incremental.project_name]
+    assert names == [title] * 4
+
+
+def test_mapped_text_processor_reuses_index(tmp_path, sample_text):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(sample_text)
+    index_file = tmp_path / "input.idx"
+
+    with MappedTextProcessor(input_file, index_file) as processor:
+        assert not processor.index_reused
+    assert index_file.exists()
+
+    with MappedTextProcessor(input_file, index_file) as processor:
+        assert processor.index_reused
+        assert processor.project_name == "Project Name"
+        assert processor.tables[1][0] == ["Another Header1", "Another Header2"]
+
+    # a changed file is scanned again rather than trusting the stale offsets
+    input_file.write_text("# Other\n\n| H | P |\n|---|---|\n| a | $1 |\n")
+    with MappedTextProcessor(input_file, index_file) as processor:
+        assert not processor.index_reused
+        assert processor.project_name == "Other"
+        assert list(processor.tables) == [(["H", "P"], [["a", "$1"]])]
+
+
+def test_text_processor_parallel_matches_serial(tmp_path, sample_text, monkeypatch):
+    input_file = tmp_path / "input.txt"
+    # the title is only in the first chunk, and a later title must not replace it
+    input_file.write_text(sample_text + "\n# Not the title\n" + sample_text.replace("# Project Name", "") * 20)
+    monkeypatch.setattr(TextProcessor, 'CHUNK_SIZE', 64)
+
+    serial = TextProcessor(str(input_file))
+    parallel = TextProcessor(str(input_file), jobs=2)
+
+    chunks = list(parallel.split_chunks(64))
+    assert len(chunks) > 10
+    assert ''.join(chunks) == parallel.text
+    assert all(not chunk.lstrip(' ').startswith(('|', '#')) for chunk in chunks[1:])
+
+    assert parallel.tables == serial.tables
+    assert len(parallel.tables) == 42
+    assert parallel.table_count == 42
+    assert parallel.project_name == "Project Name"
+
+
+def test_table_bom_column_types():
+    header = ["Widgets", "Qty", "Unit Price", "Total", "Notes"]
+    data = [["A", "1,000", "$1.50", "$1,500", "fragile"], ["B", "2", "", "$3", "4"]]
+
+    assert TableBOM.column_types(header, data) == ["text", "numeric", "currency", "currency", "text"]
+
+
+def test_table_bom_finds_costs_below_the_sample(tmp_path):
+    lines = ["# Late Costs", "| Parts | Price |", "|---|---|"]
+    lines += [f"| p{i} | TBD |" for i in range(TableBOM.SAMPLE_ROWS)] + ["| big | $5000 |"]
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("\n".join(lines) + "\n")
+    processor = TextProcessor(input_file)
+
+    bom = TableBOM(processor.tables, processor.project_name)
+    assert [item["item_name"] for item in bom.bill_of_materials["Parts"]["cost_table"]] == ["big"]
+    assert bom.total_cost == 5000
+    assert BOMRenderer(bom).output.endswith("The total cost will be $5000.00.")
+    # blank cells don't count towards the sample either
+    header, data = ["Parts", "Qty"], [["p", ""]] * TableBOM.SAMPLE_ROWS + [["q", "3"]]
+    assert TableBOM.column_types(header, data) == ["text", "numeric"]
+
+
+def test_table_bom_uses_first_currency_column_only():
+    tables = [
+        (["Widgets", "Unit Price", "Total"], [["A", "$1.50", "$1,500"], ["B", "n/a", "$3"], ["C", "$2", "$20"]]),
+    ]
+
+    bom = TableBOM(tables, "Project Name")
+
+    cost_table = bom.bill_of_materials["Widgets"]["cost_table"]
+    assert [(item["item_name"], item["Cost"]) for item in cost_table] == [("A", 1.5), ("C", 2.0)]
+    assert bom.total_cost == 3.5
+    assert bom.currency_symbol == "$"
+
+
+def test_table_bom_columnar_views():
+    tables = [
+        (["Chairs", "Colour", "Price"], [["AA", "red", "$10"], ["Z", "blue", "free"]]),
+        (["Chairs", "Price", "Weight"], [["FOO", "$1.50", "2kg"]]),
+    ]
+
+    bom = TableBOM(tables, "Project Name")
+    chairs = bom.bill_of_materials["Chairs"]
+
+    # rows of both tables share the columns, and only carry the cells their own table had
+    assert [dict(row) for row in chairs["items"]] == [
+        {"item_name": "AA", "Colour": "red", "Price": "$10"},
+        {"item_name": "Z", "Colour": "blue", "Price": "free"},
+        {"item_name": "FOO", "Price": "$1.50", "Weight": "2kg"},
+    ]
+    assert [(item["item_name"], item["Cost"], item["Currency"]) for item in chairs["cost_table"]] == \
+        [("AA", 10.0, "$"), ("FOO", 1.5, "$")]
+    # slices give lists of views, as templates do with items[1:] or cost_table[-1:]
+    assert [row["item_name"] for row in chairs["items"][1:]] == ["Z", "FOO"]
+    assert [row["item_name"] for row in chairs["items"][::-2]] == ["FOO", "AA"]
+    assert [item["item_name"] for item in chairs["cost_table"][-1:]] == ["FOO"]
+    assert chairs["cost_table"][5:] == []
+    assert chairs["sub_total"] == 11.5
+    assert bom.total_cost == 11.5
+
+
+def test_table_bom_sums_exactly():
+    # 0.1 + 0.2 style amounts drift when summed as floats
+    tables = [(["Parts", "Price"], [[str(i), "$0.10"] for i in range(1000)] + [["x", "$0.2"], ["y", "$1,000,000.07"]])]
+
+    bom = TableBOM(tables, "Project Name")
+
+    assert bom.total_minor == 100010027
+    assert bom.total_cost == Decimal("1000100.27")
+    assert bom.bill_of_materials["Parts"]["cost_table"][1000]["Cost"] == Decimal("0.20")
+    assert TableBOM.is_currency("£1,234.5") == (Decimal("1234.50"), "£")
+    assert BOMRenderer(bom).output.endswith("The total cost will be $1000100.27.")
+
+
+def test_table_bom_material_without_costs():
+    bom = TableBOM([(["Notes", "Text"], [["a", "b"]])], "Project Name")
+
+    assert "cost_table" not in bom.bill_of_materials["Notes"]
+    assert bom.bill_of_materials["Notes"]["sub_total"] == 0.0
+
+
+def test_bom_renderers_share_compiled_templates(tmp_path):
+    bom = TableBOM([(["Header1", "Header2"], [["Data1", "$10.00"]])], "Project Name")
+
+    first = BOMRenderer(bom, cache_dir=tmp_path)
+    second = BOMRenderer(bom, cache_dir=tmp_path)
+
+    assert first.env is second.env is get_environment(tmp_path)
+    assert first.template is second.template
+    assert second.output == first.output
+    # the compiled template is kept on disk for the next run
+    assert list((tmp_path / "templates").iterdir())
+
+
+def test_bom_renderer_write_stream(tmp_path, capsys):
+    tables = [
+        (["Header1", "Header2"], [["Data1", "$10.00"], ["Data2", "$20.00"]]),
+    ]
+    bom = TableBOM(tables, "Project Name")
+    renderer = BOMRenderer(bom, render=False)
+    assert renderer.output is None
+
+    output_file = tmp_path / "output.txt"
+    renderer.write_stream(output_file, console=True)
+
+    expected_output = BOMRenderer(bom).output
+    assert output_file.read_text() == expected_output
+    assert capsys.readouterr().out == expected_output + "\n"
+
+
+@pytest.mark.parametrize("module, suffix", [("gzip", ".gz"), ("bz2", ".bz2"), ("lzma", ".xz")])
+def test_compressed_inputs(tmp_path, sample_text, monkeypatch, module, suffix):
+    import importlib
+    from reporter_cli import model
+
+    # small blocks so lines, and a \r\n, straddle the blocks the decompressing thread hands over
+    monkeypatch.setattr(model, "DECOMPRESS_BLOCK", 7)
+    text = sample_text.replace("\n", "\r\n") + "| x | $1 |"
+    compressed = importlib.import_module(module).compress(text.encode("utf-8"))
+    named = tmp_path / f"input.txt{suffix}"
+    named.write_bytes(compressed)
+    # no extension, found by its magic bytes
+    unnamed = tmp_path / "input.bin"
+    unnamed.write_bytes(compressed)
+    (tmp_path / "input.txt").write_text(text)
+
+    expected = TextProcessor(tmp_path / "input.txt")
+    for path in (named, unnamed):
+        assert model.detect_compression(path) == module
+        processor = TextProcessor(path)
+        assert (processor.project_name, processor.tables) == (expected.project_name, expected.tables)
+        streamed = StreamingTextProcessor(path)
+        assert list(streamed.tables) == expected.tables
+        assert list(model.iter_lines(path)) == list(open(tmp_path / "input.txt", encoding="utf-8"))
+    assert model.plain_name(named) == tmp_path / "input.txt"
+    with pytest.raises(ValueError):
+        MappedTextProcessor(named)
@@ -0,0 +1,46 @@
+import pytest
+
+from reporter_cli import batch, pipeline
+
+
+@pytest.fixture
+def jobs(tmp_path, spec_text):
+    spec_dir = tmp_path / "specs"
+    spec_dir.mkdir()
+    for i in range(12):
+        (spec_dir / f"spec{i:02}.txt").write_text(spec_text(f"Project {i}"))
+    (spec_dir / "empty.txt").write_text("no tables here")
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    return [batch.Job(str(p), str(batch.output_path(p, output_dir)), 'project_summary_template', False,
+                      collect_stats=True)
+            for p in batch.collect_inputs([str(spec_dir)])]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_pipelined_matches_run_batch(jobs, tmp_path, workers):
+    results = sorted(pipeline.run_pipelined(jobs, workers=workers, concurrency=2, queue_size=1))
+
+    assert [r.status for r in results] == ["empty"] + ["written"] * 12
+    written = [r for r in results if r.status == "written"]
+    assert all({"read", "render", "write"} <= set(r.stats["stages"]) and r.stats["counters"]["bytes_written"]
+               for r in written)
+    pipelined = {job.output_file: open(job.output_file).read() for job in jobs[1:]}
+
+    # the regular batch path writes the same reports
+    expected = [job._replace(overwrite=True) for job in jobs]
+    assert [r.status for r in batch.run_batch(expected, workers=1)] == ["empty"] + ["written"] * 12
+    assert pipelined == {job.output_file: open(job.output_file).read() for job in jobs[1:]}
+    assert "Project 3" in pipelined[jobs[4].output_file]
+
+    # and existing reports are left alone
+    assert {r.status for r in pipeline.run_pipelined(jobs[1:], workers=workers)} == {"skipped"}
+
+
+def test_main_with_io_concurrency(jobs, capsys):
+    inputs = [job.input_file for job in jobs]
+    args = batch.parse_args(inputs + ["--workers", "1", "--io-concurrency", "4", "--format", "csv", "--quiet"])
+    batch.main(args)
+
+    out = capsys.readouterr().out
+    assert "13 files in" in out and "12 written" in out
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+from reporter_cli import serve, stats
+from reporter_cli.model import TextProcessor, TableBOM, BOMRenderer
+
+async def request(reader, writer, method, path, body=None):
+    payload = json.dumps(body).encode('utf-8') if body is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(payload)}\r\n\r\n'.encode('latin-1') + payload)
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()).strip():
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.lower()] = value.strip()
+    return status, await reader.readexactly(int(headers['content-length']))
+
+
+def test_serve_over_unix_socket(tmp_path, spec_text):
+    spec = spec_text("Served Project")
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(spec)
+    processor = TextProcessor(input_file)
+    expected = BOMRenderer(TableBOM(processor.tables, processor.project_name)).output
+
+    async def scenario():
+        server = serve.ReportServer(executor=ThreadPoolExecutor(2))
+        listener = await server.start(str(tmp_path / "reporter.sock"))
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(str(tmp_path / "reporter.sock"))
+            # several requests on one connection, by path and inline
+            results = [await request(reader, writer, 'POST', '/report', {'input': str(input_file)}),
+                       await request(reader, writer, 'POST', '/report', {'text': spec, 'format': 'jsonl'}),
+                       await request(reader, writer, 'POST', '/report', {'text': 'no tables'}),
+                       await request(reader, writer, 'POST', '/report', {'input': str(tmp_path / "missing")}),
+                       await request(reader, writer, 'POST', '/report', {'text': spec, 'template': 'nope'}),
+                       await request(reader, writer, 'GET', '/metrics')]
+            writer.close()
+        server.close()
+        return results
+
+    runs = []
+    stats.add_hook(runs.append)
+    try:
+        report, jsonl, empty, missing, template, metrics = asyncio.run(scenario())
+    finally:
+        stats.remove_hook(runs.append)
+
+    assert report == (200, expected.encode('utf-8'))
+    assert json.loads(jsonl[1].splitlines()[-1])["cost"] == 1612.0
+    assert [empty[0], missing[0], template[0]] == [422, 404, 400]
+    metrics = json.loads(metrics[1])
+    assert metrics["requests"] == 5
+    assert metrics["errors"] == 3
+    assert metrics["pipeline"]["stages"]["render"]["calls"] == 1
+    # one run for each request that got as far as parsing, handed to the hooks by the server
+    assert [run["counters"]["tables_found"] for run in runs] == [1, 1, 0]
+
+
+def test_serve_concurrent_tcp_requests(spec_text):
+    spec = spec_text("Served Project")
+    async def scenario():
+        server = serve.ReportServer(executor=ThreadPoolExecutor(4))
+        listener = await server.start(port=0)
+        port = listener.sockets[0].getsockname()[1]
+
+        async def one():
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            try:
+                return await request(reader, writer, 'POST', '/report', {'text': spec, 'template': 'boring'})
+            finally:
+                writer.close()
+
+        async with listener:
+            results = await asyncio.gather(*(one() for _ in range(8)))
+        server.close()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert {status for status, _ in results} == {200}
+    assert len({body for _, body in results}) == 1
+    assert results[0][1].endswith(b"The total cost will be $1612.00.")
+
+
+def test_serve_rejects_bad_lengths_and_foreign_socket_paths(tmp_path):
+    async def scenario():
+        server = serve.ReportServer(executor=ThreadPoolExecutor(1))
+        listener = await server.start(str(tmp_path / "reporter.sock"))
+        async with listener:
+            reader, writer = await asyncio.open_unix_connection(str(tmp_path / "reporter.sock"))
+            writer.write(b'POST /report HTTP/1.1\r\nContent-Length: -5\r\n\r\n')
+            response = await reader.read()
+            writer.close()
+        # a socket left behind is replaced, any other file is left alone
+        listener = await server.start(str(tmp_path / "reporter.sock"))
+        listener.close()
+        (tmp_path / "notes.txt").write_text("keep me")
+        with pytest.raises(FileExistsError):
+            await server.start(str(tmp_path / "notes.txt"))
+        server.close()
+        return response
+
+    assert asyncio.run(scenario()).startswith(b'HTTP/1.1 400 Bad Request')
+    assert (tmp_path / "notes.txt").read_text() == "keep me"
@@ -0,0 +1,54 @@
+import pytest
+import sys
+
+from reporter_cli import cli, formats, stats
+from reporter_cli.model import TableBOM, BOMRenderer
+from reporter_cli.spill import SpillingTableBOM
+
+
+def tables():
+    # materials interleave, so a run holds segments of several of them
+    for i in range(40):
+        yield (["Tables", "Price", "Colour"], [[f"T{i}-{j}", f"${i}.{j:02}", "red"] for j in range(25)])
+        yield (["Chairs", "Weight", "Price"], [[f"C{i}", "2kg", "free" if i % 3 else f"£{i}"]])
+    yield (["Notes", "Text"], [["a", "b"]])
+
+
+def test_spilled_bom_renders_identically(tmp_path):
+    expected = TableBOM(list(tables()), "Project")
+    with stats.collecting() as run_stats, SpillingTableBOM(tables(), "Project", 4096, tmp_path) as spilled:
+        assert run_stats.counters["spilled_runs"] > 5
+
+        assert spilled.total_minor == expected.total_minor
+        assert spilled.name_width() == expected.name_width()
+        for template in ("project_summary_template", "boring"):
+            assert BOMRenderer(spilled, template).output == BOMRenderer(expected, template).output
+        for name, material in expected.bill_of_materials.items():
+            assert list(spilled.bill_of_materials[name]["items"]) == [dict(row) for row in material["items"]]
+            assert list(spilled.bill_of_materials[name].iter_costs()) == list(material.iter_costs())
+        for output_format, writer in formats.WRITERS.items():
+            if output_format != 'binary':
+                assert formats.render_bytes(spilled, output_format) == formats.render_bytes(expected, output_format)
+        assert spilled.tables is None
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("stream", [[], ["--stream"]])
+def test_cli_memory_budget(tmp_path, capsys, monkeypatch, stream):
+    input_file = tmp_path / "input.txt"
+    lines = ["# Big Project", "", "| Parts | Price |", "|---|---|"]
+    lines += [f"| P{i} | ${i}.99 |" for i in range(3000)]
+    input_file.write_text("\n".join(lines) + "\n")
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--output", "-"]
+    cli.main(cli.parse_args())
+    expected = capsys.readouterr().out
+
+    # the input is streamed with or without --stream, never loaded whole
+    monkeypatch.setattr(cli, "TextProcessor", None)
+    sys.argv = ["cli.py", "--input", str(input_file), "--output", "-", "--memory-budget", "0.005",
+                "--spill-dir", str(tmp_path), "--stats"] + stream
+    cli.main(cli.parse_args())
+    captured = capsys.readouterr()
+    assert captured.out == expected
+    assert '"spill_merges": 1' in captured.err
@@ -0,0 +1,151 @@
+import gzip
+import io
+import json
+import pytest
+import sys
+import time
+
+from reporter_cli import batch, cli, stats
+from reporter_cli.pipeline import run_pipelined
+from reporter_cli.model import TextProcessor, TableBOM, BOMRenderer
+
+SPEC = '''# Counted
+
+| Tables |  Price |
+|--------|--------|
+|    A   |  $1600 |
+|    B   |  $12 | extra |
+|    C   |  free |
+'''
+
+
+def test_collecting_pipeline_stats(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(SPEC)
+    seen = []
+    stats.add_hook(seen.append)
+    try:
+        with stats.collecting() as run_stats:
+            processor = TextProcessor(input_file)
+            bom = TableBOM(processor.tables, processor.project_name)
+            BOMRenderer(bom, render=False).write_stream(tmp_path / "output.txt")
+    finally:
+        stats.remove_hook(seen.append)
+
+    assert run_stats.counters == {"lines_scanned": 7, "tables_found": 1, "rows_kept": 2, "rows_dropped": 1,
+                                  "currency_cells": 1, "bytes_written": (tmp_path / "output.txt").stat().st_size}
+    assert set(run_stats.stages) == {"read", "extract_tables", "make_bom", "render", "write"}
+    assert all(stage["calls"] == 1 and stage["wall"] >= 0 for stage in run_stats.stages.values())
+    assert seen == [run_stats.as_dict()]
+
+
+def test_nothing_collected_outside_collecting(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(SPEC)
+
+    TextProcessor(input_file)
+    assert stats.current() is stats.NULL_STATS
+    assert stats.current().as_dict() == {"stages": {}, "counters": {}}
+
+
+def test_merge():
+    total = stats.Stats()
+    part = stats.Stats()
+    part.add_time("render", 1.0, 0.5)
+    part.incr("rows_kept", 3)
+    total.merge(part.as_dict())
+    total.merge(part.as_dict())
+
+    assert total.stages["render"] == {"wall": 2.0, "cpu": 1.0, "calls": 2}
+    assert total.counters == {"rows_kept": 6}
+
+
+def test_main_prints_stats(tmp_path, capsys):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(SPEC)
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--output", "-", "--stats"]
+    cli.main(cli.parse_args())
+
+    captured = capsys.readouterr()
+    assert "The total cost will be $1600.00." in captured.out
+    assert json.loads(captured.err)["counters"]["rows_dropped"] == 1
+
+
+@pytest.mark.parametrize("options", [["--stream"], ["--memory-budget", "1"], ["--stdin"], ["--gzip"]])
+def test_streamed_parse_is_timed_as_its_own_stages(tmp_path, capsys, monkeypatch, options):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(SPEC)
+    if options == ["--gzip"]:
+        input_file = tmp_path / "input.txt.gz"
+        input_file.write_bytes(gzip.compress(SPEC.encode("utf-8")))
+        options = []
+    elif options == ["--stdin"]:
+        monkeypatch.setattr(sys, "stdin", io.StringIO(SPEC))
+        input_file, options = "-", []
+
+    sys.argv = ["cli.py", "--input", str(input_file), "--output", str(tmp_path / "output.txt"), "--stats", *options]
+    cli.main(cli.parse_args())
+
+    stages = json.loads(capsys.readouterr().err)["stages"]
+    assert {"read", "extract_tables", "make_bom"} <= set(stages)
+    assert stages["read"]["calls"] == stages["extract_tables"]["calls"] == 1
+
+
+def test_nested_stages_count_towards_the_inner_one():
+    def produce():
+        for _ in range(3):
+            time.sleep(0.02)
+            yield
+
+    run_stats = stats.Stats()
+    with run_stats.stage("make_bom"):
+        for _ in run_stats.timed(produce(), "extract_tables"):
+            pass
+    with run_stats.stage("make_bom"):
+        for _ in run_stats.timed(range(3), "extract_tables"):
+            time.sleep(0.02)
+
+    assert run_stats.stages["make_bom"]["calls"] == 2
+    assert run_stats.stages["extract_tables"]["calls"] == 2
+    # producing the items counts for the parse, consuming them for the caller
+    assert run_stats.stages["extract_tables"]["wall"] >= 0.06
+    assert 0.06 <= run_stats.stages["make_bom"]["wall"] < 0.09
+
+
+@pytest.fixture
+def hook_calls():
+    seen = []
+    stats.add_hook(seen.append)
+    try:
+        yield seen
+    finally:
+        stats.remove_hook(seen.append)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_hooks_fire_in_the_parent(tmp_path, hook_calls, workers):
+    jobs = []
+    for i in range(2):
+        (tmp_path / f"input{i}.txt").write_text(SPEC)
+        jobs.append(batch.Job(str(tmp_path / f"input{i}.txt"), str(tmp_path / f"output{i}.txt"),
+                              "project_summary_template", True, collect_stats=True))
+
+    results = list(batch.run_batch(jobs, workers=workers))
+    assert hook_calls == [result.stats for result in results]
+    assert all(run["counters"]["rows_kept"] == 2 for run in hook_calls)
+
+    hook_calls.clear()
+    results = list(run_pipelined([job._replace(output_file=job.output_file + ".2") for job in jobs], workers=workers))
+    assert sorted(map(json.dumps, hook_calls)) == sorted(json.dumps(result.stats) for result in results)
+
+
+def test_chunk_stats_reach_hooks_once(tmp_path, hook_calls, monkeypatch):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text(SPEC * 4)
+    monkeypatch.setattr(TextProcessor, "CHUNK_SIZE", 64)
+
+    with stats.collecting() as run_stats:
+        TextProcessor(input_file, jobs=2)
+    assert hook_calls == [run_stats.as_dict()]
+    assert run_stats.counters["tables_found"] == 4
@@ -0,0 +1,59 @@
+from reporter_cli import stats
+from reporter_cli.model import TextProcessor, StreamingTextProcessor, MappedTextProcessor
+from reporter_cli.tokenizer import Tokenizer, extract_tables, is_separator, split_cells
+
+SPEC = """# Project
+Some prose | with a pipe in it
+| Item | Price | Notes |
+|:-----|------:|-------|
+| A    | $10   |       |
+|      | $5    | no name |
+| B\\|C | $1    | a \\| b |
+# a title line keeps the table open
+| D | $2 | one | too many |
+
+| No | Separator |
+| x  | $3        |
+"""
+
+
+def test_split_cells():
+    assert split_cells('| a |  | b |') == ['a', '', 'b']
+    assert split_cells('| a\\|b | c |') == ['a|b', 'c']
+    assert split_cells(b'|x| y |') == [b'x', b'y']
+    assert split_cells('|') == []
+    assert is_separator('|---|:--:|') and is_separator(b'| --- |')
+    assert not is_separator('| - a |')
+
+
+def test_empty_cells_escaped_pipes_and_separators():
+    with stats.collecting() as run_stats:
+        project_name, tables = extract_tables(SPEC)
+    assert project_name == 'Project'
+    assert tables == [(['Item', 'Price', 'Notes'], [['A', '$10', ''], ['', '$5', 'no name'], ['B|C', '$1', 'a | b']]),
+                      (['No', 'Separator'], [['x', '$3']])]
+    assert run_stats.counters['rows_dropped'] == 1
+    assert run_stats.counters['lines_scanned'] == 12
+
+
+def test_all_readers_agree(tmp_path):
+    path = tmp_path / 'spec.txt'
+    path.write_bytes(SPEC.replace('\n', '\r\n').encode('utf-8'))
+    expected = extract_tables(SPEC)[1]
+    assert TextProcessor(path).tables == expected
+    assert list(StreamingTextProcessor(path).tables) == expected
+    with MappedTextProcessor(path) as processor:
+        assert processor.project_name == 'Project'
+        assert list(processor.tables) == expected
+
+
+def test_blocks_of_bytes_and_text_match():
+    data = SPEC.encode('utf-8')
+    text_blocks = [(start, end, lines) for start, end, lines in Tokenizer(SPEC).blocks()]
+    byte_blocks = [(start, end, [line.decode('utf-8') for line in lines])
+                   for start, end, lines in Tokenizer(data).blocks()]
+    assert text_blocks == byte_blocks
+    start, end, lines = text_blocks[0]
+    assert SPEC[start:end].startswith('| Item') and SPEC[start:end].endswith('| too many |')
+    assert len(lines) == 6
+    assert Tokenizer(b'no title\n| a |\n').title() is None
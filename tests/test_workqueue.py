@@ -0,0 +1,86 @@
+import json
+import os
+import pytest
+import sys
+import time
+
+from reporter_cli import batch, cli, workqueue
+
+SPEC = "# Queued {i}\n| Tables | Price |\n|---|---|\n| A | ${i}.50 |\n| B | $12 |\n"
+
+
+@pytest.fixture
+def queue_dir(tmp_path):
+    spec_dir = tmp_path / "specs"
+    spec_dir.mkdir()
+    for i in range(4):
+        (spec_dir / f"spec{i}.txt").write_text(SPEC.format(i=i))
+    sys.argv = ["reporter", "queue", "submit", str(tmp_path / "queue"), str(spec_dir), "--output-dir",
+                str(tmp_path / "reports"), "--lease", "60"]
+    cli.cli()
+    return tmp_path / "queue"
+
+
+def test_submit_work_and_status(queue_dir, tmp_path, capsys):
+    assert workqueue.WorkQueue(queue_dir).counts() == {"pending": 4, "leased": 0, "done": 0, "failed": 0}
+    # submitting again only adds what isn't queued yet
+    workqueue.main(workqueue.parse_args(["submit", str(queue_dir), str(tmp_path / "specs"), "--output-dir",
+                                         str(tmp_path / "reports")]))
+    assert "0 jobs added, 4 already queued" in capsys.readouterr().out
+
+    counts = workqueue.work(str(queue_dir), poll=0.01, quiet=True)
+    assert counts == {"written": 4, "skipped": 0, "empty": 0, "failed": 0}
+    # the same reports batch mode renders, and no partial files are left behind
+    for i in range(4):
+        expected = batch.render_job(batch.Job(str(tmp_path / "specs" / f"spec{i}.txt"),
+                                              str(tmp_path / f"batch{i}.txt"), "project_summary_template", True))
+        assert expected.status == "written"
+        assert (tmp_path / "reports" / f"spec{i}_output.txt").read_text() == (tmp_path / f"batch{i}.txt").read_text()
+    assert sorted(os.listdir(tmp_path / "reports")) == [f"spec{i}_output.txt" for i in range(4)]
+
+    queue_status = workqueue.status(str(queue_dir))
+    assert (queue_status["jobs"], queue_status["done"], queue_status["pending"], queue_status["leased"]) == (4, 4, 0, 0)
+    [worker] = queue_status["workers"]
+    assert (worker["state"], worker["processed"]) == ("stopped", 4)
+    assert "4 jobs: 4 done, 0 failed, 0 leased (0 expired), 0 pending" in workqueue.format_status(queue_status)
+
+
+def test_expired_leases_are_retried_then_failed(queue_dir):
+    queue = workqueue.WorkQueue(queue_dir)
+    queue.create(max_attempts=2)
+    # a worker that claims a job and dies without renewing its lease
+    lease = queue.claim("crashed-host-1", 60)
+    os.utime(lease.path, (0, 0))
+    assert workqueue.status(str(queue_dir))["expired"] == 1
+
+    assert workqueue.work(str(queue_dir), poll=0.01, quiet=True)["written"] == 4
+    with open(queue_dir / "results" / f"{lease.job_id}.json") as f:
+        assert json.load(f)["attempts"] == 2
+    # the crashed worker's late finish is refused, the job belongs to whoever took it over
+    assert not queue.finish(lease, batch.Result(lease.job["input"], "written", "", 0.0), "crashed-host-1")
+
+    # a job whose every claim expires is failed for good rather than retried forever
+    job = {"input": "/missing.txt", "output": "/missing_output.txt", "template": "project_summary_template",
+           "format": "text", "overwrite": "never"}
+    assert queue.submit([job]) == (1, 0)
+    for _ in range(2):
+        lease = queue.claim("crashed-host-2", 60)
+        os.utime(lease.path, (0, 0))
+        queue.requeue_expired()
+    assert queue.counts()["failed"] == 1
+    with open(queue_dir / "results" / f"{queue.job_id('/missing.txt')}.json") as f:
+        assert json.load(f)["message"] == "lease expired 2 times"
+
+
+def test_lease_is_renewed_while_held(queue_dir):
+    queue = workqueue.WorkQueue(queue_dir)
+    lease = queue.claim("slow-host-1", 60)
+    lease.interval = 0.01
+    os.utime(lease.path, (0, 0))
+    with lease:
+        for _ in range(200):
+            if os.stat(lease.path).st_mtime > 0:
+                break
+            time.sleep(0.01)
+    assert queue.requeue_expired() == 0
+    assert not lease.lost